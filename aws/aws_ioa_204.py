@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
-import boto3, sys, time
 from botocore.exceptions import ClientError
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from engine.output import show_response
+from engine.teardown import Teardown
+from engine.waiters import wait_until
 
 """
 
@@ -23,102 +26,104 @@ temppol = {
     "AllowUsersToChangePassword": True,
 }
 
-# Instantiating IAM client
-IAM = boto3.Session(profile_name=sys.argv[1]).client("iam")
-
-
-def create_user():
-    response = IAM.create_user(UserName=USER)
-    print(f"Create User Output:\n {response}")
-
-
-def create_login_profile():
-    response = IAM.create_login_profile(UserName=USER, Password=PASS)
-    print(f"Create Login Profile Output:\n {response}")
-    # 30 second sleep time to allow the login profile to be created before being updated
-    time.sleep(40)
-    print("%s login profile already exists. Skipping..." % (USER))
-
-
-def list_users():
-    response = IAM.list_users(PathPrefix="/")
-    print(f"List Users Output:\n {response}")
-
-
-def get_password_policy():
-    created_pw_pol = False
-
-    try:
-        response = IAM.get_account_password_policy()
-    except ClientError as e:
-        response = IAM.update_account_password_policy(**temppol)
-        print(f"Create Password Policy Output:\n {response} \n")
-        created_pw_pol = True
-        response = IAM.get_account_password_policy()
-
-    print(f"Get Password Policy Output:\n {response}")
-
-    return created_pw_pol
-
-
-def update_login_profile():
-    response = IAM.update_login_profile(UserName=USER, Password=PASS2)
-    print(f"Update Login Profile Output:\n {response}")
-
-
-def delete_login_profile():
-    response = IAM.delete_login_profile(UserName=USER)
-    print(f"Delete Login Profile Output:\n {response}")
-
-
-def delete_user():
-    response = IAM.delete_user(UserName=USER)
-    print(f"Delete User Output:\n {response}")
-
-
-def delete_pw_policy():
-    try:
-        response = IAM.delete_account_password_policy()
-        print(f"Delete temporary password policy:\n {response}")
-    except ClientError as e:
-        pass
-
-
-def main():
-    # Pre-Test Prep
-    print("\n\nRunning Policy 204 Prep\n")
-    create_user()
-    create_login_profile()
-
-    # Enumerate Users
-    print("\n\nRunning Policy 204 Before Conditions\n")
-    list_users()
-
-    # Enumerate Account Password Policy
-    time.sleep(5)
-    print("\n\nRunning Policy 204 Before Conditions\n")
-    created_policy = get_password_policy()
-
-    # Create User
-    time.sleep(5)
-    print("\n\nRunning Policy 204 Pattern Conditions\n")
-    update_login_profile()
-
-    # console_login_confirmation = input(
-    #    f"\n\n\nPlease Perform Console Login:\nUser Name: {USER}\nPassword={PASS2}\n\nPress any key to continue after performing console login"
-    # )
-
-    # Perform Clean Up
-    time.sleep(5)
-    print("\n\nRunning Policy 204 Clean Up\n")
-
-    # User profile must be deleted before the user can be deleted
-    delete_login_profile()
-    delete_user()
-
-    if created_policy:
-        delete_pw_policy()
 
+class LoginProfileTest(PolicyTest):
+    phase_delays = {"trigger_ioa": 5, "cleanup": 5}
+
+    # Instantiating IAM client
+    iam = LazyClient("iam")
+
+    def __init__(self, session):
+        super(LoginProfileTest, self).__init__(session)
+        self.created_policy = False
+
+    def create_user(self):
+        response = self.iam.create_user(UserName=USER)
+        show_response("Create User Output", response)
+
+    def create_login_profile(self):
+        response = self.iam.create_login_profile(UserName=USER, Password=PASS)
+        show_response("Create Login Profile Output", response)
+        # Wait for the login profile to be visible before it is updated
+        wait_until(
+            lambda: self.iam.get_login_profile(UserName=USER),
+            "login profile for " + USER,
+            deadline=60,
+            retry_errors=("NoSuchEntity",),
+        )
+        print("%s login profile already exists. Skipping..." % (USER))
+
+    def list_users(self):
+        response = self.iam.list_users(PathPrefix="/")
+        show_response("List Users Output", response)
+
+    def get_password_policy(self):
+        created_pw_pol = False
+
+        try:
+            response = self.iam.get_account_password_policy()
+        except ClientError as e:
+            response = self.iam.update_account_password_policy(**temppol)
+            show_response("Create Password Policy Output", response)
+            created_pw_pol = True
+            response = self.iam.get_account_password_policy()
+
+        show_response("Get Password Policy Output", response)
+
+        return created_pw_pol
+
+    def update_login_profile(self):
+        response = self.iam.update_login_profile(UserName=USER, Password=PASS2)
+        show_response("Update Login Profile Output", response)
+
+    def delete_pw_policy(self):
+        try:
+            response = self.iam.delete_account_password_policy()
+            show_response("Delete temporary password policy", response)
+        except ClientError as e:
+            pass
+
+    def setup(self):
+        # Pre-Test Prep
+        print("\n\nRunning Policy 204 Prep\n")
+        self.create_user()
+        self.create_login_profile()
+
+    def trigger_before(self):
+        # Enumerate Users
+        print("\n\nRunning Policy 204 Before Conditions\n")
+        self.list_users()
+
+        # Enumerate Account Password Policy
+        yield 5
+        print("\n\nRunning Policy 204 Before Conditions\n")
+        self.created_policy = self.get_password_policy()
+
+    def trigger_ioa(self):
+        # Create User
+        print("\n\nRunning Policy 204 Pattern Conditions\n")
+        self.update_login_profile()
+
+        # console_login_confirmation = input(
+        #    f"\n\n\nPlease Perform Console Login:\nUser Name: {USER}\nPassword={PASS2}\n\nPress any key to continue after performing console login"
+        # )
+
+    def cleanup(self):
+        # Perform Clean Up
+        print("\n\nRunning Policy 204 Clean Up\n")
+
+        # User profile must be deleted before the user can be deleted
+        teardown = Teardown(self.session)
+        teardown.add_resource("iam:login-profile", UserName=USER)
+        teardown.add_resource("iam:user", UserName=USER)
+        try:
+            teardown.run(strict=True)
+        finally:
+            if self.created_policy:
+                self.delete_pw_policy()
+
+
+POLICY_TEST = LoginProfileTest
 
 if __name__ == "__main__":
-    main()
+    run_standalone(LoginProfileTest)
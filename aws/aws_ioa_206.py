@@ -7,39 +7,51 @@ Pattern: Creates VPC flow logs, describes them, then deletes the flow logs.
 
 """
 
-import sys, time
+import sys
 
-import boto3
-
-from utils import AWS_RESOURCE_TAGS
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from engine.output import show_response
+from utils import aws_resource_tags
 
 SLEEP_SECONDS = 3
 DIV_LINE = "*" * 80
 BUCKET = "cspmioa206bucket"
 
 
-class VPCFlowLogsTest(object):
+class VPCFlowLogsTest(PolicyTest):
+    # Flow logs are given an extra 10 seconds before they are deleted
+    phase_delays = {
+        "trigger_before": SLEEP_SECONDS,
+        "trigger_ioa": SLEEP_SECONDS + 10,
+        "trigger_after": SLEEP_SECONDS,
+        "cleanup": SLEEP_SECONDS,
+    }
+
+    client = LazyClient("ec2")
+
     def __init__(self, session, vpc_id=None, s3_bucket_arn=None):
-        self.session = session
-        self.client = self.session.client("ec2")
-        if vpc_id is None:
-            self.vpc = self.client.create_vpc(CidrBlock="192.168.0.0/22")
-            self.vpc_id = self.vpc["Vpc"]["VpcId"]
-        else:
-            self.vpc_id = vpc_id
-        if s3_bucket_arn is None:
-            self.s3 = self.session.client("s3")
-            new_bucket = self.s3.create_bucket(Bucket=BUCKET)
-            self.s3_bucket_arn = "arn:aws:s3:::%s" % (BUCKET)
-        else:
-            self.s3_bucket_arn = s3_bucket_arn
+        super(VPCFlowLogsTest, self).__init__(session)
+        self.vpc_id = vpc_id
+        self.s3_bucket_arn = s3_bucket_arn
+        self._created_vpc = False
+        self._created_bucket = False
 
     def setup(
         self,
     ):
         """
-        This needs to run if you are creating a new SNS topic.
+        Creates the test VPC and S3 bucket unless they were passed in, then
+        enables flow logs on the VPC.
         """
+        if self.vpc_id is None:
+            self.vpc = self.client.create_vpc(CidrBlock="192.168.0.0/22")
+            self.vpc_id = self.vpc["Vpc"]["VpcId"]
+            self._created_vpc = True
+        if self.s3_bucket_arn is None:
+            self.s3 = self.session.client("s3")
+            new_bucket = self.s3.create_bucket(Bucket=BUCKET)
+            self.s3_bucket_arn = "arn:aws:s3:::%s" % (BUCKET)
+            self._created_bucket = True
         print(DIV_LINE)
         print("Setup: create flow logs for VPC ID ", self.vpc_id)
         result = self.client.create_flow_logs(
@@ -49,7 +61,7 @@ class VPCFlowLogsTest(object):
             LogDestinationType="s3",
             LogDestination=self.s3_bucket_arn,
             TagSpecifications=[
-                {"ResourceType": "vpc-flow-log", "Tags": AWS_RESOURCE_TAGS}
+                {"ResourceType": "vpc-flow-log", "Tags": aws_resource_tags()}
             ],
         )
         self._vpc_flow_log_ids = result["FlowLogIds"]
@@ -58,16 +70,13 @@ class VPCFlowLogsTest(object):
         print(DIV_LINE)
         print("Triggering IOA before correlation: describe-flow-logs")
         result = self.client.describe_flow_logs()
-        print(result)
-        print(result["ResponseMetadata"]["HTTPHeaders"]["date"])
+        show_response("describe-flow-logs", result)
 
     def trigger_ioa(self):
         print(DIV_LINE)
-        time.sleep(10)
         print("Triggering IOA: Deleting flow logs")
         result = self.client.delete_flow_logs(FlowLogIds=self._vpc_flow_log_ids)
-        print(result)
-        print(result["ResponseMetadata"]["HTTPHeaders"]["date"])
+        show_response("delete-flow-logs", result)
 
     def trigger_after(self):
         print("No after pattern to trigger")
@@ -76,16 +85,19 @@ class VPCFlowLogsTest(object):
         print("Cleaning up")
         print("Verifying flow logs deleted")
         result = self.client.describe_flow_logs()
-        print(result)
-        self.client.delete_vpc(VpcId=self.vpc_id)
-        s3 = boto3.resource("s3")
-        bucket = s3.Bucket(BUCKET)
-        bucket.objects.delete()
-        response = bucket.delete()
+        show_response("describe-flow-logs", result)
+        if self._created_vpc:
+            self.client.delete_vpc(VpcId=self.vpc_id)
+        if self._created_bucket:
+            s3 = self.session.resource("s3")
+            bucket = s3.Bucket(BUCKET)
+            bucket.objects.delete()
+            response = bucket.delete()
 
 
+POLICY_TEST = VPCFlowLogsTest
+
 if __name__ == "__main__":
-    aws_profile = sys.argv[1]
     try:
         vpc_id = sys.argv[2]
     except IndexError as e:
@@ -98,23 +110,6 @@ if __name__ == "__main__":
         print("No S3 bucket ARN configured. Creating a test S3 Bucket.")
         s3_bucket_arn = None
 
-    print("Using AWS profile", aws_profile)
-    botosession = boto3.Session(profile_name=aws_profile)
-
     print("Setting up for Policy 206 test")
-    test = VPCFlowLogsTest(botosession, vpc_id=vpc_id, s3_bucket_arn=s3_bucket_arn)
-
-    test.setup()
-    time.sleep(SLEEP_SECONDS)
-
-    test.trigger_before()
-    time.sleep(SLEEP_SECONDS)
-
-    test.trigger_ioa()
-    time.sleep(SLEEP_SECONDS)
-
-    test.trigger_after()
-    time.sleep(SLEEP_SECONDS)
-
-    test.cleanup()
+    run_standalone(VPCFlowLogsTest, vpc_id=vpc_id, s3_bucket_arn=s3_bucket_arn)
     print("Test 206 complete")
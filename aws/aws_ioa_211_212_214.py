@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 import argparse
-import boto3
-import sys
+import concurrent.futures
 import time
 from botocore.exceptions import ClientError
+from engine.clock import sleep
+from engine.lifecycle import LazyClient, PolicyTest, run_with_profile
+from engine.lookup import find_repository, find_security_groups
+from engine.state import recall
 
 """
 
@@ -21,391 +24,408 @@ Pattern: Creates ECR repository with policy, describes repositories and gets pol
 
 """
 
-# Set up and parse options
-parser = argparse.ArgumentParser(description="CSPM AWS IOA Test script")
-
-parser.add_argument(
-    "-p",
-    "--policy",
-    type=int,
-    dest="policies",
-    action="append",
-    default=[211, 212, 214],
-    help="REQUIRED: Which policy to run. Can have multiple instances to run multiple tests.",
-)
-parser.add_argument(
-    "-i",
-    "--iterations",
-    type=int,
-    dest="iterations",
-    default=1,
-    help="How many times to run each action (defaults to 1)",
-)
-parser.add_argument(
-    "-b",
-    "--before",
-    action="store_true",
-    dest="run_before",
-    default=False,
-    help="Whether to run any before_query actions",
-)
-parser.add_argument(
-    "-a",
-    "--after",
-    action="store_true",
-    dest="run_after",
-    default=False,
-    help="Whether to run any after_query actions",
-)
-parser.add_argument(
-    "aws_cli_profile",
-    action="store",
-    help="The name of the AWS CLI profile you wish to use",
-)
-options = parser.parse_args()
-
-if len(options.policies) == 0:
-    parser.error("Need to specify at least one policy to run")
-    parser.print_help()
-
-try:
-    boto3_session = boto3.Session(profile_name=options.aws_cli_profile)
-except:
-    print(
-        "Failed to start boto3 session with given profile: " + options.aws_cli_profile
-    )
-    parser.print_help()
-    sys.exit(1)
-
-print("Running policy(s):")
-print(*options.policies, sep=", ")
-print("Include before actions: " + str(options.run_before))
-print("Include after actions: " + str(options.run_after))
-print("Iterations of each action to run: " + str(options.iterations))
-
-if 211 in options.policies:
-    # EC2 security group modified to allow ingress from the public internet
-    print("---Running Policy 211---")
-    ec2 = boto3_session.client("ec2", region_name="us-west-2")
-
-    # Set up resources to use
-    security_group_id = None
-    try:
-        # Check whether the SG already exists
-        result = ec2.describe_security_groups()
-        for sg in result["SecurityGroups"]:
-            if sg["GroupName"] == "CSPM_Testing_policy_211":
-                print("Test security group already exists, deleting: ", sg["GroupId"])
-                result = ec2.delete_security_group(GroupId=sg["GroupId"])
-                break
-
-        # Create the test SG
-        # Find the first VPC
-        result = ec2.describe_vpcs()
-        vpc_id = result.get("Vpcs", [{}])[0].get("VpcId", "")
-        result = ec2.create_security_group(
-            GroupName="CSPM_Testing_policy_211",
-            Description="For testing CSPM policy 211, temporary",
-        )
-        security_group_id = result["GroupId"]
-
-        # Give the new group a bit to show up everywhere
-        time.sleep(5)
-        print(
-            "["
-            + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-            + "] "
-            + "Created test security group: ",
-            security_group_id,
-        )
-    except ClientError as e:
-        print(e)
-
-    # before: ec2:DescribeSecurityGroups, ec2:DescribeInstances
-    if options.run_before:
-        for x in range(0, options.iterations):
-            result = ec2.describe_security_groups(MaxResults=5)
+ALL_POLICIES = [211, 212, 214]
+REGION = "us-west-2"
+REPOSITORY_NAME = "cspm_testing_policy_214"
+
+
+def print_result(result, action, status=False):
+    line = "[" + result["ResponseMetadata"]["HTTPHeaders"]["date"] + "] " + action
+    if status:
+        line += " status: " + str(result["ResponseMetadata"]["HTTPStatusCode"])
+    print(line)
+
+
+class SecurityGroupTest(PolicyTest):
+    ec2 = LazyClient("ec2", region_name=REGION)
+    ecr = LazyClient("ecr", region_name=REGION)
+
+    def __init__(
+        self,
+        session,
+        policies=None,
+        iterations=1,
+        run_before=False,
+        run_after=False,
+        batch_size=1,
+        concurrency=1,
+    ):
+        super(SecurityGroupTest, self).__init__(session)
+        self.policies = list(policies or ALL_POLICIES)
+        self.iterations = iterations
+        self.run_before = run_before
+        self.run_after = run_after
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.security_group_ids = {}
+        self.target_repository = None
+        # (policy, IpPermissions) of every authorize call, for reset_ioa
+        self.authorized = []
+        # action -> [API calls made, seconds spent making them]
+        self.events = {}
+
+    def repeat(self, action, count, call, status=False):
+        """
+        Run call(x) for x in range(count), on self.concurrency threads, and
+        count each call as one CloudTrail event for the report.
+        """
+        start = time.monotonic()
+        if self.concurrency > 1 and count > 1:
+            with concurrent.futures.ThreadPoolExecutor(self.concurrency) as pool:
+                results = list(pool.map(call, range(count)))
+        else:
+            results = [call(x) for x in range(count)]
+        elapsed = time.monotonic() - start
+        for result in results:
+            print_result(result, action, status)
+        events = self.events.setdefault(action, [0, 0.0])
+        events[0] += count
+        events[1] += elapsed
+        return results
+
+    def print_event_report(self):
+        if not self.events:
+            return
+        print("---CloudTrail events produced---")
+        total_events = 0
+        total_seconds = 0.0
+        for action, (count, seconds) in self.events.items():
             print(
-                "["
-                + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-                + "] ec2:DescribeSecurityGroups"
-            )
-        for x in range(0, options.iterations):
-            result = ec2.describe_instances()
-            print(
-                "["
-                + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-                + "] ec2:DescribeInstances"
+                "%-44s %6d event(s) in %6.2fs, %8.1f/s"
+                % (action, count, seconds, count / max(seconds, 1e-6))
             )
-
-    # policy: ec2:AuthorizeSecurityGroupIngress where
-    # .requestParameters.ipPermissions.items[].ipRanges.items[].cidrIp == "0.0.0.0/0" OR
-    # .requestParameters.ipPermissions.items[].ipv6Ranges.items[].cidrIpv6 == "::/0"
-    for x in range(0, options.iterations):
-        result = ec2.authorize_security_group_ingress(
-            GroupId=security_group_id,
-            IpPermissions=[
-                {
-                    "IpProtocol": "tcp",
-                    "FromPort": 22 + x,
-                    "ToPort": 22 + x,
-                    "IpRanges": [{"CidrIp": "0.0.0.0/0"}],
-                }
-            ],
-        )
-        print(
-            "["
-            + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-            + "] ec2:AuthorizeSecurityGroupIngress (ipv4)"
-            + " status: "
-            + str(result["ResponseMetadata"]["HTTPStatusCode"])
-        )
-
-    for x in range(0, options.iterations):
-        result = ec2.authorize_security_group_ingress(
-            GroupId=security_group_id,
-            IpPermissions=[
-                {
-                    "IpProtocol": "tcp",
-                    "FromPort": 22 + x,
-                    "ToPort": 22 + x,
-                    "Ipv6Ranges": [{"CidrIpv6": "::/0"}],
-                }
-            ],
-        )
+            total_events += count
+            total_seconds += seconds
         print(
-            "["
-            + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-            + "] ec2:AuthorizeSecurityGroupIngress (ipv6)"
-            + " status: "
-            + str(result["ResponseMetadata"]["HTTPStatusCode"])
-        )
-
-    # after: ec2:DescribeInstances
-    if options.run_after:
-        for x in range(0, options.iterations):
-            result = ec2.describe_instances()
-            print(
-                "["
-                + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-                + "] ec2:DescribeInstances"
+            "%-44s %6d event(s) in %6.2fs, %8.1f/s"
+            % (
+                "total",
+                total_events,
+                total_seconds,
+                total_events / max(total_seconds, 1e-6),
             )
-
-    # Cleanup
-    try:
-        result = ec2.delete_security_group(GroupId=security_group_id)
-        print(
-            "Deleted the test security group. status: "
-            + str(result["ResponseMetadata"]["HTTPStatusCode"])
         )
-    except ClientError as e:
-        print(e)
-
-if 212 in options.policies:
-    # EC2 security group modified to allow egress to the public internet
-    print("---Running Policy 212---")
-    ec2 = boto3_session.client("ec2", region_name="us-west-2")
-
-    # Set up resources to use
-    security_group_id = None
-    try:
-        # Check whether the SG already exists
-        result = ec2.describe_security_groups()
-        for sg in result["SecurityGroups"]:
-            if sg["GroupName"] == "CSPM_Testing_policy_212":
-                print("Test security group already exists, deleting: ", sg["GroupId"])
-                ec2.delete_security_group(GroupId=sg["GroupId"])
-                break
-
-        # Create the test SG
-        # Find the first VPC
-        result = ec2.describe_vpcs()
-        vpc_id = result.get("Vpcs", [{}])[0].get("VpcId", "")
-        result = ec2.create_security_group(
-            GroupName="CSPM_Testing_policy_212",
-            Description="For testing CSPM policy 212, temporary",
-        )
-        security_group_id = result["GroupId"]
 
-        # Give the new group a bit to show up everywhere
-        time.sleep(5)
-        print(
-            "["
-            + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-            + "] "
-            + "Created test security group: ",
-            security_group_id,
+    def _sg_policies(self):
+        return [p for p in (211, 212) if p in self.policies]
+
+    def _create_group(self, policy, group_name):
+        return self.ec2.create_security_group(
+            GroupName=group_name,
+            Description="For testing CSPM policy %d, temporary" % policy,
         )
-    except ClientError as e:
-        print(e)
 
-    # before: ec2:DescribeSecurityGroups, ec2:DescribeInstances
-    if options.run_before:
-        for x in range(0, options.iterations):
-            result = ec2.describe_security_groups(MaxResults=5)
+    def delete_known_group(self, group_id):
+        try:
+            self.ec2.delete_security_group(GroupId=group_id)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "InvalidGroup.NotFound":
+                raise
+
+    def create_security_group(self, policy):
+        group_name = "CSPM_Testing_policy_%d" % policy
+        # Set up resources to use
+        security_group_id = None
+        try:
+            # Delete the SG an earlier run left behind, if it recorded one
+            region = self.ec2.meta.region_name
+            for sg in recall("ec2:security-group", name=group_name, region=region):
+                print("Test security group already exists, deleting: ", sg.resource_id)
+                self.delete_known_group(sg.resource_id)
+
+            # Create the test SG
+            # Find the first VPC
+            result = self.ec2.describe_vpcs()
+            vpc_id = result.get("Vpcs", [{}])[0].get("VpcId", "")
+            try:
+                result = self._create_group(policy, group_name)
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "InvalidGroup.Duplicate":
+                    raise
+                # Made outside the state store, so look it up
+                for sg in find_security_groups(self.ec2, group_name):
+                    print(
+                        "Test security group already exists, deleting: ", sg["GroupId"]
+                    )
+                    self.ec2.delete_security_group(GroupId=sg["GroupId"])
+                result = self._create_group(policy, group_name)
+            security_group_id = result["GroupId"]
+
+            # Give the new group a bit to show up everywhere
+            sleep(5)
             print(
                 "["
                 + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-                + "] ec2:DescribeSecurityGroups"
+                + "] "
+                + "Created test security group: ",
+                security_group_id,
+            )
+        except ClientError as e:
+            print(e)
+        self.security_group_ids[policy] = security_group_id
+
+    def create_repository(self):
+        # Set up resources for test
+        try:
+            # Check whether the repository already exists
+            repo = find_repository(self.ecr, REPOSITORY_NAME)
+            if repo is not None:
+                print(
+                    "Test repository already exists, deleting: ", repo["repositoryName"]
+                )
+                self.ecr.delete_repository(repositoryName=repo["repositoryName"])
+
+            # Create the test Repo
+            result = self.ecr.create_repository(repositoryName=REPOSITORY_NAME)
+            self.target_repository = result["repository"]["repositoryName"]
+            result = self.ecr.set_repository_policy(
+                repositoryName=self.target_repository,
+                force=False,
+                policyText='{"Version": "2008-10-17","Statement": [{"Sid": "testing only","Effect": "Deny","Principal": {"Service": "codebuild.amazonaws.com"},"Action": ["ecr:GetLifecyclePolicy"]}]}',
             )
-        for x in range(0, options.iterations):
-            result = ec2.describe_instances()
+
+            # Give the new object a bit to show up everywhere
+            sleep(5)
             print(
                 "["
                 + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-                + "] ec2:DescribeInstances"
+                + "] "
+                + "Created test repository: ",
+                self.target_repository,
             )
-
-    # policy: ec2:AuthorizeSecurityGroupEgress where
-    # .requestParameters.ipPermissions.items[].ipRanges.items[].cidrIp == "0.0.0.0/0" OR
-    # .requestParameters.ipPermissions.items[].ipv6Ranges.items[].cidrIpv6 == "::/0"
-    for x in range(0, options.iterations):
-        result = ec2.authorize_security_group_egress(
-            GroupId=security_group_id,
-            IpPermissions=[
-                {
-                    "IpProtocol": "tcp",
-                    "FromPort": 22 + x,
-                    "ToPort": 22 + x,
-                    "IpRanges": [{"CidrIp": "0.0.0.0/0"}],
-                }
-            ],
-        )
-        print(
-            "["
-            + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-            + "] ec2:AuthorizeSecurityGroupEgress (ipv4)"
-            + " status: "
-            + str(result["ResponseMetadata"]["HTTPStatusCode"])
+        except ClientError as e:
+            print(e)
+
+    def describe_instances(self):
+        self.repeat(
+            "ec2:DescribeInstances",
+            self.iterations,
+            lambda x: self.ec2.describe_instances(),
         )
 
-    for x in range(0, options.iterations):
-        result = ec2.authorize_security_group_egress(
-            GroupId=security_group_id,
-            IpPermissions=[
+    def authorize(self, policy, ip_range_key, ip_range, label):
+        # policy: ec2:AuthorizeSecurityGroupIngress/Egress where
+        # .requestParameters.ipPermissions.items[].ipRanges.items[].cidrIp == "0.0.0.0/0" OR
+        # .requestParameters.ipPermissions.items[].ipv6Ranges.items[].cidrIpv6 == "::/0"
+        if policy == 211:
+            authorize = self.ec2.authorize_security_group_ingress
+            action = "ec2:AuthorizeSecurityGroupIngress"
+        else:
+            authorize = self.ec2.authorize_security_group_egress
+            action = "ec2:AuthorizeSecurityGroupEgress"
+        # One rule per iteration, on ports 22, 23, ..., batch_size rules per call
+        ports = list(range(22, 22 + self.iterations))
+        batches = [
+            ports[i : i + self.batch_size]
+            for i in range(0, len(ports), self.batch_size)
+        ]
+
+        def call(x):
+            permissions = [
                 {
                     "IpProtocol": "tcp",
-                    "FromPort": 22 + x,
-                    "ToPort": 22 + x,
-                    "Ipv6Ranges": [{"CidrIpv6": "::/0"}],
+                    "FromPort": port,
+                    "ToPort": port,
+                    ip_range_key: [ip_range],
                 }
-            ],
-        )
-        print(
-            "["
-            + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-            + "] ec2:AuthorizeSecurityGroupEgress (ipv6)"
-            + " status: "
-            + str(result["ResponseMetadata"]["HTTPStatusCode"])
+                for port in batches[x]
+            ]
+            result = authorize(
+                GroupId=self.security_group_ids[policy], IpPermissions=permissions
+            )
+            self.authorized.append((policy, permissions))
+            return result
+
+        self.repeat("%s (%s)" % (action, label), len(batches), call, status=True)
+
+    def setup(self):
+        print("Running policy(s):")
+        print(*self.policies, sep=", ")
+        print("Include before actions: " + str(self.run_before))
+        print("Include after actions: " + str(self.run_after))
+        print("Iterations of each action to run: " + str(self.iterations))
+        print("Security group rules per call: " + str(self.batch_size))
+        print("Concurrent calls: " + str(self.concurrency))
+        for policy in self._sg_policies():
+            print("---Setting up Policy %d---" % policy)
+            self.create_security_group(policy)
+        if 214 in self.policies:
+            print("---Setting up Policy 214---")
+            self.create_repository()
+
+    def trigger_before(self):
+        if not self.run_before:
+            return
+        for policy in self._sg_policies():
+            # before: ec2:DescribeSecurityGroups, ec2:DescribeInstances
+            print("---Running Policy %d before actions---" % policy)
+            self.repeat(
+                "ec2:DescribeSecurityGroups",
+                self.iterations,
+                lambda x: self.ec2.describe_security_groups(MaxResults=5),
+            )
+            self.describe_instances()
+        if 214 in self.policies:
+            # before: ecr:DescribeRepositories, ecr:GetRepositoryPolicy
+            print("---Running Policy 214 before actions---")
+            self.repeat(
+                "ecr:DescribeRepositories",
+                self.iterations,
+                lambda x: self.ecr.describe_repositories(maxResults=10),
+            )
+            self.get_repository_policy()
+
+    def get_repository_policy(self):
+        self.repeat(
+            "ecr:GetRepositoryPolicy",
+            self.iterations,
+            lambda x: self.ecr.get_repository_policy(
+                repositoryName=self.target_repository
+            ),
         )
 
-    # after: ec2:DescribeInstances
-    if options.run_after:
-        for x in range(0, options.iterations):
-            result = ec2.describe_instances()
-            print(
-                "["
-                + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-                + "] ec2:DescribeInstances"
+    def trigger_ioa(self):
+        for policy in self._sg_policies():
+            # EC2 security group modified to allow ingress/egress from/to the public internet
+            print("---Running Policy %d---" % policy)
+            self.authorize(policy, "IpRanges", {"CidrIp": "0.0.0.0/0"}, "ipv4")
+            self.authorize(policy, "Ipv6Ranges", {"CidrIpv6": "::/0"}, "ipv6")
+        if 214 in self.policies:
+            # ECR repository policy modified to allow public access
+            print("---Running Policy 214---")
+            # policy: ecr:SetRepositoryPolicy with principal=*
+            # One policy per call, so iterations can only be spread over threads
+            self.repeat(
+                "ecr:SetRepositoryPolicy",
+                self.iterations,
+                lambda x: self.ecr.set_repository_policy(
+                    repositoryName=self.target_repository,
+                    force=False,
+                    policyText='{"Version": "2008-10-17","Statement": [{"Sid": "testing only","Effect": "Allow","Principal": "*","Action": ["ecr:GetLifecyclePolicy"]}]}',
+                ),
+                status=True,
             )
 
-    # Cleanup
-    try:
-        result = ec2.delete_security_group(GroupId=security_group_id)
-        print(
-            "Deleted the test security group. status: "
-            + str(result["ResponseMetadata"]["HTTPStatusCode"])
-        )
-    except ClientError as e:
-        print(e)
-
-if 214 in options.policies:
-    # ECR repository policy modified to allow public access
-    print("---Running Policy 214---")
-    ecr = boto3_session.client("ecr", region_name="us-west-2")
-
-    # Set up resources for test
-    target_repository = None
-    try:
-        # Check whether the repository already exists
-        result = ecr.describe_repositories()
-        for repo in result["repositories"]:
-            if repo["repositoryName"] == "cspm_testing_policy_214":
+    def reset_ioa(self):
+        # Revoke the rules so the next authorize adds them again
+        while self.authorized:
+            policy, permissions = self.authorized.pop()
+            if policy == 211:
+                revoke = self.ec2.revoke_security_group_ingress
+            else:
+                revoke = self.ec2.revoke_security_group_egress
+            revoke(GroupId=self.security_group_ids[policy], IpPermissions=permissions)
+
+    def trigger_after(self):
+        if not self.run_after:
+            return
+        for policy in self._sg_policies():
+            # after: ec2:DescribeInstances
+            print("---Running Policy %d after actions---" % policy)
+            self.describe_instances()
+        if 214 in self.policies:
+            # after: any action on same ECR
+            print("---Running Policy 214 after actions---")
+            self.get_repository_policy()
+
+    def cleanup(self):
+        self.print_event_report()
+        for policy in self._sg_policies():
+            try:
+                result = self.ec2.delete_security_group(
+                    GroupId=self.security_group_ids[policy]
+                )
                 print(
-                    "Test repository already exists, deleting: ", repo["repositoryName"]
+                    "Deleted the test security group. status: "
+                    + str(result["ResponseMetadata"]["HTTPStatusCode"])
                 )
-                ecr.delete_repository(repositoryName=repo["repositoryName"])
-                break
-
-        # Create the test Repo
-        result = ecr.create_repository(repositoryName="cspm_testing_policy_214")
-        target_repository = result["repository"]["repositoryName"]
-        result = ecr.set_repository_policy(
-            repositoryName=target_repository,
-            force=False,
-            policyText='{"Version": "2008-10-17","Statement": [{"Sid": "testing only","Effect": "Deny","Principal": {"Service": "codebuild.amazonaws.com"},"Action": ["ecr:GetLifecyclePolicy"]}]}',
-        )
+            except ClientError as e:
+                print(e)
+        if 214 in self.policies:
+            try:
+                result = self.ecr.delete_repository(
+                    repositoryName=self.target_repository
+                )
+                print(
+                    "Deleted the test repository. status: "
+                    + str(result["ResponseMetadata"]["HTTPStatusCode"])
+                )
+            except ClientError as e:
+                print(e)
 
-        # Give the new object a bit to show up everywhere
-        time.sleep(5)
-        print(
-            "["
-            + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-            + "] "
-            + "Created test repository: ",
-            target_repository,
-        )
-    except ClientError as e:
-        print(e)
 
-    # before: ecr:DescribeRepositories, ecr:GetRepositoryPolicy
-    if options.run_before:
-        for x in range(0, options.iterations):
-            result = ecr.describe_repositories(maxResults=10)
-            print(
-                "["
-                + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-                + "] ecr:DescribeRepositories"
-            )
-        for x in range(0, options.iterations):
-            result = ecr.get_repository_policy(repositoryName=target_repository)
-            print(
-                "["
-                + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-                + "] ecr:GetRepositoryPolicy"
-            )
+POLICY_TEST = SecurityGroupTest
 
-    # policy: ecr:SetRepositoryPolicy with principal=*
-    for x in range(0, options.iterations):
-        result = ecr.set_repository_policy(
-            repositoryName=target_repository,
-            force=False,
-            policyText='{"Version": "2008-10-17","Statement": [{"Sid": "testing only","Effect": "Allow","Principal": "*","Action": ["ecr:GetLifecyclePolicy"]}]}',
-        )
-        print(
-            "["
-            + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-            + "] ecr:SetRepositoryPolicy"
-            + " status: "
-            + str(result["ResponseMetadata"]["HTTPStatusCode"])
-        )
 
-    # after: any action on same ECR
-    if options.run_after:
-        for x in range(0, options.iterations):
-            result = ecr.get_repository_policy(repositoryName=target_repository)
-            print(
-                "["
-                + result["ResponseMetadata"]["HTTPHeaders"]["date"]
-                + "] ecr:GetRepositoryPolicy"
-            )
+def parse_args():
+    # Set up and parse options
+    parser = argparse.ArgumentParser(description="CSPM AWS IOA Test script")
 
-    # Cleanup
-    try:
-        result = ecr.delete_repository(repositoryName=target_repository)
-        print(
-            "Deleted the test repository. status: "
-            + str(result["ResponseMetadata"]["HTTPStatusCode"])
-        )
-    except ClientError as e:
-        print(e)
+    parser.add_argument(
+        "-p",
+        "--policy",
+        type=int,
+        dest="policies",
+        action="append",
+        choices=ALL_POLICIES,
+        help="Which policy to run. Can have multiple instances to run multiple tests. Defaults to 211, 212 and 214.",
+    )
+    parser.add_argument(
+        "-i",
+        "--iterations",
+        type=int,
+        dest="iterations",
+        default=1,
+        help="How many times to run each action (defaults to 1)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        dest="batch_size",
+        default=1,
+        help="How many security group rules to add per authorize call (defaults to 1, one call per iteration)",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        dest="concurrency",
+        default=1,
+        help="How many calls to make at the same time for actions that can't be batched (defaults to 1)",
+    )
+    parser.add_argument(
+        "-b",
+        "--before",
+        action="store_true",
+        dest="run_before",
+        default=False,
+        help="Whether to run any before_query actions",
+    )
+    parser.add_argument(
+        "-a",
+        "--after",
+        action="store_true",
+        dest="run_after",
+        default=False,
+        help="Whether to run any after_query actions",
+    )
+    parser.add_argument(
+        "aws_cli_profile",
+        nargs="?",
+        help="The name of the AWS CLI profile you wish to use (defaults to profile in config.ini, not needed offline)",
+    )
+    return parser, parser.parse_args()
+
+
+if __name__ == "__main__":
+    parser, options = parse_args()
+    run_with_profile(
+        SecurityGroupTest,
+        options.aws_cli_profile,
+        policies=options.policies,
+        iterations=options.iterations,
+        run_before=options.run_before,
+        run_after=options.run_after,
+        batch_size=options.batch_size,
+        concurrency=options.concurrency,
+    )
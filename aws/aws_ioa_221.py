@@ -7,12 +7,9 @@ Pattern: Creates SNS topic, gets topic attributes, then adds public permission t
 
 """
 
-import sys, time
-
-import boto3
-
-from utils import AWS_RESOURCE_TAGS
-
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from engine.output import show_response
+from utils import aws_resource_tags
 
 TEST_EMAIL = "esther.nam@crowdstrike.com"
 IOA_TOPIC = "cspm-ioa-test"
@@ -21,10 +18,18 @@ SLEEP_SECONDS = 3
 DIV_LINE = "*" * 80
 
 
-class SNSTest(object):
+class SNSTest(PolicyTest):
+    phase_delays = {
+        "trigger_before": SLEEP_SECONDS,
+        "trigger_ioa": SLEEP_SECONDS,
+        "trigger_after": SLEEP_SECONDS,
+        "cleanup": SLEEP_SECONDS,
+    }
+
+    client = LazyClient("sns")
+
     def __init__(self, session, topic_name=IOA_TOPIC):
-        self.session = session
-        self.client = self.session.client("sns")
+        super(SNSTest, self).__init__(session)
         self.topic_name = topic_name
         self._topic = None  # will be set after setup
 
@@ -47,10 +52,10 @@ class SNSTest(object):
         print("Creating topic", self.topic_name)
         new_topic = self.client.create_topic(
             Name=self.topic_name,
-            Tags=AWS_RESOURCE_TAGS,
+            Tags=aws_resource_tags(),
         )
 
-        print("Response:\n", new_topic)
+        show_response("create-topic", new_topic)
         print("Topic created:", new_topic["TopicArn"])
         self.topic = self.session.resource("sns").Topic(new_topic["TopicArn"])
 
@@ -58,8 +63,7 @@ class SNSTest(object):
         print(DIV_LINE)
         print("Triggering IOA before correlation: get attribute")
         result = self.client.get_topic_attributes(TopicArn=self.topic.arn)
-        print(result)
-        print(result["ResponseMetadata"]["HTTPHeaders"]["date"])
+        show_response("get-topic-attributes", result)
 
     def trigger_ioa(self):
         print(DIV_LINE)
@@ -67,7 +71,7 @@ class SNSTest(object):
         result = self.topic.add_permission(
             Label=IOA_POLICY_NAME, AWSAccountId=["*"], ActionName=["Publish"]
         )
-        print(result)
+        show_response("add-permission", result)
 
     def trigger_after(self):
         print(DIV_LINE)
@@ -77,9 +81,12 @@ class SNSTest(object):
             Protocol="email",
             Endpoint=TEST_EMAIL,
         )
-        print(result)
+        show_response("subscribe", result)
 
     def cleanup(self):
+        if self._topic is None:
+            # setup failed before the topic was created
+            return
         print(DIV_LINE)
         print("Cleanup (remove perms)")
         self.topic.remove_permission(
@@ -87,32 +94,15 @@ class SNSTest(object):
         )
         print("Verify public permission removed")
         result = self.client.get_topic_attributes(TopicArn=self.topic.arn)
-        print(result)
+        show_response("get-topic-attributes", result)
         print("Deleting SNS topic")
         result = self.client.delete_topic(TopicArn=self.topic.arn)
         print("SNS topic deleted at", result["ResponseMetadata"]["HTTPHeaders"]["date"])
 
 
-if __name__ == "__main__":
-    aws_profile = sys.argv[1]
-    print("Using AWS profile", aws_profile)
-    botosession = boto3.Session(profile_name=aws_profile)
+POLICY_TEST = SNSTest
 
+if __name__ == "__main__":
     print("Setting up for Policy 221 test")
-    test = SNSTest(botosession)
-    # use this if you didn't clean up sns topic
-    # test.topic = botosession.resource('sns').Topic('arn:aws:sns:us-east-1:$$$ACCOUNTID$$$:cspm-ioa-test')
-    test.setup()
-    time.sleep(SLEEP_SECONDS)
-
-    test.trigger_before()
-    time.sleep(SLEEP_SECONDS)
-
-    test.trigger_ioa()
-    time.sleep(SLEEP_SECONDS)
-
-    test.trigger_after()
-    time.sleep(SLEEP_SECONDS)
-
-    test.cleanup()
+    run_standalone(SNSTest)
     print("Test 221 complete")
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
-import boto3, sys, time, json
-from botocore.exceptions import ClientError
-from utils import AWS_RESOURCE_TAGS
+from engine.fixtures import Fixture, fixture_name, lease_fixture
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from engine.lookup import paginate
+from engine.waiters import wait_for_waiter
+from utils import aws_resource_tags
 
 """
 
@@ -13,124 +15,201 @@ Pattern: Creates EC2 instance, describes instances and images, copies image, the
 
 
 REGION = "us-east-1"
+IMAGE_NAME = "223IOA"
 
-aws_profile = sys.argv[1]
-client = boto3.Session(profile_name=aws_profile).client("ec2", region_name=REGION)
-images = client.describe_images(
-    Owners=["amazon"], Filters=[{"Name": "name", "Values": ["amzn2-ami-hvm*"]}]
-)
-IMAGEAMI = images["Images"][0]["ImageId"]
-
-TAGS = AWS_RESOURCE_TAGS
-
-
-def set_up():
-    create_image = client.run_instances(
-        ImageId=IMAGEAMI,
-        InstanceType="t3.micro",
-        MinCount=1,
-        MaxCount=1,
-        TagSpecifications=[{"ResourceType": "instance", "Tags": TAGS}],
-    )
-    print(f"CREATE OUTPUT: {create_image}")
-    instance_id = create_image["Instances"][0]["InstanceId"]
-    time.sleep(30)
-    return instance_id
-
-
-def trigger_223_before(instance):
-    print("Running 223 before")
-    describe_instances = client.describe_instances()
-    describe_instance_attribute = client.describe_instance_attribute(
-        Attribute="instanceType", InstanceId=instance
-    )
-    describe_images = client.describe_images(ImageIds=[IMAGEAMI])
-
-    copy_image = client.copy_image(
-        Name="223IOA",
-        SourceImageId=IMAGEAMI,
-        SourceRegion=REGION,
-    )
-
-    copied_image_id = copy_image["ImageId"]
-    print("Waiting for image to become available...")
-    status = client.describe_images(
-        Filters=[
-            {"Name": "image-id", "Values": [copied_image_id]},
-            {"Name": "state", "Values": ["available"]},
-        ]
-    )
-    while len(status["Images"]) < 1:
-        time.sleep(30)
-        status = client.describe_images(
-            Filters=[
-                {"Name": "image-id", "Values": [copied_image_id]},
-                {"Name": "state", "Values": ["available"]},
-            ]
-        )
-        print(status)
 
-    return copied_image_id
+class AMIShareFixture(Fixture):
+    """A running instance and a private copy of the AMI it was launched from"""
 
+    name = "ec2-223"
 
-def trigger_223_pattern(instance, copied_image_id):
-    try:
-        modify_image_attribute = client.modify_image_attribute(
-            ImageId=copied_image_id,
-            LaunchPermission={
-                "Add": [
-                    {"Group": "all"},
-                ],
-            },
-        )
-    except Exception as e:
-        print(e)
-        clean_up(instance, copied_image_id)
-
-
-def trigger_223_after(copied_image):
-    print("RUNNING AFTER")
-    run_instances = client.run_instances(
-        ImageId=copied_image,
-        InstanceType="t3.micro",
-        MaxCount=1,
-        MinCount=1,
-        TagSpecifications=[{"ResourceType": "instance", "Tags": TAGS}],
-    )
-    image_id = run_instances["Instances"][0]["InstanceId"]
-    return image_id
-
+    def plan(self, generation):
+        return {"name": fixture_name(IMAGE_NAME, generation)}
 
-def clean_up(instances, copied_image_id):
-    print("CLEANING UP")
-    if type(instances) is str:
-        instances = list(instances.split(","))
-    delete_instances = client.terminate_instances(InstanceIds=instances)
-    delete_image = client.deregister_image(ImageId=copied_image_id)
-    print(delete_image, delete_instances)
+    def ensure(self, test, resources):
+        name = resources["name"]
+        base_image = resources.get("base_image") or test.find_base_image()
+        instance_id = test.find_instance(name) or test.set_up(base_image, name)
+        wait_for_waiter(
+            test.client,
+            "instance_running",
+            "instance " + instance_id,
+            delay=5,
+            InstanceIds=[instance_id],
+        )
+        copied_image_id = test.find_copied_image(name) or test.copy_image(
+            base_image, name
+        )
+        print("Waiting for image to become available...")
+        wait_for_waiter(
+            test.client,
+            "image_available",
+            "image " + copied_image_id,
+            ImageIds=[copied_image_id],
+        )
+        return {
+            "name": name,
+            "base_image": base_image,
+            "instance": instance_id,
+            "image": copied_image_id,
+        }
+
+    def alive(self, test, resources):
+        return test.find_instance(resources["name"]) == resources[
+            "instance"
+        ] and test.find_copied_image(resources["name"]) == resources.get("image")
+
+    def reset(self, test, resources):
+        # Policy 223 made the copy public
+        test.client.modify_image_attribute(
+            ImageId=resources["image"],
+            LaunchPermission={"Remove": [{"Group": "all"}]},
+        )
 
+    def destroy(self, test, resources):
+        instance_id = test.find_instance(resources["name"])
+        test.clean_up(
+            [instance_id] if instance_id else [],
+            test.find_copied_image(resources["name"]),
+        )
 
-def main():
-    # Creating Instance List For Clean Up
-    instances = list()
 
-    # Prep
-    instance_id = set_up()
+class AMIShareTest(PolicyTest):
+    client = LazyClient("ec2", region_name=REGION)
 
-    # Before Condition
-    copied_image_id = trigger_223_before(instance_id)
+    def __init__(self, session):
+        super(AMIShareTest, self).__init__(session)
+        self.fixture = None
+        self.image_ami = None
+        self.copied_image_id = None
+        # Creating Instance List For Clean Up
+        self.instances = list()
 
-    # Pattern Condition
-    trigger_223_pattern(copied_image_id, copied_image_id)
+    def find_base_image(self):
+        images = self.client.describe_images(
+            Owners=["amazon"], Filters=[{"Name": "name", "Values": ["amzn2-ami-hvm*"]}]
+        )
+        return images["Images"][0]["ImageId"]
+
+    def find_instance(self, name):
+        """The pending or running instance tagged with name, or None"""
+        for reservation in paginate(
+            self.client,
+            "describe_instances",
+            "Reservations",
+            Filters=[
+                {"Name": "tag:Name", "Values": [name]},
+                {"Name": "instance-state-name", "Values": ["pending", "running"]},
+            ],
+        ):
+            for instance in reservation["Instances"]:
+                return instance["InstanceId"]
+        return None
+
+    def find_copied_image(self, name):
+        images = self.client.describe_images(
+            Owners=["self"], Filters=[{"Name": "name", "Values": [name]}]
+        )["Images"]
+        return images[0]["ImageId"] if images else None
+
+    def set_up(self, image_ami, name):
+        create_image = self.client.run_instances(
+            ImageId=image_ami,
+            InstanceType="t3.micro",
+            MinCount=1,
+            MaxCount=1,
+            TagSpecifications=[
+                {
+                    "ResourceType": "instance",
+                    "Tags": aws_resource_tags() + [{"Key": "Name", "Value": name}],
+                }
+            ],
+        )
+        print(f"CREATE OUTPUT: {create_image}")
+        return create_image["Instances"][0]["InstanceId"]
+
+    def copy_image(self, image_ami, name):
+        copy_image = self.client.copy_image(
+            Name=name,
+            SourceImageId=image_ami,
+            SourceRegion=REGION,
+        )
+        return copy_image["ImageId"]
 
-    # After Condition
-    instance_id2 = trigger_223_after(copied_image_id)
+    def trigger_223_before(self, instance):
+        print("Running 223 before")
+        describe_instances = self.client.describe_instances()
+        describe_instance_attribute = self.client.describe_instance_attribute(
+            Attribute="instanceType", InstanceId=instance
+        )
+        describe_images = self.client.describe_images(ImageIds=[self.image_ami])
 
-    # Clean Up
-    instances.append(instance_id)
-    instances.append(instance_id2)
-    clean_up(instances, copied_image_id)
+    def trigger_223_pattern(self, copied_image_id):
+        modify_image_attribute = self.client.modify_image_attribute(
+            ImageId=copied_image_id,
+            LaunchPermission={
+                "Add": [
+                    {"Group": "all"},
+                ],
+            },
+        )
 
+    def trigger_223_after(self, copied_image):
+        print("RUNNING AFTER")
+        run_instances = self.client.run_instances(
+            ImageId=copied_image,
+            InstanceType="t3.micro",
+            MaxCount=1,
+            MinCount=1,
+            TagSpecifications=[
+                {"ResourceType": "instance", "Tags": aws_resource_tags()}
+            ],
+        )
+        image_id = run_instances["Instances"][0]["InstanceId"]
+        self.instances.append(image_id)
+        return image_id
+
+    def clean_up(self, instances, copied_image_id):
+        print("CLEANING UP")
+        if type(instances) is str:
+            instances = list(instances.split(","))
+        delete_instances = None
+        delete_image = None
+        if instances:
+            delete_instances = self.client.terminate_instances(InstanceIds=instances)
+        if copied_image_id:
+            delete_image = self.client.deregister_image(ImageId=copied_image_id)
+        print(delete_image, delete_instances)
+
+    def setup(self):
+        # Prep: the instance and the copied image
+        self.fixture = lease_fixture(AMIShareFixture(), self)
+        self.instance_id = self.fixture.resources["instance"]
+        self.image_ami = self.fixture.resources["base_image"]
+        self.copied_image_id = self.fixture.resources["image"]
+
+    def trigger_before(self):
+        # Before Condition
+        self.trigger_223_before(self.instance_id)
+
+    def trigger_ioa(self):
+        # Pattern Condition
+        self.trigger_223_pattern(self.copied_image_id)
+
+    def trigger_after(self):
+        # After Condition
+        self.trigger_223_after(self.copied_image_id)
+
+    def cleanup(self):
+        # Clean Up
+        try:
+            self.clean_up(self.instances, None)
+        finally:
+            if self.fixture is not None:
+                self.fixture.release()
+
+
+POLICY_TEST = AMIShareTest
 
 if __name__ == "__main__":
-    main()
+    run_standalone(AMIShareTest)
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
-import boto3, sys, time
-from utils import AWS_RESOURCE_TAGS
+from botocore.exceptions import ClientError
+from engine.fixtures import Fixture, fixture_name, lease_fixture
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from engine.teardown import Teardown
+from engine.waiters import error_code, wait_for_waiter, wait_until
+from utils import aws_resource_tags
 
 """
 
@@ -14,8 +18,6 @@ Pattern: Deletes RDS database instance.
 
 """
 
-# Authenticaion and Service Setup
-RDS = boto3.Session(profile_name=sys.argv[1]).client("rds")
 # Database Variables
 DB_NAME = "test-mysql-instance-ioa-225-251"
 DB_SNAPSHOT_NAME = DB_NAME + "-snapshot1"
@@ -23,155 +25,229 @@ DB_NAME_2 = "test-mysql-instance-ioa-225-251-2"
 DB_SNAPSHOT_NAME_2 = DB_NAME_2 + "-snapshot1"
 
 
-def describe_instances(db_name):
-    while True:
-        rds_describe_instances = RDS.describe_db_instances(DBInstanceIdentifier=db_name)
-        if rds_describe_instances:
+class RDSSnapshotFixture(Fixture):
+    """An available RDS instance and a manual snapshot of it"""
+
+    name = "rds-225-251"
+
+    def plan(self, generation):
+        db_name = fixture_name(DB_NAME, generation)
+        return {"instance": db_name, "snapshot": db_name + "-snapshot1"}
+
+    def ensure(self, test, resources):
+        if not test.instance_exists(resources["instance"]):
+            test.create_instance(resources["instance"])
+        test.describe_instances(resources["instance"])
+        if not test.snapshot_exists(resources["snapshot"]):
+            test.create_snapshot(resources["instance"], resources["snapshot"])
+
+    def alive(self, test, resources):
+        return test.instance_exists(resources["instance"]) and test.snapshot_exists(
+            resources["snapshot"]
+        )
+
+    def reset(self, test, resources):
+        # Policy 225 shared the snapshot publicly
+        test.rds.modify_db_snapshot_attribute(
+            DBSnapshotIdentifier=resources["snapshot"],
+            AttributeName="restore",
+            ValuesToRemove=["all"],
+        )
+
+    def destroy(self, test, resources):
+        teardown = Teardown(test.session)
+        teardown.add_resource(
+            "rds:db-snapshot", DBSnapshotIdentifier=resources["snapshot"]
+        )
+        teardown.add_resource(
+            "rds:db-instance", DBInstanceIdentifier=resources["instance"]
+        )
+        teardown.run(strict=True)
+
+
+class RDSSnapshotTest(PolicyTest):
+    # Authenticaion and Service Setup
+    rds = LazyClient("rds")
+
+    def __init__(self, session):
+        super(RDSSnapshotTest, self).__init__(session)
+        self.fixture = None
+        self.db_name = DB_NAME
+        self.db_snapshot_name = DB_SNAPSHOT_NAME
+
+    def instance_exists(self, db_name):
+        try:
+            self.rds.describe_db_instances(DBInstanceIdentifier=db_name)
+        except ClientError as e:
+            if error_code(e) == "DBInstanceNotFound":
+                return False
+            raise
+        return True
+
+    def snapshot_exists(self, db_snapshot_name):
+        try:
+            self.rds.describe_db_snapshots(DBSnapshotIdentifier=db_snapshot_name)
+        except ClientError as e:
+            if error_code(e) == "DBSnapshotNotFound":
+                return False
+            raise
+        return True
+
+    def describe_instances(self, db_name):
+        def instance_available():
+            rds_describe_instances = self.rds.describe_db_instances(
+                DBInstanceIdentifier=db_name
+            )
             print("   describe-db-instances Successfully Ran")
             for r in rds_describe_instances["DBInstances"]:
                 if str(r["DBInstanceStatus"]) == "available":
                     print("    ***Instance Available***\n")
-                    return
-                else:
-                    print(
-                        "    ***Timeout 30s for Instance to Become Available***  Status: "
-                        + str(r["DBInstanceStatus"])
-                        + "\n"
-                    )
-                    time.sleep(30)
-
-
-def describe_snapshots(db_name, db_snapshot_name):
-    while True:
-        rds_describe_snapshots = RDS.describe_db_snapshots(
-            DBInstanceIdentifier=db_name, DBSnapshotIdentifier=db_snapshot_name
-        )
-        if rds_describe_snapshots:
+                    return True
+                print(
+                    "    ***Waiting for Instance to Become Available***  Status: "
+                    + str(r["DBInstanceStatus"])
+                    + "\n"
+                )
+            return False
+
+        wait_until(instance_available, "RDS instance " + db_name)
+
+    def describe_snapshots(self, db_name, db_snapshot_name):
+        def snapshot_available():
+            rds_describe_snapshots = self.rds.describe_db_snapshots(
+                DBInstanceIdentifier=db_name, DBSnapshotIdentifier=db_snapshot_name
+            )
             print("   describe-db-snapshots Successfully Ran")
             for r in rds_describe_snapshots["DBSnapshots"]:
                 if str(r["Status"]) == "available":
                     print("    ***Snapshot Completed***\n")
-                    return
-                else:
-                    print(
-                        "    ***Timeout 30s for Snapshot to Complete***  Status: "
-                        + str(r["Status"])
-                        + "\n"
-                    )
-                    time.sleep(30)
-
-
-def describe_snapshot_attributes(db_snapshot_name):
-    rds_describe_snapshot_attributes = RDS.describe_db_snapshot_attributes(
-        DBSnapshotIdentifier=db_snapshot_name
-    )
-    if rds_describe_snapshot_attributes:
-        print("   describe-db-snapshot-attributes Successfully Ran\n")
-
-
-def create_instance(db_name):
-    rds_create = RDS.create_db_instance(
-        DBInstanceIdentifier=db_name,
-        DBInstanceClass="db.t3.micro",
-        Engine="mysql",
-        MasterUsername="admin",
-        MasterUserPassword="secret99",
-        AllocatedStorage=20,
-        BackupRetentionPeriod=0,
-        Tags=AWS_RESOURCE_TAGS,
-    )
-    if rds_create:
-        print(
-            "   create-db-instances Successfully Ran\n    Created Instance: "
-            + db_name
-            + "\n"
+                    return True
+                print(
+                    "    ***Waiting for Snapshot to Complete***  Status: "
+                    + str(r["Status"])
+                    + "\n"
+                )
+            return False
+
+        wait_until(snapshot_available, "RDS snapshot " + db_snapshot_name)
+
+    def describe_snapshot_attributes(self, db_snapshot_name):
+        rds_describe_snapshot_attributes = self.rds.describe_db_snapshot_attributes(
+            DBSnapshotIdentifier=db_snapshot_name
         )
-
-    print("    ***Time out 120s for Instance Creation to Complete***\n")
-    time.sleep(120)
-
-
-def create_snapshot(db_name, db_snapshot_name):
-    rds_snapshot_create = RDS.create_db_snapshot(
-        DBSnapshotIdentifier=db_snapshot_name,
-        DBInstanceIdentifier=db_name,
-        Tags=AWS_RESOURCE_TAGS,
-    )
-    if rds_snapshot_create:
-        print(
-            "   create-db-snapshot Successfully Ran\n    Created Snapshot: "
-            + db_snapshot_name
-            + "\n"
+        if rds_describe_snapshot_attributes:
+            print("   describe-db-snapshot-attributes Successfully Ran\n")
+
+    def create_instance(self, db_name):
+        rds_create = self.rds.create_db_instance(
+            DBInstanceIdentifier=db_name,
+            DBInstanceClass="db.t3.micro",
+            Engine="mysql",
+            MasterUsername="admin",
+            MasterUserPassword="secret99",
+            AllocatedStorage=20,
+            BackupRetentionPeriod=0,
+            Tags=aws_resource_tags(),
         )
-
-    print("     ***Time out 120s for Snapshot Creation to Complete***\n")
-    time.sleep(120)
-
-
-def modify_snapshot_attributes(db_snapshot_name):
-    modify_snapshot_attributes = RDS.modify_db_snapshot_attribute(
-        DBSnapshotIdentifier=db_snapshot_name,
-        AttributeName="restore",
-        ValuesToAdd=[
-            "all",
-        ],
-    )
-    if modify_snapshot_attributes:
-        print("   modify-snapshot-attributes Successfully Ran\n")
-
-
-def delete_instance(db_name):
-    rds_delete = RDS.delete_db_instance(
-        DBInstanceIdentifier=db_name,
-        SkipFinalSnapshot=True,
-        DeleteAutomatedBackups=True,
-    )
-    if rds_delete:
-        print(
-            "   delete-db-instance Successfully Ran\n    Deleted DB Instance: "
-            + db_name
-            + "\n"
+        if rds_create:
+            print(
+                "   create-db-instances Successfully Ran\n    Created Instance: "
+                + db_name
+                + "\n"
+            )
+
+        print("    ***Waiting for Instance Creation to Complete***\n")
+        wait_for_waiter(
+            self.rds,
+            "db_instance_available",
+            "RDS instance " + db_name,
+            DBInstanceIdentifier=db_name,
         )
 
-
-def delete_snapshot(db_snapshot_name):
-    rds_snapshot_delete = RDS.delete_db_snapshot(DBSnapshotIdentifier=db_snapshot_name)
-    if rds_snapshot_delete:
-        print(
-            "   delete-db-snapshot Successfully Ran\n    Deleted Snapshot: "
-            + db_snapshot_name
-            + "\n"
+    def create_snapshot(self, db_name, db_snapshot_name):
+        rds_snapshot_create = self.rds.create_db_snapshot(
+            DBSnapshotIdentifier=db_snapshot_name,
+            DBInstanceIdentifier=db_name,
+            Tags=aws_resource_tags(),
+        )
+        if rds_snapshot_create:
+            print(
+                "   create-db-snapshot Successfully Ran\n    Created Snapshot: "
+                + db_snapshot_name
+                + "\n"
+            )
+
+        print("     ***Waiting for Snapshot Creation to Complete***\n")
+        wait_for_waiter(
+            self.rds,
+            "db_snapshot_available",
+            "RDS snapshot " + db_snapshot_name,
+            DBInstanceIdentifier=db_name,
+            DBSnapshotIdentifier=db_snapshot_name,
         )
 
-
-def main():
-    # Test Case Prep
-    print("\n\nSetting Up for Test Case\n")
-    create_instance(DB_NAME)
-    describe_instances(DB_NAME)
-    create_snapshot(DB_NAME, DB_SNAPSHOT_NAME)
-    # Before Query
-    print("\n\nRunning Policy 225 Before Conditions\n")
-    describe_instances(DB_NAME)
-    describe_snapshots(DB_NAME, DB_SNAPSHOT_NAME)
-    describe_snapshot_attributes(DB_SNAPSHOT_NAME)
-    # Pattern Query
-    print("\n\nRunning Policy 225 Pattern Conditions\n")
-    modify_snapshot_attributes(DB_SNAPSHOT_NAME)
-    # After Query
-    print("\n\nRunning Policy 225 After Conditions\n")
-    create_instance(DB_NAME_2)
-    describe_instances(DB_NAME_2)
-    create_snapshot(DB_NAME_2, DB_SNAPSHOT_NAME_2)
-    # Clean Up
-    print("\n\nCleaning Up\n")
-    describe_snapshots(DB_NAME_2, DB_SNAPSHOT_NAME_2)
-    delete_snapshot(DB_SNAPSHOT_NAME)
-    delete_snapshot(DB_SNAPSHOT_NAME_2)
-    print("\n\nRunning Policy 251 Pattern Conditions\n")
-    delete_instance(DB_NAME)
-    delete_instance(DB_NAME_2)
-
+    def modify_snapshot_attributes(self, db_snapshot_name):
+        modify_snapshot_attributes = self.rds.modify_db_snapshot_attribute(
+            DBSnapshotIdentifier=db_snapshot_name,
+            AttributeName="restore",
+            ValuesToAdd=[
+                "all",
+            ],
+        )
+        if modify_snapshot_attributes:
+            print("   modify-snapshot-attributes Successfully Ran\n")
+
+    def setup(self):
+        # Test Case Prep
+        print("\n\nSetting Up for Test Case\n")
+        self.fixture = lease_fixture(RDSSnapshotFixture(), self)
+        self.db_name = self.fixture.resources["instance"]
+        self.db_snapshot_name = self.fixture.resources["snapshot"]
+
+    def trigger_before(self):
+        # Before Query
+        print("\n\nRunning Policy 225 Before Conditions\n")
+        self.describe_instances(self.db_name)
+        self.describe_snapshots(self.db_name, self.db_snapshot_name)
+        self.describe_snapshot_attributes(self.db_snapshot_name)
+
+    def trigger_ioa(self):
+        # Pattern Query
+        print("\n\nRunning Policy 225 Pattern Conditions\n")
+        self.modify_snapshot_attributes(self.db_snapshot_name)
+
+    def trigger_after(self):
+        # After Query
+        print("\n\nRunning Policy 225 After Conditions\n")
+        self.create_instance(DB_NAME_2)
+        self.describe_instances(DB_NAME_2)
+        self.create_snapshot(DB_NAME_2, DB_SNAPSHOT_NAME_2)
+
+    def cleanup(self):
+        # Clean Up
+        print("\n\nCleaning Up\n")
+        try:
+            try:
+                self.describe_snapshots(DB_NAME_2, DB_SNAPSHOT_NAME_2)
+            finally:
+                print("\n\nRunning Policy 251 Pattern Conditions\n")
+                # Deleting the after-condition instance triggers 251 and leaves
+                # the leased instance for the next run, if the fixture pool
+                # keeps it. It goes even if trigger_after failed or the
+                # snapshot never became available. Neither deletion waits on
+                # the other.
+                teardown = Teardown(self.session)
+                teardown.add_resource(
+                    "rds:db-snapshot", DBSnapshotIdentifier=DB_SNAPSHOT_NAME_2
+                )
+                teardown.add_resource("rds:db-instance", DBInstanceIdentifier=DB_NAME_2)
+                teardown.run(strict=True)
+        finally:
+            if self.fixture is not None:
+                self.fixture.release()
+
+
+POLICY_TEST = RDSSnapshotTest
 
 if __name__ == "__main__":
-    main()
+    run_standalone(RDSSnapshotTest)
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import boto3, json, sys
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
 
 """
 
@@ -8,73 +8,82 @@ Policy 228 - GuardDuty monitoring disabled
 Pattern: Creates GuardDuty detector, lists and gets detector, then updates detector to disable monitoring and stops monitoring members.
 
 """
-# Authenticaion and Service Setup
-GUARDDUTY = boto3.Session(profile_name=sys.argv[1]).client("guardduty")
 
-# print(boto3.client('sts').get_caller_identity().get('Account'))
-
-
-def create_detector():
-    guardduty_create_detector = GUARDDUTY.create_detector(Enable=True)
-    if guardduty_create_detector:
-        print("   guardduty-create-detector Successfully Ran\n")
-
-
-def list_detectors():
-    guardduty_list_detectors = GUARDDUTY.list_detectors()
-    if guardduty_list_detectors:
-        print("   guardduty-list-detector Successfully Ran\n")
-    global dtid
-    for d in guardduty_list_detectors["DetectorIds"]:
-        dtid = d
-
-
-def get_detector():
-    guardduty_get_detector = GUARDDUTY.get_detector(DetectorId=dtid)
-    if guardduty_get_detector:
-        print("   guardduty-get-detectors Successfully Ran\n")
-
-
-def stop_monitoring_members():
-    guardduty_stop_monitoring_members = GUARDDUTY.stop_monitoring_members(
-        DetectorId=dtid, AccountIds=["123456789012"]
-    )
-    if guardduty_stop_monitoring_members:
-        print("   guardduty-stop-monitoring-members Successfully Ran\n")
-
-
-def update_detector():
-    guardduty_update_detector = GUARDDUTY.update_detector(
-        DetectorId=dtid,
-        Enable=False,
-    )
-    if guardduty_update_detector:
-        print("   guardduty-update-detectors Successfully Ran\n")
-
-
-def delete_detector():
-    guardduty_delete_detector = GUARDDUTY.delete_detector(DetectorId=dtid)
-    if guardduty_delete_detector:
-        print("   guardduty-delete-detectors Successfully Ran\n")
-
-
-def main():
-    # Test Case Prep
-    print("\n\nSetting Up for Test Case\n")
-    create_detector()
-    # Before Query
-    print("\n\nRunning Before Conditions\n")
-    list_detectors()
-    get_detector()
-    # Pattern Query
-    print("\n\nRunning Pattern Conditions\n")
-    update_detector()
-    stop_monitoring_members()
-    # After / Clean Up
-    print("\n\nRunning After Conditions and Cleaning Up\n")
-    delete_detector()
-    list_detectors()
 
+class GuardDutyTest(PolicyTest):
+    # Authenticaion and Service Setup
+    guardduty = LazyClient("guardduty")
+
+    def __init__(self, session):
+        super(GuardDutyTest, self).__init__(session)
+        self.detector_id = None
+
+    def create_detector(self):
+        guardduty_create_detector = self.guardduty.create_detector(Enable=True)
+        if guardduty_create_detector:
+            print("   guardduty-create-detector Successfully Ran\n")
+
+    def list_detectors(self):
+        guardduty_list_detectors = self.guardduty.list_detectors()
+        if guardduty_list_detectors:
+            print("   guardduty-list-detector Successfully Ran\n")
+        for d in guardduty_list_detectors["DetectorIds"]:
+            self.detector_id = d
+
+    def get_detector(self):
+        guardduty_get_detector = self.guardduty.get_detector(
+            DetectorId=self.detector_id
+        )
+        if guardduty_get_detector:
+            print("   guardduty-get-detectors Successfully Ran\n")
+
+    def stop_monitoring_members(self):
+        guardduty_stop_monitoring_members = self.guardduty.stop_monitoring_members(
+            DetectorId=self.detector_id, AccountIds=["123456789012"]
+        )
+        if guardduty_stop_monitoring_members:
+            print("   guardduty-stop-monitoring-members Successfully Ran\n")
+
+    def update_detector(self):
+        guardduty_update_detector = self.guardduty.update_detector(
+            DetectorId=self.detector_id,
+            Enable=False,
+        )
+        if guardduty_update_detector:
+            print("   guardduty-update-detectors Successfully Ran\n")
+
+    def delete_detector(self):
+        guardduty_delete_detector = self.guardduty.delete_detector(
+            DetectorId=self.detector_id
+        )
+        if guardduty_delete_detector:
+            print("   guardduty-delete-detectors Successfully Ran\n")
+
+    def setup(self):
+        # Test Case Prep
+        print("\n\nSetting Up for Test Case\n")
+        self.create_detector()
+
+    def trigger_before(self):
+        # Before Query
+        print("\n\nRunning Before Conditions\n")
+        self.list_detectors()
+        self.get_detector()
+
+    def trigger_ioa(self):
+        # Pattern Query
+        print("\n\nRunning Pattern Conditions\n")
+        self.update_detector()
+        self.stop_monitoring_members()
+
+    def cleanup(self):
+        # After / Clean Up
+        print("\n\nRunning After Conditions and Cleaning Up\n")
+        self.delete_detector()
+        self.list_detectors()
+
+
+POLICY_TEST = GuardDutyTest
 
 if __name__ == "__main__":
-    main()
+    run_standalone(GuardDutyTest)
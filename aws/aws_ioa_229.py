@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
-import boto3, sys, time, json, os
-from utils import AWS_RESOURCE_TAGS
+import json
+from botocore.exceptions import ClientError
+from engine.fixtures import Fixture, fixture_name, lease_fixture
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from utils import aws_resource_tags
 
 """
 
@@ -10,13 +13,10 @@ Pattern: Creates S3 bucket and CloudTrail trail with logging, describes trails a
 
 """
 
-# Authenticaion and Service Setup
-CLOUDTRAIL = boto3.Session(profile_name=sys.argv[1]).client("cloudtrail")
-S3 = boto3.Session(region_name="us-east-1", profile_name=sys.argv[1]).client("s3")
 # Variables
 TRAIL_NAME = "test_ioa_229"
 BUCKET = "awscloudtraillogsioa229"
-BUCKET_POLICY = json.dumps(
+BUCKET_POLICY_TEMPLATE = json.dumps(
     {
         "Version": "2012-10-17",
         "Statement": [
@@ -39,146 +39,195 @@ BUCKET_POLICY = json.dumps(
             },
         ],
     }
-) % (BUCKET, BUCKET)
+)
 
 
-def s3_create_bucket():
-    s3_create_bucket = S3.create_bucket(Bucket=BUCKET)
-    if s3_create_bucket:
-        print("\n    create-bucket Successfully Ran\n     Created Bucket: " + BUCKET)
+class TrailBucketFixture(Fixture):
+    """An S3 bucket CloudTrail may deliver logs to"""
 
+    name = "s3-229"
 
-def s3_delete_bucket():
-    s3_delete_bucket = S3.delete_bucket(Bucket=BUCKET)
-    if s3_delete_bucket:
-        print("   delete-bucket Successfully Ran\n    Deleted Bucket: " + BUCKET)
+    def plan(self, generation):
+        return {"bucket": fixture_name(BUCKET, generation)}
 
+    def ensure(self, test, resources):
+        if not test.s3_bucket_exists(resources["bucket"]):
+            test.s3_create_bucket(resources["bucket"])
+        test.s3_put_bucket_policy(resources["bucket"])
 
-def s3_put_bucket_policy():
-    s3_put_bucket_policy = S3.put_bucket_policy(Bucket=BUCKET, Policy=BUCKET_POLICY)
-    if s3_put_bucket_policy:
-        print(
-            "\n    put-bucket-policy Successfully Ran\n     Created Bucket Policy for Bucket: "
-            + BUCKET
-        )
-
+    def alive(self, test, resources):
+        return test.s3_bucket_exists(resources["bucket"])
 
-def s3_delete_object():
-    cmd = (
-        "aws s3 rm --recursive s3://awscloudtraillogsioa229/AWSLogs/ --profile %s  > /dev/null"
-        % sys.argv[1]
-    )
-    s3_delete_object = os.system(cmd)
-
-
-def create_trail():
-    cloudtrail_create_trail = CLOUDTRAIL.create_trail(
-        Name=TRAIL_NAME,
-        S3BucketName=BUCKET,
-        IncludeGlobalServiceEvents=False,
-        IsMultiRegionTrail=False,
-        EnableLogFileValidation=False,
-        IsOrganizationTrail=False,
-        TagsList=AWS_RESOURCE_TAGS,
-    )
-    if cloudtrail_create_trail:
-        print(
-            "\n    create-trail Successfully Ran\n    Created Trail: "
-            + TRAIL_NAME
-            + "\n"
-        )
+    def reset(self, test, resources):
+        test.s3_delete_object(resources["bucket"])
 
+    def destroy(self, test, resources):
+        if test.s3_bucket_exists(resources["bucket"]):
+            test.s3_delete_object(resources["bucket"])
+            test.s3_delete_bucket(resources["bucket"])
 
-def start_logging():
-    cloudtrail_start_logging = CLOUDTRAIL.start_logging(Name=TRAIL_NAME)
-    if cloudtrail_start_logging:
-        print(
-            "   start-logging Successfully Ran\n    Started Logging for Trail: "
-            + TRAIL_NAME
-            + "\n"
-        )
 
+class CloudTrailTest(PolicyTest):
+    # Authenticaion and Service Setup
+    cloudtrail = LazyClient("cloudtrail")
+    s3 = LazyClient("s3", region_name="us-east-1")
 
-def stop_logging():
-    cloudtrail_stop_logging = CLOUDTRAIL.start_logging(Name=TRAIL_NAME)
-    if cloudtrail_stop_logging:
-        print(
-            "   stop-logging Successfully Ran\n    Stopped Logging for Trail: "
-            + TRAIL_NAME
-            + "\n"
-        )
+    def __init__(self, session):
+        super(CloudTrailTest, self).__init__(session)
+        self.fixture = None
+        self.bucket = BUCKET
 
+    def s3_bucket_exists(self, bucket):
+        try:
+            self.s3.head_bucket(Bucket=bucket)
+        except ClientError as e:
+            if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 404:
+                return False
+            raise
+        return True
 
-def delete_trail():
-    cloudtrail_delete_trail = CLOUDTRAIL.delete_trail(Name=TRAIL_NAME)
-    if cloudtrail_delete_trail:
-        print(
-            "   delete-trail Successfully Ran\n    Deleted Trail: " + TRAIL_NAME + "\n"
-        )
+    def s3_create_bucket(self, bucket):
+        s3_create_bucket = self.s3.create_bucket(Bucket=bucket)
+        if s3_create_bucket:
+            print(
+                "\n    create-bucket Successfully Ran\n     Created Bucket: " + bucket
+            )
 
+    def s3_delete_bucket(self, bucket):
+        s3_delete_bucket = self.s3.delete_bucket(Bucket=bucket)
+        if s3_delete_bucket:
+            print("   delete-bucket Successfully Ran\n    Deleted Bucket: " + bucket)
 
-def udpate_trail():
-    cloudtrail_update_trail = CLOUDTRAIL.update_trail(
-        Name=TRAIL_NAME, IncludeGlobalServiceEvents=False
-    )
-    if cloudtrail_update_trail:
-        print(
-            "   update-trail Successfully Ran\n    Updated Trail: " + TRAIL_NAME + "\n"
+    def s3_put_bucket_policy(self, bucket):
+        s3_put_bucket_policy = self.s3.put_bucket_policy(
+            Bucket=bucket, Policy=BUCKET_POLICY_TEMPLATE % (bucket, bucket)
         )
-
-
-def describe_trails():
-    cloudtrail_describe_trails = CLOUDTRAIL.describe_trails()
-    if cloudtrail_describe_trails:
-        print("   describe-trails Successfully Ran\n")
-
-
-def list_trails():
-    cloudtrail_list_trails = CLOUDTRAIL.list_trails()
-    if cloudtrail_list_trails:
-        print("   list-trails Successfully Ran\n")
-
-
-def get_event_selectors():
-    cloudtrail_get_event_selectors = CLOUDTRAIL.get_event_selectors(
-        TrailName=TRAIL_NAME
-    )
-    if cloudtrail_get_event_selectors:
-        print("   get-event-selectors Successfully Ran\n")
-
-
-def get_trail_status():
-    cloudtrail_get_trail_status = CLOUDTRAIL.get_trail_status(Name=TRAIL_NAME)
-    if cloudtrail_get_trail_status:
-        print("   get-trail-status Successfully Ran\n    Trail: " + TRAIL_NAME + "\n")
-
-
-def main():
-    # Test Case Prep
-    print("\n\nSetting Up for Test Case\n")
-    s3_create_bucket()
-    s3_put_bucket_policy()
-    create_trail()
-    start_logging()
-    # Before Query
-    print("\n\nRunning Before Conditions\n")
-    describe_trails()
-    list_trails()
-    get_event_selectors()
-    get_trail_status()
-    # Pattern Query
-    print("\n\nRunning Pattern Conditions\n")
-    stop_logging()
-    udpate_trail()
-    delete_trail()
-    # After Query
-    print("\n\nRunning After Conditions\n")
-    describe_trails()
-    # Clean Up
-    print("\nCleaning Up\n")
-    s3_delete_object()
-    s3_delete_bucket()
-
+        if s3_put_bucket_policy:
+            print(
+                "\n    put-bucket-policy Successfully Ran\n     Created Bucket Policy for Bucket: "
+                + bucket
+            )
+
+    def s3_delete_object(self, bucket):
+        # Remove the log files CloudTrail delivered so the bucket can be deleted
+        bucket = self.session.resource("s3", region_name="us-east-1").Bucket(bucket)
+        s3_delete_object = bucket.objects.filter(Prefix="AWSLogs/").delete()
+
+    def create_trail(self):
+        cloudtrail_create_trail = self.cloudtrail.create_trail(
+            Name=TRAIL_NAME,
+            S3BucketName=self.bucket,
+            IncludeGlobalServiceEvents=False,
+            IsMultiRegionTrail=False,
+            EnableLogFileValidation=False,
+            IsOrganizationTrail=False,
+            TagsList=aws_resource_tags(),
+        )
+        if cloudtrail_create_trail:
+            print(
+                "\n    create-trail Successfully Ran\n    Created Trail: "
+                + TRAIL_NAME
+                + "\n"
+            )
+
+    def start_logging(self):
+        cloudtrail_start_logging = self.cloudtrail.start_logging(Name=TRAIL_NAME)
+        if cloudtrail_start_logging:
+            print(
+                "   start-logging Successfully Ran\n    Started Logging for Trail: "
+                + TRAIL_NAME
+                + "\n"
+            )
+
+    def stop_logging(self):
+        cloudtrail_stop_logging = self.cloudtrail.start_logging(Name=TRAIL_NAME)
+        if cloudtrail_stop_logging:
+            print(
+                "   stop-logging Successfully Ran\n    Stopped Logging for Trail: "
+                + TRAIL_NAME
+                + "\n"
+            )
+
+    def delete_trail(self):
+        cloudtrail_delete_trail = self.cloudtrail.delete_trail(Name=TRAIL_NAME)
+        if cloudtrail_delete_trail:
+            print(
+                "   delete-trail Successfully Ran\n    Deleted Trail: "
+                + TRAIL_NAME
+                + "\n"
+            )
+
+    def udpate_trail(self):
+        cloudtrail_update_trail = self.cloudtrail.update_trail(
+            Name=TRAIL_NAME, IncludeGlobalServiceEvents=False
+        )
+        if cloudtrail_update_trail:
+            print(
+                "   update-trail Successfully Ran\n    Updated Trail: "
+                + TRAIL_NAME
+                + "\n"
+            )
+
+    def describe_trails(self):
+        cloudtrail_describe_trails = self.cloudtrail.describe_trails()
+        if cloudtrail_describe_trails:
+            print("   describe-trails Successfully Ran\n")
+
+    def list_trails(self):
+        cloudtrail_list_trails = self.cloudtrail.list_trails()
+        if cloudtrail_list_trails:
+            print("   list-trails Successfully Ran\n")
+
+    def get_event_selectors(self):
+        cloudtrail_get_event_selectors = self.cloudtrail.get_event_selectors(
+            TrailName=TRAIL_NAME
+        )
+        if cloudtrail_get_event_selectors:
+            print("   get-event-selectors Successfully Ran\n")
+
+    def get_trail_status(self):
+        cloudtrail_get_trail_status = self.cloudtrail.get_trail_status(Name=TRAIL_NAME)
+        if cloudtrail_get_trail_status:
+            print(
+                "   get-trail-status Successfully Ran\n    Trail: " + TRAIL_NAME + "\n"
+            )
+
+    def setup(self):
+        # Test Case Prep
+        print("\n\nSetting Up for Test Case\n")
+        self.fixture = lease_fixture(TrailBucketFixture(), self)
+        self.bucket = self.fixture.resources["bucket"]
+        self.create_trail()
+        self.start_logging()
+
+    def trigger_before(self):
+        # Before Query
+        print("\n\nRunning Before Conditions\n")
+        self.describe_trails()
+        self.list_trails()
+        self.get_event_selectors()
+        self.get_trail_status()
+
+    def trigger_ioa(self):
+        # Pattern Query
+        print("\n\nRunning Pattern Conditions\n")
+        self.stop_logging()
+        self.udpate_trail()
+        self.delete_trail()
+
+    def trigger_after(self):
+        # After Query
+        print("\n\nRunning After Conditions\n")
+        self.describe_trails()
+
+    def cleanup(self):
+        # Clean Up
+        print("\nCleaning Up\n")
+        if self.fixture is not None:
+            self.fixture.release()
+
+
+POLICY_TEST = CloudTrailTest
 
 if __name__ == "__main__":
-    main()
+    run_standalone(CloudTrailTest)
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
-import boto3, sys
-from boto3 import client
-import botocore
+import botocore.config
+from engine.lifecycle import PolicyTest, run_standalone
 
 """
 
@@ -32,28 +31,30 @@ UA_5 = "HotDogsAreSandwiches"
 UA_6 = "CloudBerry"
 
 
-def iam_list_users(ua):
-    # Authenticaion and Service Setup
-    SESSION_CONFIG = botocore.config.Config(user_agent=ua)
-    IAM = boto3.Session(profile_name=sys.argv[1]).client("iam", config=SESSION_CONFIG)
-    IAM_LIST_USERS = IAM.list_users()
-    if IAM_LIST_USERS:
-        print("   list-users Ran Successfully with UserAgent: " + ua)
+class UserAgentTest(PolicyTest):
+    def iam_list_users(self, ua):
+        # Authenticaion and Service Setup
+        SESSION_CONFIG = botocore.config.Config(user_agent=ua)
+        IAM = self.session.client("iam", config=SESSION_CONFIG)
+        IAM_LIST_USERS = IAM.list_users()
+        if IAM_LIST_USERS:
+            print("   list-users Ran Successfully with UserAgent: " + ua)
 
+    def trigger_ioa(self):
+        # Pattern Query
+        print("Running Policy 235 Pattern Conditions")
+        self.iam_list_users(UA_1)
+        self.iam_list_users(UA_2)
+        self.iam_list_users(UA_3)
+        print("\n\nRunning Policy 258 Pattern Conditions")
+        self.iam_list_users(UA_4)
+        print("\n\nRunning Policy 259 Pattern Conditions")
+        self.iam_list_users(UA_5)
+        print("\n\nRunning Policy 264 Pattern Conditions")
+        self.iam_list_users(UA_6)
 
-def main():
-    # Pattern Query
-    print("Running Policy 235 Pattern Conditions")
-    iam_list_users(UA_1)
-    iam_list_users(UA_2)
-    iam_list_users(UA_3)
-    print("\n\nRunning Policy 258 Pattern Conditions")
-    iam_list_users(UA_4)
-    print("\n\nRunning Policy 259 Pattern Conditions")
-    iam_list_users(UA_5)
-    print("\n\nRunning Policy 264 Pattern Conditions")
-    iam_list_users(UA_6)
 
+POLICY_TEST = UserAgentTest
 
 if __name__ == "__main__":
-    main()
+    run_standalone(UserAgentTest)
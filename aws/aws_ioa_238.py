@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
-import boto3, sys, time, json
+import boto3, json
 from botocore.exceptions import ClientError
-from utils import AWS_RESOURCE_TAGS
+from engine.iam import wait_for_access_key
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from engine.output import show_response
+from engine.state import recall
+from engine.teardown import Teardown
+from utils import aws_resource_tags
 
 """
 
@@ -21,215 +26,218 @@ POLICY = json.dumps(
         "Statement": [{"Effect": "Allow", "Action": ["*"], "Resource": ["*"]}],
     }
 )
-IAM = boto3.Session(profile_name=sys.argv[1]).client("iam")
-
-
-def create_user():
-    try:
-        response = IAM.create_user(UserName=USER)
-        print(f"Create User Output:\n {response}")
-    except ClientError as e:
-        if e.response["Error"]["Code"] == "EntityAlreadyExists":
-            print("User already exists")
-
-
-def iam_create_access_key():
-    IAM_CREATE_ACCESS_KEY = IAM.create_access_key(UserName=USER)
-    if IAM_CREATE_ACCESS_KEY:
-        print("    create_access_key Successfully Ran\n")
-    global ACCESS_KEY_ID
-    ACCESS_KEY_ID = IAM_CREATE_ACCESS_KEY["AccessKey"]["AccessKeyId"]
-    SECRET_ACCESS_KEY = IAM_CREATE_ACCESS_KEY["AccessKey"]["SecretAccessKey"]
-    global iam
-    iam = boto3.Session(
-        aws_access_key_id=ACCESS_KEY_ID,
-        aws_secret_access_key=SECRET_ACCESS_KEY,
-        region_name="eu-west-1",
-    ).client("iam")
-    time.sleep(10)
-
-
-def iam_delete_access_key(accesskeyid):
-    IAM_DELETE_ACCESS_KEY = IAM.delete_access_key(
-        UserName=USER, AccessKeyId=accesskeyid
-    )
-    if IAM_DELETE_ACCESS_KEY:
-        print("\n    delete_access_key Successfully Ran\n     USER: " + USER)
-
-
-def create_group():
-    try:
-        response = IAM.create_group(GroupName=GROUP)
-        print(f"Create Group Output:\n {response}")
-    except ClientError as e:
-        if e.response["Error"]["Code"] == "EntityAlreadyExists":
-            print("group already exists")
-
-
-def create_role():
-    ASSUME_ROLE_POLICY_DOCUMENT = json.dumps(
-        {
-            "Version": "2012-10-17",
-            "Statement": [
-                {
-                    "Effect": "Allow",
-                    "Principal": {"AWS": "*"},
-                    "Action": "sts:AssumeRole",
-                }
-            ],
-        }
-    )
-    try:
-        response = IAM.create_role(
-            RoleName=ROLE,
-            AssumeRolePolicyDocument=ASSUME_ROLE_POLICY_DOCUMENT,
-            Description="CSPM Test Role",
-            Tags=AWS_RESOURCE_TAGS,
-        )
-        # print(response)
-    except ClientError as e:
-        if e.response["Error"]["Code"] == "EntityAlreadyExists":
-            print("group already exists")
-
-
-def list_users(iam_creds):
-    print(iam_creds)
-    response = iam_creds.list_users()
-    # print(response)
-
-
-def list_user_policies():
-    response = IAM.list_user_policies(
-        UserName=USER,
-    )
-    # print(response)
-
-
-def list_attached_user_policies(iam_creds):
-    response = iam_creds.list_attached_user_policies(UserName=USER, PathPrefix="/")
-    # print(response)
-
-
-def get_user():
-    response = IAM.get_user(
-        UserName=USER,
-    )
-    # print(response)
-
-
-def list_groups():
-    response = IAM.list_groups()
-    # print(response)
-
-
-def list_group_policies():
-    response = IAM.list_group_policies(GroupName=GROUP)
-
-
-def list_attached_group_policies():
-    response = IAM.list_attached_group_policies(GroupName=GROUP)
-
-
-def get_group():
-    response = IAM.get_group(GroupName=GROUP)
-
 
-def list_roles(iam_creds):
-    response = iam_creds.list_roles()
-    # print(response)
 
+class InlineAdminPolicyTest(PolicyTest):
+    phase_delays = {"trigger_after": 10}
+
+    iam = LazyClient("iam")
+
+    def __init__(self, session):
+        super(InlineAdminPolicyTest, self).__init__(session)
+        self.access_key_id = None
+        # IAM client using the new user's access key
+        self.iam_creds = None
+
+    def create_user(self):
+        try:
+            response = self.iam.create_user(UserName=USER)
+            show_response("Create User Output", response)
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "EntityAlreadyExists":
+                print("User already exists")
+
+    def iam_create_access_key(self):
+        # A user has at most two keys, so drop those earlier runs left behind
+        for key in recall("iam:access-key", name=USER):
+            try:
+                self.iam_delete_access_key(key.resource_id)
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "NoSuchEntity":
+                    raise
+        IAM_CREATE_ACCESS_KEY = self.iam.create_access_key(UserName=USER)
+        if IAM_CREATE_ACCESS_KEY:
+            print("    create_access_key Successfully Ran\n")
+        self.access_key_id = IAM_CREATE_ACCESS_KEY["AccessKey"]["AccessKeyId"]
+        SECRET_ACCESS_KEY = IAM_CREATE_ACCESS_KEY["AccessKey"]["SecretAccessKey"]
+        new_user_session = boto3.Session(
+            aws_access_key_id=self.access_key_id,
+            aws_secret_access_key=SECRET_ACCESS_KEY,
+            region_name="eu-west-1",
+        )
+        wait_for_access_key(new_user_session, "access key for " + USER)
+        self.iam_creds = new_user_session.client("iam")
 
-def list_role_policies(iam_creds):
-    response = iam_creds.list_role_policies(RoleName=ROLE)
-    # print(response)
-
+    def iam_delete_access_key(self, accesskeyid):
+        IAM_DELETE_ACCESS_KEY = self.iam.delete_access_key(
+            UserName=USER, AccessKeyId=accesskeyid
+        )
+        if IAM_DELETE_ACCESS_KEY:
+            print("\n    delete_access_key Successfully Ran\n     USER: " + USER)
+
+    def create_group(self):
+        try:
+            response = self.iam.create_group(GroupName=GROUP)
+            show_response("Create Group Output", response)
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "EntityAlreadyExists":
+                print("group already exists")
+
+    def create_role(self):
+        ASSUME_ROLE_POLICY_DOCUMENT = json.dumps(
+            {
+                "Version": "2012-10-17",
+                "Statement": [
+                    {
+                        "Effect": "Allow",
+                        "Principal": {"AWS": "*"},
+                        "Action": "sts:AssumeRole",
+                    }
+                ],
+            }
+        )
+        try:
+            response = self.iam.create_role(
+                RoleName=ROLE,
+                AssumeRolePolicyDocument=ASSUME_ROLE_POLICY_DOCUMENT,
+                Description="CSPM Test Role",
+                Tags=aws_resource_tags(),
+            )
+            # print(response)
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "EntityAlreadyExists":
+                print("role already exists")
+
+    def list_users(self, iam_creds):
+        print(iam_creds)
+        response = iam_creds.list_users()
+        # print(response)
 
-def list_attached_role_policies(iam_creds):
-    response = iam_creds.list_attached_role_policies(RoleName=ROLE, PathPrefix="/")
+    def list_user_policies(self):
+        response = self.iam.list_user_policies(
+            UserName=USER,
+        )
+        # print(response)
 
+    def list_attached_user_policies(self, iam_creds):
+        response = iam_creds.list_attached_user_policies(UserName=USER, PathPrefix="/")
+        # print(response)
 
-def get_role(iam_creds):
-    response = iam_creds.get_role(RoleName=ROLE)
+    def get_user(self):
+        response = self.iam.get_user(
+            UserName=USER,
+        )
+        # print(response)
 
+    def list_groups(self):
+        response = self.iam.list_groups()
+        # print(response)
 
-# pattern Conditions
-def iam_put_user_policy():
-    response = IAM.put_user_policy(
-        UserName=USER, PolicyName=POLICY_NAME, PolicyDocument=POLICY
-    )
-    # print(f"\nPattern Condition:\n{response}")
+    def list_group_policies(self):
+        response = self.iam.list_group_policies(GroupName=GROUP)
 
+    def list_attached_group_policies(self):
+        response = self.iam.list_attached_group_policies(GroupName=GROUP)
 
-def perform_clean_up():
-    delete_user_policy = IAM.delete_user_policy(
-        PolicyName=POLICY_NAME,
-        UserName=USER,
-    )
-    delete_role_policy = IAM.delete_role_policy(RoleName=ROLE, PolicyName=POLICY_NAME)
-    delete_group_policy = IAM.delete_group_policy(
-        GroupName=GROUP, PolicyName=POLICY_NAME
-    )
-    delete_role = IAM.delete_role(RoleName=ROLE)
-    delete_user = IAM.delete_user(UserName=USER)
-    delete_group = IAM.delete_group(GroupName=GROUP)
-    print(
-        f"\n\n\nCLEAN UP:\nDeleted user: {delete_user}\nDeleted Group: {delete_group}\n Detach Policy:{delete_user_policy} \nDelete_Role: {delete_role}"
-    )
+    def get_group(self):
+        response = self.iam.get_group(GroupName=GROUP)
 
+    def list_roles(self, iam_creds):
+        response = iam_creds.list_roles()
+        # print(response)
 
-def put_role_policy():
-    put_role_policy = IAM.put_role_policy(
-        RoleName=ROLE, PolicyName=POLICY_NAME, PolicyDocument=POLICY
-    )
+    def list_role_policies(self, iam_creds):
+        response = iam_creds.list_role_policies(RoleName=ROLE)
+        # print(response)
 
+    def list_attached_role_policies(self, iam_creds):
+        response = iam_creds.list_attached_role_policies(RoleName=ROLE, PathPrefix="/")
 
-def put_group_policy():
-    put_group_policy = IAM.put_group_policy(
-        GroupName=GROUP, PolicyName=POLICY_NAME, PolicyDocument=POLICY
-    )
+    def get_role(self, iam_creds):
+        response = iam_creds.get_role(RoleName=ROLE)
 
+    # pattern Conditions
+    def iam_put_user_policy(self):
+        response = self.iam.put_user_policy(
+            UserName=USER, PolicyName=POLICY_NAME, PolicyDocument=POLICY
+        )
+        # print(f"\nPattern Condition:\n{response}")
+
+    def perform_clean_up(self):
+        # The inline policies and access key go first, then the principals
+        teardown = Teardown(self.session)
+        teardown.add_resource("iam:user-policy", UserName=USER, PolicyName=POLICY_NAME)
+        teardown.add_resource("iam:role-policy", RoleName=ROLE, PolicyName=POLICY_NAME)
+        teardown.add_resource(
+            "iam:group-policy", GroupName=GROUP, PolicyName=POLICY_NAME
+        )
+        if self.access_key_id:
+            teardown.add_resource(
+                "iam:access-key", UserName=USER, AccessKeyId=self.access_key_id
+            )
+        teardown.add_resource("iam:role", RoleName=ROLE)
+        teardown.add_resource("iam:user", UserName=USER)
+        teardown.add_resource("iam:group", GroupName=GROUP)
+        print("\n\n\nCLEAN UP:")
+        teardown.run(strict=True)
+
+    def put_role_policy(self):
+        put_role_policy = self.iam.put_role_policy(
+            RoleName=ROLE, PolicyName=POLICY_NAME, PolicyDocument=POLICY
+        )
 
-def main():
-    # Setup
-    print("\n\nPerforming Setup")
-    create_user()
-    iam_create_access_key()
-    #    ACCESS_KEY_ID = iam_create_access_key()
-    #    iam_create_access_key()
-    create_group()
-    create_role()
-    # Before Conditions
-    print("\n\nPerforming Before Pattern")
-    list_users(IAM)
-    list_user_policies()
-    list_attached_user_policies(IAM)
-    get_user()
-    list_groups()
-    list_group_policies()
-    list_attached_group_policies()
-    get_group()
-    list_roles(IAM)
-    list_role_policies(IAM)
-    list_attached_role_policies(IAM)
-    get_role(IAM)
-    # Pattern Condition
-    print("\n\nPerforming Pattern")
-    iam_put_user_policy()
-    put_role_policy()
-    put_group_policy()
-    time.sleep(10)
-    # After condition
-    print("\n\nPerforming After Pattern")
-    list_users(iam)
-    list_attached_user_policies(iam)
-    list_roles(iam)
-    list_role_policies(iam)
-    list_attached_role_policies(iam)
-    get_role(iam)
-    # Cleanup
-    iam_delete_access_key(ACCESS_KEY_ID)
-    perform_clean_up()
+    def put_group_policy(self):
+        put_group_policy = self.iam.put_group_policy(
+            GroupName=GROUP, PolicyName=POLICY_NAME, PolicyDocument=POLICY
+        )
 
+    def setup(self):
+        # Setup
+        print("\n\nPerforming Setup")
+        self.create_user()
+        self.iam_create_access_key()
+        self.create_group()
+        self.create_role()
+
+    def trigger_before(self):
+        # Before Conditions
+        print("\n\nPerforming Before Pattern")
+        self.list_users(self.iam)
+        self.list_user_policies()
+        self.list_attached_user_policies(self.iam)
+        self.get_user()
+        self.list_groups()
+        self.list_group_policies()
+        self.list_attached_group_policies()
+        self.get_group()
+        self.list_roles(self.iam)
+        self.list_role_policies(self.iam)
+        self.list_attached_role_policies(self.iam)
+        self.get_role(self.iam)
+
+    def trigger_ioa(self):
+        # Pattern Condition
+        print("\n\nPerforming Pattern")
+        self.iam_put_user_policy()
+        self.put_role_policy()
+        self.put_group_policy()
+
+    def trigger_after(self):
+        # After condition
+        print("\n\nPerforming After Pattern")
+        self.list_users(self.iam_creds)
+        self.list_attached_user_policies(self.iam_creds)
+        self.list_roles(self.iam_creds)
+        self.list_role_policies(self.iam_creds)
+        self.list_attached_role_policies(self.iam_creds)
+        self.get_role(self.iam_creds)
+
+    def cleanup(self):
+        # Cleanup
+        self.perform_clean_up()
+
+
+POLICY_TEST = InlineAdminPolicyTest
 
 if __name__ == "__main__":
-    main()
+    run_standalone(InlineAdminPolicyTest)
@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
-import boto3, sys, time, json
+import json
 from botocore.exceptions import ClientError
-from utils import AWS_RESOURCE_TAGS
+from engine.iam import ASSUME_ROLE_ERRORS, wait_for_role
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from engine.output import show_response
+from engine.waiters import wait_for_waiter, wait_until
+from utils import aws_resource_tags
 
 """
 
@@ -25,13 +29,7 @@ TEMPLATE = {
     },
 }
 
-IAM = boto3.Session(profile_name=sys.argv[1]).client("iam", region_name="us-east-1")
-CFN = boto3.Session(profile_name=sys.argv[1]).client(
-    "cloudformation", region_name="us-east-1"
-)
-STS = boto3.Session(profile_name=sys.argv[1]).client("sts", region_name="us-east-1")
-waiter = CFN.get_waiter("stack_create_complete")
-delete_waiter = CFN.get_waiter("stack_delete_complete")
+REGION = "us-east-1"
 ROLE = "cspmtestrole246"
 STACK_NAME = "cspmioateststack246"
 POLICY_NAME = "cspmtestpolicy246"
@@ -58,130 +56,157 @@ STACK_POLICY = json.dumps(
 )
 
 
-def create_role():
-    print(type(ASSUME_ROLE_POLICY_DOCUMENT))
-    try:
-        response = IAM.create_role(
+class StackRoleTest(PolicyTest):
+    # Policy attachment can't be probed cheaply, so give it time to propagate
+    # before the stack uses the role
+    phase_delays = {"trigger_ioa": 10}
+
+    iam = LazyClient("iam", region_name=REGION)
+    cfn = LazyClient("cloudformation", region_name=REGION)
+    sts = LazyClient("sts", region_name=REGION)
+
+    def __init__(self, session):
+        super(StackRoleTest, self).__init__(session)
+        self.ioa_role_arn = None
+        self.policy_arn = None
+
+    def create_role(self):
+        print(type(ASSUME_ROLE_POLICY_DOCUMENT))
+        try:
+            self.iam_create_role()
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "EntityAlreadyExists":
+                print("Role already exists. Deleting Role")
+                self.delete_role()
+                wait_until(
+                    self.iam_create_role,
+                    "role " + ROLE + " to be recreated",
+                    deadline=60,
+                    retry_errors=("EntityAlreadyExists",),
+                )
+            else:
+                print(e)
+
+    def iam_create_role(self):
+        response = self.iam.create_role(
             RoleName=ROLE,
             AssumeRolePolicyDocument=ASSUME_ROLE_POLICY_DOCUMENT,
             Description="CSPM Test Role",
-            Tags=AWS_RESOURCE_TAGS,
+            Tags=aws_resource_tags(),
         )
-        global IOA_ROLE_ARN
-        IOA_ROLE_ARN = response["Role"]["Arn"]
-        print(f"\n\nROLE CREATION {response}\n\n")
-        time.sleep(20)
-    except ClientError as e:
-        if e.response["Error"]["Code"] == "EntityAlreadyExists":
-            print("Role already exists. Deleting Role")
-            delete_role()
-            time.sleep(10)
-            create_role()
-        else:
-            print(e)
-
-
-def create_policy():
-    response = IAM.create_policy(
-        PolicyName=POLICY_NAME,
-        Path="/",
-        PolicyDocument=STACK_POLICY,
-        Tags=AWS_RESOURCE_TAGS,
-    )
-    time.sleep(10)
-    print(response)
-    arn = response["Policy"]["Arn"]
-    return arn
-
-
-def attach_role_policy(policy_arn):
-    policy_attach_res = IAM.attach_role_policy(RoleName=ROLE, PolicyArn=policy_arn)
-
-    time.sleep(20)
-
-
-def list_roles():
-    response = IAM.list_roles()
-    print(response)
-
-
-def list_role_policies():
-    try:
-        response = IAM.list_role_policies(RoleName=ROLE)
-        print(response)
-    except ClientError as e:
-        print(e)
-
-
-def list_attached_role_policies():
-    response = IAM.list_attached_role_policies(RoleName=ROLE, PathPrefix="/")
-
-
-def create_stack():
-    response = CFN.create_stack(
-        StackName=STACK_NAME,
-        TemplateBody=json.dumps(TEMPLATE),
-        Parameters=[],
-        DisableRollback=False,
-        TimeoutInMinutes=20,
-        Capabilities=[
-            "CAPABILITY_IAM",
-        ],
-        Tags=AWS_RESOURCE_TAGS,
-        RoleARN=IOA_ROLE_ARN,
-    )
-
-
-def sts_assume_identity():
-    response = STS.assume_role(
-        RoleArn=IOA_ROLE_ARN,
-        RoleSessionName="123testcspm",
-    )
-
-
-def detatch_role_policy(arn):
-    response = IAM.detach_role_policy(RoleName=ROLE, PolicyArn=arn)
-
-
-def delete_role():
-    delete_role = IAM.delete_role(RoleName=ROLE)
-
-    print(delete_role)
-
-
-def delete_policy(arn):
-    response = IAM.delete_policy(PolicyArn=arn)
-
+        self.ioa_role_arn = response["Role"]["Arn"]
+        show_response("create-role", response)
+        return self.ioa_role_arn
+
+    def create_policy(self):
+        response = self.iam.create_policy(
+            PolicyName=POLICY_NAME,
+            Path="/",
+            PolicyDocument=STACK_POLICY,
+            Tags=aws_resource_tags(),
+        )
+        show_response("create-policy", response)
+        arn = response["Policy"]["Arn"]
+        return arn
 
-def delete_stack():
-    response = CFN.delete_stack(StackName=STACK_NAME)
+    def attach_role_policy(self, policy_arn):
+        policy_attach_res = self.iam.attach_role_policy(
+            RoleName=ROLE, PolicyArn=policy_arn
+        )
 
+    def list_roles(self):
+        response = self.iam.list_roles()
+        show_response("list-roles", response)
 
-def main():
-    print(f"\nPrep:\n")
-    create_role()
-    policy_arn = str(create_policy())
-    attach_role_policy(policy_arn)
+    def list_role_policies(self):
+        try:
+            response = self.iam.list_role_policies(RoleName=ROLE)
+            show_response("list-role-policies", response)
+        except ClientError as e:
+            print(e)
 
-    print(f"\nBefore Conditions:\n")
-    list_roles()
-    list_role_policies()
-    list_attached_role_policies()
+    def list_attached_role_policies(self):
+        response = self.iam.list_attached_role_policies(RoleName=ROLE, PathPrefix="/")
+
+    def create_stack(self):
+        response = self.cfn.create_stack(
+            StackName=STACK_NAME,
+            TemplateBody=json.dumps(TEMPLATE),
+            Parameters=[],
+            DisableRollback=False,
+            TimeoutInMinutes=20,
+            Capabilities=[
+                "CAPABILITY_IAM",
+            ],
+            Tags=aws_resource_tags(),
+            RoleARN=self.ioa_role_arn,
+        )
 
-    print(f"\nPattern Condition:\n")
-    create_stack()
-    print("\n\Building Stack....")
-    waiter.wait(StackName=STACK_NAME)
+    def sts_assume_identity(self):
+        response = self.sts.assume_role(
+            RoleArn=self.ioa_role_arn,
+            RoleSessionName="123testcspm",
+        )
+        return response
+
+    def detatch_role_policy(self, arn):
+        response = self.iam.detach_role_policy(RoleName=ROLE, PolicyArn=arn)
+
+    def delete_role(self):
+        delete_role = self.iam.delete_role(RoleName=ROLE)
+
+        print(delete_role)
+
+    def delete_policy(self, arn):
+        response = self.iam.delete_policy(PolicyArn=arn)
+
+    def delete_stack(self):
+        response = self.cfn.delete_stack(StackName=STACK_NAME)
+
+    def setup(self):
+        print(f"\nPrep:\n")
+        self.create_role()
+        # Assuming the role proves its trust policy has propagated
+        wait_for_role(self.sts_assume_identity, "role " + ROLE, ASSUME_ROLE_ERRORS)
+        self.policy_arn = str(self.create_policy())
+        self.attach_role_policy(self.policy_arn)
+
+    def trigger_before(self):
+        print(f"\nBefore Conditions:\n")
+        self.list_roles()
+        self.list_role_policies()
+        self.list_attached_role_policies()
+
+    def trigger_ioa(self):
+        print(f"\nPattern Condition:\n")
+        self.create_stack()
+        print("\n\\Building Stack....")
+        wait_for_waiter(
+            self.cfn,
+            "stack_create_complete",
+            "stack " + STACK_NAME,
+            StackName=STACK_NAME,
+        )
 
-    sts_assume_identity()
+        self.sts_assume_identity()
+
+    def cleanup(self):
+        self.delete_stack()
+        if self.policy_arn:
+            self.detatch_role_policy(self.policy_arn)
+        self.delete_role()
+        if self.policy_arn:
+            self.delete_policy(self.policy_arn)
+        print("\n\nDeleting Stack....")
+        wait_for_waiter(
+            self.cfn,
+            "stack_delete_complete",
+            "stack " + STACK_NAME,
+            StackName=STACK_NAME,
+        )
 
-    delete_stack()
-    detatch_role_policy(policy_arn)
-    delete_role()
-    delete_policy(policy_arn)
-    print("\n\nDeleting Stack....")
-    delete_waiter.wait(StackName=STACK_NAME)
 
+POLICY_TEST = StackRoleTest
 
 if __name__ == "__main__":
-    main()
+    run_standalone(StackRoleTest)
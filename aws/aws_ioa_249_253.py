@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
-import boto3, sys, time, json
+import os
 from botocore.exceptions import ClientError
-from utils import AWS_RESOURCE_TAGS
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from engine.output import show_response
+from engine.state import recall
+from engine.teardown import Teardown
+from engine.waiters import wait_for_waiter, wait_until
+from utils import aws_resource_tags
 
 """
 
@@ -16,34 +21,82 @@ Pattern: Describes instances, then terminates EC2 instance.
 """
 
 KEYPAIR = "ioa253keypair"
+# EC2 reports a duplicate key pair as InvalidKeyPair.Duplicate
+KEYPAIR_EXISTS_ERRORS = ("InvalidKeyPair.Duplicate", "EntityAlreadyExists")
 IMAGE_NAME = "AWSIOA253"
 REGION = "us-east-1"
+# Avoiding creating a default vpc in non-cscbte enviornments
+DEFAULT_VPC_ACCOUNT = "698278383212"
+SCRIPT = os.path.basename(__file__)
 
-TAGS = AWS_RESOURCE_TAGS
 
+class EC2Test(PolicyTest):
+    client = LazyClient("ec2", region_name=REGION)
 
-class EC2Test(object):
-    def __init__(self, client):
-        self.client = client
+    def __init__(self, session):
+        super(EC2Test, self).__init__(session)
+        self.vpc_id = None
+        self.instance_id = None
+        self.instances = []
 
     def setup(self):
         print("\nSetting up for Policy 253 test")
         print("\nCreaing KeyPair")
 
+        # Instances and the key pair an earlier run left behind
+        region = self.client.meta.region_name
+        leftovers = Teardown(self.session)
+        for instance in recall("ec2:instance", region=region, policy=SCRIPT):
+            leftovers.add([instance])
+        if recall("ec2:key-pair", name=KEYPAIR, region=region):
+            print("KeyPair Already Exists. Deleting...")
+            leftovers.add_resource("ec2:key-pair", region=region, KeyName=KEYPAIR)
+        leftovers.run(strict=True)
+
         try:
-            self.keypair = self.client.create_key_pair(
-                KeyName=KEYPAIR,
-                TagSpecifications=[{"ResourceType": "key-pair", "Tags": TAGS}],
-            )
-            print(f"Key Pair Created")
+            self.create_key_pair()
         except ClientError as e:
-            if e.response["Error"]["Code"] == "EntityAlreadyExists":
+            if e.response["Error"]["Code"] in KEYPAIR_EXISTS_ERRORS:
                 print("KeyPair Already Exists. Deleting...")
-                self.clean_up()
-                time.sleep(20)
-                self.setup()
+                self.delete_key_pair()
+                wait_until(
+                    self.create_key_pair,
+                    "key pair " + KEYPAIR,
+                    deadline=60,
+                    retry_errors=KEYPAIR_EXISTS_ERRORS,
+                )
+            else:
+                raise
+
+    def create_key_pair(self):
+        self.keypair = self.client.create_key_pair(
+            KeyName=KEYPAIR,
+            TagSpecifications=[
+                {"ResourceType": "key-pair", "Tags": aws_resource_tags()}
+            ],
+        )
+        print(f"Key Pair Created")
+        return self.keypair
 
     def trigger_before(self):
+        sts = self.session.client("sts")
+        account = sts.get_caller_identity().get("Account")
+        print(f"\nACCOUNT{account}\n")
+        if account == DEFAULT_VPC_ACCOUNT:
+            self.trigger_253_before()
+
+    def trigger_ioa(self):
+        self.trigger_253_pattern()
+        self.trigger_waiter(self.instance_id)
+        self.trigger_249_before()
+        self.trigger_249_pattern(self.instance_id)
+
+    def cleanup(self):
+        # Vpc needs to be manually deleted
+        # self.clean_up(self.instances, self.vpc_id)
+        self.clean_up(self.instances)
+
+    def trigger_253_before(self):
         print("\nRunning Before Conditions for Policy 253 test")
 
         self.describe_instances = self.client.describe_instances()
@@ -63,11 +116,11 @@ class EC2Test(object):
                 print(
                     "**************************************************************************"
                 )
-                self.trigger_before()
+                self.trigger_253_before()
         print(self.vpc_id)
         return self.vpc_id
 
-    def trigger_pattern(self):
+    def trigger_253_pattern(self):
         print("\nRunning Pattern Conditions for Policy 253 test")
         images = self.client.describe_images(
             Owners=["amazon"], Filters=[{"Name": "name", "Values": ["amzn2-ami-hvm*"]}]
@@ -79,14 +132,19 @@ class EC2Test(object):
             KeyName=KEYPAIR,
             MinCount=1,
             MaxCount=1,
-            TagSpecifications=[{"ResourceType": "instance", "Tags": TAGS}],
+            TagSpecifications=[
+                {"ResourceType": "instance", "Tags": aws_resource_tags()}
+            ],
         )
-        print(f"CREATE OUTPUT: {self.create_image}")
+        show_response("run-instances", self.create_image)
         self.instance_id = self.create_image["Instances"][0]["InstanceId"]
+        self.instances.append(self.instance_id)
         return self.instance_id
 
-    def trigger_waiter(self, id, ec2_waiters):
-        ec2_waiter.wait(InstanceIds=[id])
+    def trigger_waiter(self, id):
+        wait_for_waiter(
+            self.client, "instance_running", "instance " + id, InstanceIds=[id]
+        )
 
     def trigger_249_before(self):
         print("\nRunning Before Conditions for Policy 249 test")
@@ -96,56 +154,23 @@ class EC2Test(object):
     def trigger_249_pattern(self, id):
         self.terminate_instance = self.client.terminate_instances(InstanceIds=[id])
 
-    def clean_up(self, instances):
+    def delete_key_pair(self):
+        self.delete_key_pair_result = self.client.delete_key_pair(KeyName=KEYPAIR)
+        show_response("delete-key-pair", self.delete_key_pair_result)
+
+    def clean_up(self, instances, vpc=None):
         print("CLEANING UP")
-        self.delete_key_pair = self.client.delete_key_pair(KeyName=KEYPAIR)
-        self.delete_image = self.client.terminate_instances(InstanceIds=instances)
-        print(self.delete_image)
-        print(self.delete_key_pair)
-
-    def delete_vpc(self, vpc):
-        print("REMOVING VPC")
-        time.sleep(40)
-        try:
-            self.delete_vpc = self.client.delete_vpc(VpcId=vpc)
-            print(self.delete_vpc)
-        except ClientError as e:
-            print(e)
-            if e.response["Error"]["Code"] == "DependencyViolation":
-                print("WAITING TO DELETE VPC")
-                self.delete_vpc(vpc)
+        # The VPC can't be deleted until its instances have terminated
+        teardown = Teardown(self.session)
+        teardown.add_resource("ec2:key-pair", region=REGION, KeyName=KEYPAIR)
+        if instances:
+            teardown.add_resource("ec2:instance", region=REGION, InstanceIds=instances)
+        if vpc:
+            teardown.add_resource("ec2:vpc", region=REGION, VpcId=vpc)
+        teardown.run(strict=True)
+
 
+POLICY_TEST = EC2Test
 
 if __name__ == "__main__":
-    instances = []
-    aws_profile = sys.argv[1]
-    print("Using AWS profile", aws_profile)
-    ec2 = boto3.Session(profile_name=aws_profile).client("ec2", region_name=REGION)
-    ec2_waiter = ec2.get_waiter("instance_running")
-    account = (
-        boto3.Session(profile_name=aws_profile)
-        .client("sts")
-        .get_caller_identity()
-        .get("Account")
-    )
-    print(f"\nACCOUNT{account}\n")
-
-    test = EC2Test(ec2)
-    test.setup()
-
-    # Avoiding creating a default vpc in non-cscbte enviornments
-    if account == "698278383212":
-        vpc_id = test.trigger_before()
-
-    instance_id = test.trigger_pattern()
-    test.trigger_waiter(instance_id, ec2_waiter)
-    test.trigger_249_before()
-    test.trigger_249_pattern(instance_id)
-
-    # Vpc needs to be manually deleted
-    instances.append(instance_id)
-
-    test.clean_up(instances)
-
-    # if vpc_id:
-    #     vpc_id = test.delete_vpc(vpc_id)
+    run_standalone(EC2Test)
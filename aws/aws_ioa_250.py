@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
-import boto3, sys, time
-from utils import AWS_RESOURCE_TAGS
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from utils import aws_resource_tags
 
 """
 
@@ -10,88 +10,102 @@ Pattern: Creates key pair, describes EC2 instance limits via GameLift, then runs
 
 """
 
-# Authenticaion and Service Setup
-EC2 = boto3.Session(region_name="eu-west-3", profile_name=sys.argv[1]).client("ec2")
-GAMELIFT = boto3.Session(profile_name=sys.argv[1]).client("gamelift")
 # Variables
 AMI = "ami-0d6aecf0f0425f42a"
 INSTANCE_NAME = "TestIOA-250"
 KEY_PAIR = "testioakey_250"
 
 
-def ec2_create_key_pair():
-    EC2_CREATE_KEY_PAIR = EC2.create_key_pair(
-        KeyName=KEY_PAIR,
-        TagSpecifications=[{"ResourceType": "key-pair", "Tags": AWS_RESOURCE_TAGS}],
-    )
-    if EC2_CREATE_KEY_PAIR:
-        print(
-            "\n   create-key-pair Successfully Ran\n     Created KeyPair: " + KEY_PAIR
-        )
+class InstanceLimitTest(PolicyTest):
+    # Authenticaion and Service Setup
+    ec2 = LazyClient("ec2", region_name="eu-west-3")
+    gamelift = LazyClient("gamelift")
 
+    def __init__(self, session):
+        super(InstanceLimitTest, self).__init__(session)
+        self.instance_id = None
 
-def ec2_delete_key_pair():
-    EC2_DELETE_KEY_PAIR = EC2.delete_key_pair(KeyName=KEY_PAIR)
-    if EC2_DELETE_KEY_PAIR:
-        print("   delete-key-pair Successfully Ran\n     Deleted KeyPair: " + KEY_PAIR)
-
-
-def describe_ec2_instance_limits():
-    gamelift_describe_ec2_instance_limits = GAMELIFT.describe_ec2_instance_limits()
-    if gamelift_describe_ec2_instance_limits:
-        print("   describe_ec2_instance_limits Successfully Ran\n")
-
-
-def run_instances(instance_name):
-    # Add Name tag to AWS_RESOURCE_TAGS
-    tags_with_name = AWS_RESOURCE_TAGS + [{"Key": "Name", "Value": instance_name}]
-    ec2_run_instances = EC2.run_instances(
-        ImageId=AMI,
-        InstanceType="t2.micro",
-        KeyName=KEY_PAIR,
-        MinCount=1,
-        MaxCount=1,
-        TagSpecifications=[{"ResourceType": "instance", "Tags": tags_with_name}],
-    )
-    for i in ec2_run_instances["Instances"]:
-        global INSTANCE_ID
-        INSTANCE_ID = i["InstanceId"]
-
-    if ec2_run_instances:
-        print(
-            "   run-instances Successfully Ran\n    Created Instance: "
-            + INSTANCE_ID
-            + "\n"
+    def ec2_create_key_pair(self):
+        EC2_CREATE_KEY_PAIR = self.ec2.create_key_pair(
+            KeyName=KEY_PAIR,
+            TagSpecifications=[
+                {"ResourceType": "key-pair", "Tags": aws_resource_tags()}
+            ],
+        )
+        if EC2_CREATE_KEY_PAIR:
+            print(
+                "\n   create-key-pair Successfully Ran\n     Created KeyPair: "
+                + KEY_PAIR
+            )
+
+    def ec2_delete_key_pair(self):
+        EC2_DELETE_KEY_PAIR = self.ec2.delete_key_pair(KeyName=KEY_PAIR)
+        if EC2_DELETE_KEY_PAIR:
+            print(
+                "   delete-key-pair Successfully Ran\n     Deleted KeyPair: " + KEY_PAIR
+            )
+
+    def describe_ec2_instance_limits(self):
+        gamelift_describe_ec2_instance_limits = (
+            self.gamelift.describe_ec2_instance_limits()
+        )
+        if gamelift_describe_ec2_instance_limits:
+            print("   describe_ec2_instance_limits Successfully Ran\n")
+
+    def run_instances(self, instance_name):
+        # Add Name tag to the resource tags
+        tags_with_name = aws_resource_tags() + [{"Key": "Name", "Value": instance_name}]
+        ec2_run_instances = self.ec2.run_instances(
+            ImageId=AMI,
+            InstanceType="t2.micro",
+            KeyName=KEY_PAIR,
+            MinCount=1,
+            MaxCount=1,
+            TagSpecifications=[{"ResourceType": "instance", "Tags": tags_with_name}],
         )
+        for i in ec2_run_instances["Instances"]:
+            self.instance_id = i["InstanceId"]
+
+        if ec2_run_instances:
+            print(
+                "   run-instances Successfully Ran\n    Created Instance: "
+                + self.instance_id
+                + "\n"
+            )
+
+    def terminate_instances(self):
+        ec2_terminate_instances = self.ec2.terminate_instances(
+            InstanceIds=[
+                self.instance_id,
+            ],
+            DryRun=False,
+        )
+        if ec2_terminate_instances:
+            print(
+                "   terminate-instances Successfully Ran\n    Terminated Instance: "
+                + self.instance_id
+                + "\n"
+            )
 
+    def setup(self):
+        # Setup
+        self.ec2_create_key_pair()
 
-def terminate_instances():
-    ec2_terminate_instances = EC2.terminate_instances(
-        InstanceIds=[
-            INSTANCE_ID,
-        ],
-        DryRun=False,
-    )
-    if ec2_terminate_instances:
-        print(
-            "   terminate-instances Successfully Ran\n    Terminated Instance: "
-            + INSTANCE_ID
-            + "\n"
-        )
+    def trigger_ioa(self):
+        # Pattern Query
+        print("\n\nRunning Pattern Conditions\n")
+        self.describe_ec2_instance_limits()
+        self.run_instances(INSTANCE_NAME)
 
+    def cleanup(self):
+        # Clean Up
+        print("\n\nCleaning Up\n")
+        if self.instance_id:
+            self.terminate_instances()
+        self.ec2_delete_key_pair()
 
-def main():
-    # Setup
-    ec2_create_key_pair()
-    # Pattern Query
-    print("\n\nRunning Pattern Conditions\n")
-    describe_ec2_instance_limits()
-    run_instances(INSTANCE_NAME)
-    # Clean Up
-    print("\n\nCleaning Up\n")
-    terminate_instances()
-    ec2_delete_key_pair()
 
+POLICY_TEST = InstanceLimitTest
 
 if __name__ == "__main__":
-    main()
+    run_standalone(InstanceLimitTest)
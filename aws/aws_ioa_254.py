@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
-import boto3, sys, json, time
+import json
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from engine.output import show_response
 
 """
 
@@ -8,7 +10,6 @@ Policy 254 - CloudWatch logs policy modified to allow public access
 Pattern: Puts CloudWatch Logs resource policy with public principal ("*").
 
 """
-client = boto3.Session(profile_name=sys.argv[1]).client("logs", region_name="us-east-1")
 POLICY = json.dumps(
     {
         "Version": "2012-10-17",
@@ -24,21 +25,29 @@ POLICY = json.dumps(
 POLICY_NAME = "cspmtestpolicy254"
 
 
-def put_resource_policy():
-    response = client.put_resource_policy(policyName=POLICY_NAME, policyDocument=POLICY)
-    print(response)
+class LogsResourcePolicyTest(PolicyTest):
+    phase_delays = {"cleanup": 15}
 
+    client = LazyClient("logs", region_name="us-east-1")
 
-def delete_resource_policy():
-    response = client.delete_resource_policy(policyName=POLICY_NAME)
-    print(f"\n\n{response}")
+    def put_resource_policy(self):
+        response = self.client.put_resource_policy(
+            policyName=POLICY_NAME, policyDocument=POLICY
+        )
+        show_response("put-resource-policy", response)
 
+    def delete_resource_policy(self):
+        response = self.client.delete_resource_policy(policyName=POLICY_NAME)
+        show_response("delete-resource-policy", response)
 
-def main():
-    put_resource_policy()
-    time.sleep(15)
-    delete_resource_policy()
+    def trigger_ioa(self):
+        self.put_resource_policy()
 
+    def cleanup(self):
+        self.delete_resource_policy()
+
+
+POLICY_TEST = LogsResourcePolicyTest
 
 if __name__ == "__main__":
-    main()
+    run_standalone(LogsResourcePolicyTest)
@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
-import boto3, sys, json, time, uuid
-from utils import AWS_RESOURCE_TAGS
+import json, uuid
+from botocore.exceptions import ClientError
+from engine.fixtures import Fixture, lease_fixture
+from engine.lifecycle import LazyClient, PolicyTest, run_standalone
+from engine.output import show_response
+from engine.waiters import error_code
+from utils import aws_resource_tags
 
 """
 
@@ -9,68 +14,116 @@ Policy 255 - Elastic File System policy modified to allow public access
 Pattern: Creates EFS file system, then puts file system policy with public principal ("*"), and describes the policy.
 
 """
-client = boto3.Session(profile_name=sys.argv[1]).client("efs", region_name="us-east-1")
 EFS_NAME = "cspmtestefs255"
 
 
-def create_efs():
-    token_uuid = str(uuid.uuid1())
-    efs_values = {}
-    response = client.create_file_system(
-        CreationToken=token_uuid,
-        PerformanceMode="generalPurpose",
-        Tags=AWS_RESOURCE_TAGS,
-    )
-
-    id = response["FileSystemId"]
-    arn = response["FileSystemArn"]
-    efs_values["id"] = str(id)
-    efs_values["arn"] = str(arn)
-
-    return efs_values
-
-
-def put_file_system_policy(values):
-    efs_id = values["id"]
-    efs_arn = values["arn"]
-    policy_string = '{"Version":"2012-10-17","Statement":{"Effect":"Allow","Principal":{"AWS": "*"},"Action":["elasticfilesystem:AccessPointArn"],"Resource":"ARN"}}'.replace(
-        "ARN", efs_arn
-    )
-    POLICY = json.loads(policy_string)
-    response = client.put_file_system_policy(FileSystemId=efs_id, Policy=policy_string)
-
-    print(response)
-
-
-def perform_after_condition(id):
-    response = client.describe_file_system_policy(FileSystemId=id)
-    print(response)
-
-
-def delete_file_system(efs_id):
-    response = client.delete_file_system(
-        FileSystemId=efs_id,
-    )
-    # returns 204
-    print(response)
-
-
-def main():
-    print("\n\nPerforming Prep Conditions\n")
-    efs_values = create_efs()
-    efs_id = efs_values["id"]
-    time.sleep(5)
-
-    print("\n\nPerforming Pattern Conditions\n")
-    put_file_system_policy(efs_values)
-
-    print("\n\nPerforming After\n")
-    perform_after_condition(efs_id)
-
-    print("\n\nPerforming Clean Up\n")
-
-    delete_file_system(efs_id)
-
+class EFSFixture(Fixture):
+    """An EFS file system, found again by its creation token"""
+
+    name = "efs-255"
+
+    def plan(self, generation):
+        return {"token": str(uuid.uuid1())}
+
+    def ensure(self, test, resources):
+        file_systems = test.client.describe_file_systems(
+            CreationToken=resources["token"]
+        )["FileSystems"]
+        if file_systems:
+            efs_values = {
+                "id": file_systems[0]["FileSystemId"],
+                "arn": file_systems[0]["FileSystemArn"],
+            }
+        else:
+            efs_values = test.create_efs(resources["token"])
+        return dict(resources, **efs_values)
+
+    def alive(self, test, resources):
+        try:
+            test.client.describe_file_systems(FileSystemId=resources["id"])
+        except ClientError as e:
+            if error_code(e) == "FileSystemNotFound":
+                return False
+            raise
+        return True
+
+    def reset(self, test, resources):
+        # Policy 255 made the file system public
+        test.client.delete_file_system_policy(FileSystemId=resources["id"])
+
+    def destroy(self, test, resources):
+        if "id" in resources:
+            test.delete_file_system(resources["id"])
+
+
+class EFSPolicyTest(PolicyTest):
+    phase_delays = {"trigger_ioa": 5}
+
+    client = LazyClient("efs", region_name="us-east-1")
+
+    def __init__(self, session):
+        super(EFSPolicyTest, self).__init__(session)
+        self.fixture = None
+        self.efs_values = None
+
+    def create_efs(self, token_uuid):
+        efs_values = {}
+        response = self.client.create_file_system(
+            CreationToken=token_uuid,
+            PerformanceMode="generalPurpose",
+            Tags=aws_resource_tags(),
+        )
+
+        id = response["FileSystemId"]
+        arn = response["FileSystemArn"]
+        efs_values["id"] = str(id)
+        efs_values["arn"] = str(arn)
+
+        return efs_values
+
+    def put_file_system_policy(self, values):
+        efs_id = values["id"]
+        efs_arn = values["arn"]
+        policy_string = '{"Version":"2012-10-17","Statement":{"Effect":"Allow","Principal":{"AWS": "*"},"Action":["elasticfilesystem:AccessPointArn"],"Resource":"ARN"}}'.replace(
+            "ARN", efs_arn
+        )
+        POLICY = json.loads(policy_string)
+        response = self.client.put_file_system_policy(
+            FileSystemId=efs_id, Policy=policy_string
+        )
+        show_response("put-file-system-policy", response)
+
+    def perform_after_condition(self, id):
+        response = self.client.describe_file_system_policy(FileSystemId=id)
+        show_response("describe-file-system-policy", response)
+
+    def delete_file_system(self, efs_id):
+        response = self.client.delete_file_system(
+            FileSystemId=efs_id,
+        )
+        # returns 204
+        show_response("delete-file-system", response)
+
+    def setup(self):
+        print("\n\nPerforming Prep Conditions\n")
+        self.fixture = lease_fixture(EFSFixture(), self)
+        self.efs_values = self.fixture.resources
+
+    def trigger_ioa(self):
+        print("\n\nPerforming Pattern Conditions\n")
+        self.put_file_system_policy(self.efs_values)
+
+    def trigger_after(self):
+        print("\n\nPerforming After\n")
+        self.perform_after_condition(self.efs_values["id"])
+
+    def cleanup(self):
+        print("\n\nPerforming Clean Up\n")
+        if self.fixture is not None:
+            self.fixture.release()
+
+
+POLICY_TEST = EFSPolicyTest
 
 if __name__ == "__main__":
-    main()
+    run_standalone(EFSPolicyTest)
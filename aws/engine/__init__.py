@@ -0,0 +1,81 @@
+"""
+AWS IOA policy engine
+
+Runs any set of the aws_ioa_*.py policy scripts inside a single Python
+process. Usage, from the aws/ directory:
+
+    python3 -m engine list
+    python3 -m engine run -p 204 -p 221 <aws_cli_profile>
+    python3 -m engine run <aws_cli_profile>
+    python3 -m engine run --pipeline <aws_cli_profile>
+    python3 -m engine run --parallel 8 <aws_cli_profile>
+
+Every policy script declares a PolicyTest subclass as POLICY_TEST, see
+engine.lifecycle for the phase protocol.
+"""
+
+import importlib
+
+from engine.registry import PolicyModule, Registry, default_registry
+
+# Everything else pulls in boto3, so it is only imported on first use and
+# listing or planning policies stays fast
+_LAZY_EXPORTS = {
+    "Account": "engine.accounts",
+    "parse_accounts": "engine.accounts",
+    "run_accounts": "engine.accounts",
+    "AsyncScheduler": "engine.aio",
+    "ApiCall": "engine.calls",
+    "CallRecorder": "engine.calls",
+    "Clock": "engine.clock",
+    "ScaledClock": "engine.clock",
+    "get_clock": "engine.clock",
+    "set_clock": "engine.clock",
+    "RunDefaults": "engine.config",
+    "load_defaults": "engine.config",
+    "Fixture": "engine.fixtures",
+    "FixturePool": "engine.fixtures",
+    "lease_fixture": "engine.fixtures",
+    "show_response": "engine.output",
+    "Timeline": "engine.timeline",
+    "wait_for_access_key": "engine.iam",
+    "wait_for_role": "engine.iam",
+    "PHASES": "engine.lifecycle",
+    "LazyClient": "engine.lifecycle",
+    "PhaseRun": "engine.lifecycle",
+    "PolicyTest": "engine.lifecycle",
+    "run_phases": "engine.lifecycle",
+    "find_repository": "engine.lookup",
+    "find_security_groups": "engine.lookup",
+    "paginate": "engine.lookup",
+    "PhasePipeline": "engine.pipeline",
+    "RegionalPolicy": "engine.regions",
+    "region_caches": "engine.regions",
+    "run_regions": "engine.regions",
+    "PolicyResult": "engine.runner",
+    "run_policies": "engine.runner",
+    "run_policy": "engine.runner",
+    "run_policy_async": "engine.runner",
+    "ParallelScheduler": "engine.scheduler",
+    "parse_service_limits": "engine.scheduler",
+    "SessionCache": "engine.sessions",
+    "shared_sessions": "engine.sessions",
+    "Soak": "engine.soak",
+    "TokenBucket": "engine.soak",
+    "run_soak": "engine.soak",
+    "StateStore": "engine.state",
+    "get_state_store": "engine.state",
+    "recall": "engine.state",
+    "Teardown": "engine.teardown",
+    "TeardownError": "engine.teardown",
+    "WaitTimeout": "engine.waiters",
+    "wait_for_waiter": "engine.waiters",
+    "wait_until": "engine.waiters",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    return getattr(importlib.import_module(module_name), name)
@@ -0,0 +1,958 @@
+"""
+Command line entry point: python3 -m engine <command> [options]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from engine.aio import DEFAULT_THREADS
+from engine.manifest import load_manifest, menu_title
+from engine.registry import default_registry
+from engine.scheduler import parse_service_limits
+
+
+def list_policies(registry, options):
+    for policy_module in registry.modules():
+        ids = ", ".join(str(p) for p in policy_module.policy_ids)
+        print("%-28s %s" % (policy_module.filename, ids))
+    return 0
+
+
+def plan_policies(registry, options):
+    """Show what a run would do, from the manifest, without importing anything"""
+    try:
+        policy_modules = registry.resolve(options.policies)
+    except KeyError as e:
+        print(e.args[0])
+        return 2
+    manifest = load_manifest(registry.directory)
+    total = 0
+    for policy_module in policy_modules:
+        entry = manifest.get(policy_module)
+        total += entry["estimated_seconds"]
+        print(
+            "%-28s %-32s %-20s ~%ds"
+            % (
+                policy_module.filename,
+                ", ".join(entry["services"]),
+                ", ".join(entry["regions"]),
+                entry["estimated_seconds"],
+            )
+        )
+    print(
+        "%d policy script(s), ~%ds if run one at a time" % (len(policy_modules), total)
+    )
+    return 0
+
+
+def show_manifest(registry, options):
+    manifest = load_manifest(registry.directory)
+    if options.json:
+        with open(manifest.path) as f:
+            sys.stdout.write(f.read())
+        return 0
+    for entry in manifest.scripts():
+        print("%-28s %s" % (entry["file"], menu_title(entry)))
+    if manifest.rebuilt:
+        print(
+            "Re-indexed %d script(s), written to %s"
+            % (len(manifest.rebuilt), manifest.path)
+        )
+    return 0
+
+
+def run(registry, options):
+    # Imported here so listing and planning don't pay for importing boto3
+    from engine.accounts import connect_accounts, parse_accounts, run_accounts
+    from engine.calls import CallRecorder, print_api_stats
+    from engine.clock import ScaledClock, get_clock, set_clock
+    from engine.config import load_defaults
+    from engine.fixtures import FixturePool, fixtures_path, set_fixture_pool
+    from engine.output import set_debug
+    from engine.regions import (
+        ALL_REGIONS,
+        enabled_regions,
+        parse_regions,
+        region_caches,
+        run_regions,
+    )
+    from engine.runner import print_summary, run_policies
+    from engine.sessions import session_cache
+    from engine.timeline import Timeline
+
+    try:
+        policy_modules = registry.resolve(options.policies)
+    except KeyError as e:
+        print(e.args[0])
+        return 2
+    try:
+        service_limits = parse_service_limits(options.service_limits)
+    except ValueError as e:
+        print(e)
+        return 2
+    try:
+        defaults = load_defaults()
+    except ValueError as e:
+        print(e)
+        return 2
+    if options.shuffle is not None:
+        defaults.shuffle = options.shuffle
+    if options.seed is not None:
+        defaults.shuffle, defaults.seed = True, options.seed
+    policy_modules = defaults.order(policy_modules)
+    if defaults.shuffle:
+        print("Running policies in random order, seed %d" % defaults.seed)
+    parallel, pipeline = options.parallel, options.pipeline
+    asynchronous = options.asynchronous
+    if asynchronous and pipeline:
+        print("--async and --pipeline can't be used together")
+        return 2
+    if parallel is None and not pipeline and not asynchronous:
+        pipeline = defaults.interval == "pipeline"
+        asynchronous = defaults.interval == "async"
+        if defaults.interval == "parallel":
+            parallel = defaults.concurrency
+    if asynchronous and parallel is None:
+        # Nothing but the service limits holds a waiting coroutine back
+        parallel = len(policy_modules)
+    if options.regions and options.region:
+        print("--region and --regions can't be used together")
+        return 2
+    if options.accounts and options.regions:
+        print("--accounts and --regions can't be used together")
+        return 2
+    if options.accounts and options.keep_fixtures:
+        print("--keep-fixtures can't be used with --accounts")
+        return 2
+    accounts = None
+    if options.accounts:
+        try:
+            accounts = parse_accounts(options.accounts)
+        except ValueError as e:
+            print(e)
+            return 2
+    region = None if options.regions else options.region or defaults.region
+    sessions = session_cache(options.endpoint_url, region)
+    profile = options.aws_cli_profile or defaults.profile
+    if sessions.endpoint_url:
+        print("Sending every AWS API call to %s" % sessions.endpoint_url)
+    elif not profile:
+        print("An AWS CLI profile is required unless --endpoint-url is given")
+        return 2
+    if region:
+        print("Sending every client to region %s" % region)
+    regions = None
+    if options.regions:
+        try:
+            regions = parse_regions(options.regions)
+        except ValueError as e:
+            print(e)
+            return 2
+        if regions == [ALL_REGIONS]:
+            regions = enabled_regions(sessions.get(profile_name=profile))
+        print("Running in %d region(s): %s" % (len(regions), ", ".join(regions)))
+        if pipeline:
+            print("Regions run in parallel; --pipeline is ignored")
+    if accounts and pipeline:
+        print("Accounts run in parallel; --pipeline is ignored")
+    if options.time_scale != 1:
+        if not sessions.endpoint_url:
+            print("--time-scale needs --endpoint-url; real AWS can't be hurried")
+            return 2
+        set_clock(ScaledClock(options.time_scale))
+    set_debug(options.debug)
+    if options.keep_fixtures:
+        set_fixture_pool(FixturePool(fixtures_path()))
+    timeline = Timeline(options.timeline) if options.timeline else None
+    calls = CallRecorder(timeline=timeline, keep_responses=options.debug)
+    calls.install(sessions)
+    caches = [sessions]
+    start = time.monotonic()
+    unusable = []
+    if accounts is not None:
+        unusable = connect_accounts(accounts, sessions, profile, region, calls)
+        for account, error in unusable:
+            print("Can't use account %s: %s" % (account.name, error))
+            accounts.remove(account)
+        if not accounts:
+            return 1
+        print(
+            "Running in %d account(s): %s"
+            % (len(accounts), ", ".join(a.name for a in accounts))
+        )
+        caches.extend(a.sessions for a in accounts)
+        results = run_accounts(
+            policy_modules,
+            accounts,
+            parallel=parallel or 1,
+            service_limits=service_limits,
+            calls=calls,
+            asynchronous=asynchronous,
+            threads=options.threads,
+        )
+    elif regions is None:
+        results = run_policies(
+            policy_modules,
+            profile,
+            sessions=sessions,
+            parallel=parallel or 1,
+            service_limits=service_limits,
+            pipeline=pipeline,
+            calls=calls,
+            asynchronous=asynchronous,
+            threads=options.threads,
+        )
+    else:
+        by_region = region_caches(regions, options.endpoint_url, calls)
+        caches.extend(by_region.values())
+        results = run_regions(
+            policy_modules,
+            profile,
+            by_region,
+            parallel=parallel or 1,
+            service_limits=service_limits,
+            calls=calls,
+            asynchronous=asynchronous,
+            threads=options.threads,
+        )
+    if options.keep_fixtures:
+        set_fixture_pool(None).close()
+    print_summary(results, time.monotonic() - start)
+    if options.api_stats:
+        print_api_stats(calls)
+    totals = calls.totals()
+    print(
+        "%d API call(s), %d retried, %d throttled, %d failed"
+        % (totals.count, totals.retries, totals.throttled, totals.errors)
+    )
+    if timeline is not None:
+        timeline.close()
+        print("Wrote %d API call(s) to %s" % (timeline.written, timeline.path))
+    print(
+        "%d boto3 client(s) created, %d reused"
+        % (
+            sum(c.clients.created for c in caches),
+            sum(c.clients.reused for c in caches),
+        )
+    )
+    print("%.1fs spent waiting on the clock" % get_clock().idle)
+    print_leftovers(accounts, sessions.endpoint_url)
+    return 0 if all(r.ok for r in results) and not unusable else 1
+
+
+def print_other_scopes(store, searched):
+    """Point at the scopes other than searched that have live resources"""
+    others = dict(
+        (scope, count)
+        for scope, count in store.live_scopes().items()
+        if scope not in searched
+    )
+    if others:
+        print(
+            "%d live resource(s) in other scopes, see them with --endpoint-url"
+            " or --accounts: %s"
+            % (
+                sum(others.values()),
+                ", ".join("%s (%d)" % item for item in sorted(others.items())),
+            )
+        )
+
+
+def kept_fixture_policies():
+    """What the state store attributes the resources of kept fixtures to"""
+    from engine.fixtures import FixturePool, fixture_policy, fixtures_path
+
+    return set(fixture_policy(name) for name in FixturePool(fixtures_path()).records())
+
+
+def print_leftovers(accounts=None, endpoint_url=None):
+    """Point at the janitor if this run's resources outlived it"""
+    from engine.state import get_state_store
+
+    store = get_state_store()
+    if store is None:
+        return
+    kept = kept_fixture_policies()
+    left = []
+    command = "python3 -m engine janitor --run %s" % store.run_id
+    if endpoint_url:
+        command += " --endpoint-url %s" % endpoint_url
+    if accounts is None:
+        left = [r for r in store.find(run_id=store.run_id) if r.policy not in kept]
+    else:
+        specs = []
+        for account in accounts:
+            found = store.find(run_id=store.run_id, scope=account.scope)
+            found = [r for r in found if r.policy not in kept]
+            if found:
+                left.extend(found)
+                specs.append(account.spec)
+        command += " --accounts %s" % ",".join(specs)
+    if left:
+        print(
+            "%d resource(s) were not cleaned up; delete them with: %s"
+            % (len(left), command)
+        )
+
+
+def bench_policies(registry, options):
+    from engine import bench
+
+    try:
+        policy_modules = registry.resolve(options.policies)
+    except KeyError as e:
+        print(e.args[0])
+        return 2
+    baseline = bench.run_bench(
+        policy_modules,
+        endpoint_url=options.endpoint_url,
+        skip_sleeps=options.skip_sleeps,
+    )
+    bench.print_bench(baseline)
+    bench.write_baseline(baseline, options.output)
+    print("Wrote %s" % options.output)
+    failed = not all(r["ok"] for r in baseline["policies"].values())
+    if options.compare:
+        regressions = bench.compare_baselines(
+            bench.load_baseline(options.compare), baseline
+        )
+        for regression in regressions:
+            print("Regression: %s" % regression)
+        print("%d regression(s) against %s" % (len(regressions), options.compare))
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+def soak_policies(registry, options):
+    from engine import soak
+    from engine.config import load_defaults
+    from engine.sessions import session_cache
+
+    if not options.policies:
+        print("Choose the policies to soak with -p")
+        return 2
+    try:
+        policy_modules = registry.resolve(options.policies)
+        defaults = load_defaults()
+    except KeyError as e:
+        print(e.args[0])
+        return 2
+    except ValueError as e:
+        print(e)
+        return 2
+    sessions = session_cache(options.endpoint_url, defaults.region)
+    profile = options.aws_cli_profile or defaults.profile
+    if sessions.endpoint_url:
+        print("Sending every AWS API call to %s" % sessions.endpoint_url)
+    elif not profile:
+        print("An AWS CLI profile is required unless --endpoint-url is given")
+        return 2
+    try:
+        load = soak.Soak(
+            options.rate,
+            duration=options.duration,
+            burst=options.burst,
+            workers=options.workers,
+            max_events=options.max_events,
+            report_interval=options.report_interval,
+        )
+    except ValueError as e:
+        print(e)
+        return 2
+    soak.run_soak(policy_modules, profile, load, sessions=sessions)
+    soak.print_soak(load)
+    return 0 if all(p.ok for p in load.soaked) else 1
+
+
+def show_fixtures(registry, options):
+    from engine.fixtures import FixturePool, fixtures_path
+    from engine.runner import create_test
+    from engine.sessions import session_cache, shared_sessions
+
+    pool = FixturePool(fixtures_path())
+    records = pool.records()
+    now = time.time()
+    for name, record in sorted(records.items()):
+        print(
+            "%-16s %-8s %6.1fh old %3d use(s)  %s"
+            % (
+                name,
+                record["state"],
+                (now - record["created"]) / 3600,
+                record["uses"],
+                record["script"],
+            )
+        )
+    print("%d fixture(s) in %s" % (len(records), pool.path))
+    if not options.drain or not records:
+        return 0
+    sessions = session_cache(options.endpoint_url)
+    if not (sessions.endpoint_url or options.aws_cli_profile):
+        print("An AWS CLI profile is required unless --endpoint-url is given")
+        return 2
+    modules = dict((m.filename, m) for m in registry.modules())
+    # Fixtures built in a forced region are destroyed there
+    regional = {None: sessions}
+    failed = 0
+    for name, record in sorted(records.items()):
+        print("Destroying fixture %s" % name)
+        region = record.get("region")
+        if region not in regional:
+            regional[region] = session_cache(options.endpoint_url, region)
+        try:
+            with shared_sessions(regional[region]):
+                session = regional[region].get(profile_name=options.aws_cli_profile)
+                policy_module = modules[record["script"]]
+                fixture = getattr(policy_module.load(), record["class"])()
+                fixture.destroy(
+                    create_test(policy_module, session), record["resources"]
+                )
+        except Exception as e:
+            print("Could not destroy fixture %s: %r" % (name, e))
+            failed += 1
+            continue
+        pool.forget(name)
+    return 1 if failed else 0
+
+
+def connected_accounts(options, sessions, profile):
+    """The accounts of --accounts connected through sessions, or None"""
+    from engine.accounts import connect_accounts, parse_accounts
+
+    try:
+        accounts = parse_accounts(options.accounts)
+    except ValueError as e:
+        print(e)
+        return None
+    failed = connect_accounts(accounts, sessions, profile)
+    for account, error in failed:
+        print("Can't use account %s: %s" % (account.name, error))
+    return None if failed else accounts
+
+
+def show_state(registry, options):
+    from engine.config import load_defaults
+    from engine.sessions import ENDPOINT_ENV, session_cache
+    from engine.state import get_state_store
+
+    store = get_state_store()
+    if store is None:
+        print("Resources are not recorded, $IOA_STATE is off")
+        return 0
+    store.scope = options.endpoint_url or os.environ.get(ENDPOINT_ENV) or store.scope
+    scopes = [store.scope]
+    if options.accounts:
+        try:
+            profile = options.aws_cli_profile or load_defaults().profile
+        except ValueError as e:
+            print(e)
+            return 2
+        accounts = connected_accounts(
+            options, session_cache(options.endpoint_url), profile
+        )
+        if accounts is None:
+            return 2
+        scopes = [account.scope for account in accounts]
+    now = time.time()
+    for scope in scopes:
+        resources = store.find(policy=options.policy, scope=scope)
+        for resource in resources:
+            print(
+                "%-22s %-40s %-12s %6.1fh old  %s  %s"
+                % (
+                    resource.kind,
+                    resource.resource_id,
+                    resource.region or "",
+                    (now - resource.created_at) / 3600,
+                    resource.policy or "-",
+                    resource.run_id,
+                )
+            )
+        print("%d live resource(s) in %s (%s)" % (len(resources), store.path, scope))
+    print_other_scopes(store, scopes)
+    return 0
+
+
+def run_janitor(registry, options):
+    from engine.config import load_defaults
+    from engine.sessions import session_cache
+    from engine.state import get_state_store, pid_alive, run_pid
+    from engine.teardown import Teardown, describe
+
+    try:
+        defaults = load_defaults()
+    except ValueError as e:
+        print(e)
+        return 2
+    sessions = session_cache(options.endpoint_url)
+    profile = options.aws_cli_profile or defaults.profile
+    store = get_state_store()
+    if store is None:
+        print("Resources are not recorded, $IOA_STATE is off")
+        return 2
+    if sessions.endpoint_url:
+        print("Sending every AWS API call to %s" % sessions.endpoint_url)
+    elif not profile:
+        print("An AWS CLI profile is required unless --endpoint-url is given")
+        return 2
+    # (account name, scope, session to delete with) of every account
+    targets = [(None, store.scope, lambda: sessions.get(profile_name=profile))]
+    if options.accounts:
+        accounts = connected_accounts(options, sessions, profile)
+        if accounts is None:
+            return 2
+        targets = [
+            (account.name, account.scope, account.sessions.get) for account in accounts
+        ]
+    kept = kept_fixture_policies()
+    teardowns = []
+    for name, scope, session in targets:
+        resources = []
+        for resource in store.find(
+            policy=options.policy, run_id=options.run_id, scope=scope
+        ):
+            if resource.policy in kept:
+                print("Keeping %s of a kept fixture" % describe(resource))
+            elif pid_alive(run_pid(resource.run_id)):
+                print(
+                    "Keeping %s of the running run %s"
+                    % (describe(resource), resource.run_id)
+                )
+            else:
+                resources.append(resource)
+        for resource in resources:
+            print(
+                "%s %s (%s, %s%s)"
+                % (
+                    "Would delete" if options.dry_run else "Deleting",
+                    describe(resource),
+                    resource.policy or "-",
+                    resource.run_id,
+                    ", account " + name if name else "",
+                )
+            )
+        if resources:
+            teardown = Teardown(session(), workers=options.workers)
+            teardowns.append(teardown.add(resources))
+    if not teardowns:
+        print("Nothing to clean up in %s" % ", ".join(t[1] for t in targets))
+        print_other_scopes(store, [t[1] for t in targets])
+        return 0
+    if options.dry_run:
+        return 0
+    start = time.monotonic()
+    for teardown in teardowns:
+        teardown.run()
+    print(
+        "Deleted %d resource(s) in %.1fs, %d failed, %d skipped"
+        % (
+            sum(len(t.deleted) for t in teardowns),
+            time.monotonic() - start,
+            sum(len(t.failed) for t in teardowns),
+            sum(len(t.skipped) for t in teardowns),
+        )
+    )
+    return 1 if any(t.failed or t.skipped for t in teardowns) else 0
+
+
+def positive_int(value):
+    """argparse type of the counts that must be at least 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            "%r is not a whole number of at least 1" % value
+        )
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python3 -m engine", description="CSPM AWS IOA policy engine"
+    )
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    list_parser = commands.add_parser("list", help="List registered policies")
+    list_parser.set_defaults(func=list_policies)
+
+    plan_parser = commands.add_parser(
+        "plan", help="Show the services, regions and estimated time a run would use"
+    )
+    plan_parser.add_argument(
+        "-p",
+        "--policy",
+        type=int,
+        dest="policies",
+        action="append",
+        default=[],
+        help="Which policy to plan. Can have multiple instances. Defaults to all policies.",
+    )
+    plan_parser.set_defaults(func=plan_policies)
+
+    manifest_parser = commands.add_parser(
+        "manifest", help="Rebuild the policy manifest where scripts have changed"
+    )
+    manifest_parser.add_argument(
+        "--json",
+        action="store_true",
+        dest="json",
+        default=False,
+        help="Print the whole manifest as JSON",
+    )
+    manifest_parser.set_defaults(func=show_manifest)
+
+    run_parser = commands.add_parser(
+        "run", help="Run policies in a single Python process"
+    )
+    run_parser.add_argument(
+        "-p",
+        "--policy",
+        type=int,
+        dest="policies",
+        action="append",
+        default=[],
+        help="Which policy to run. Can have multiple instances. Defaults to all policies.",
+    )
+    run_parser.add_argument(
+        "--parallel",
+        type=positive_int,
+        dest="parallel",
+        metavar="N",
+        help="How many policies to run at the same time (defaults to interval and concurrency in config.ini)",
+    )
+    run_parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        dest="pipeline",
+        default=False,
+        help="Run other policies' phases while a policy waits between phases",
+    )
+    run_parser.add_argument(
+        "--async",
+        action="store_true",
+        dest="asynchronous",
+        default=False,
+        help="Run the policies as coroutines on one event loop, their AWS calls on a pool of --threads threads; --parallel caps the policies in flight (defaults to all of them)",
+    )
+    run_parser.add_argument(
+        "--threads",
+        type=positive_int,
+        dest="threads",
+        default=DEFAULT_THREADS,
+        metavar="N",
+        help="With --async, how many threads make the blocking AWS calls of all policies (defaults to %d)"
+        % DEFAULT_THREADS,
+    )
+    run_parser.add_argument(
+        "--random",
+        action="store_const",
+        const=True,
+        dest="shuffle",
+        help="Run policies in random order (defaults to random in config.ini)",
+    )
+    run_parser.add_argument(
+        "--in-order",
+        action="store_const",
+        const=False,
+        dest="shuffle",
+        help="Run policies in the order given, whatever config.ini says",
+    )
+    run_parser.add_argument(
+        "--seed",
+        type=int,
+        dest="seed",
+        help="Run policies in the random order this seed gives, to repeat an earlier run",
+    )
+    run_parser.add_argument(
+        "--region",
+        dest="region",
+        help="Send every client to this region, whatever the policies ask for (defaults to region in config.ini)",
+    )
+    run_parser.add_argument(
+        "--regions",
+        dest="regions",
+        help="Run the policies in each of these comma-separated regions at once, or in every enabled region with 'all'; IAM and S3 policies run in the first only",
+    )
+    run_parser.add_argument(
+        "--accounts",
+        dest="accounts",
+        help="Run the policies in each of these comma-separated accounts at once: role ARNs to assume with the profile, AWS CLI profiles, names from [accounts] in config.ini, or every one of those with 'all'",
+    )
+    run_parser.add_argument(
+        "--service-limit",
+        dest="service_limits",
+        action="append",
+        default=[],
+        metavar="SERVICE=N",
+        help="Cap concurrent policies using an AWS service, e.g. iam=1 (defaults to iam=2). Can have multiple instances.",
+    )
+    run_parser.add_argument(
+        "--endpoint-url",
+        dest="endpoint_url",
+        help="Run offline: send every AWS API call to this local emulator, e.g. http://127.0.0.1:5000, with dummy credentials (defaults to $IOA_ENDPOINT_URL)",
+    )
+    run_parser.add_argument(
+        "--timeline",
+        dest="timeline",
+        default="ioa_timeline.jsonl",
+        metavar="PATH",
+        help="Write one JSON line per AWS API call here (defaults to ioa_timeline.jsonl)",
+    )
+    run_parser.add_argument(
+        "--no-timeline",
+        action="store_const",
+        const=None,
+        dest="timeline",
+        help="Don't write an API call timeline",
+    )
+    run_parser.add_argument(
+        "--debug",
+        action="store_true",
+        dest="debug",
+        default=False,
+        help="Print whole API responses and keep them in the timeline",
+    )
+    run_parser.add_argument(
+        "--api-stats",
+        action="store_true",
+        dest="api_stats",
+        default=False,
+        help="Print call counts, latency percentiles, retries and throttling per AWS API",
+    )
+    run_parser.add_argument(
+        "--keep-fixtures",
+        action="store_true",
+        dest="keep_fixtures",
+        default=False,
+        help="Keep expensive prerequisites, such as RDS snapshots, for later runs in ioa_fixtures.json (or $IOA_FIXTURES)",
+    )
+    run_parser.add_argument(
+        "--time-scale",
+        type=float,
+        dest="time_scale",
+        default=1,
+        metavar="FACTOR",
+        help="With --endpoint-url, run every sleep and poll FACTOR times faster (defaults to 1)",
+    )
+    run_parser.add_argument(
+        "aws_cli_profile",
+        nargs="?",
+        help="The name of the AWS CLI profile you wish to use (defaults to profile in config.ini, not needed offline)",
+    )
+    run_parser.set_defaults(func=run)
+
+    bench_parser = commands.add_parser(
+        "bench", help="Time each policy's phases against a local AWS stand-in"
+    )
+    bench_parser.add_argument(
+        "-p",
+        "--policy",
+        type=int,
+        dest="policies",
+        action="append",
+        default=[],
+        help="Which policy to benchmark. Can have multiple instances. Defaults to all policies.",
+    )
+    bench_parser.add_argument(
+        "--endpoint-url",
+        dest="endpoint_url",
+        default="http://127.0.0.1:5000",
+        help="The AWS stand-in to send every API call to (defaults to a local moto_server)",
+    )
+    bench_parser.add_argument(
+        "--output",
+        dest="output",
+        default="bench_baseline.json",
+        help="Where to write the results (defaults to bench_baseline.json)",
+    )
+    bench_parser.add_argument(
+        "--compare",
+        dest="compare",
+        metavar="BASELINE",
+        help="A previous results file; exit 1 if any phase regressed against it",
+    )
+    bench_parser.add_argument(
+        "--skip-sleeps",
+        action="store_true",
+        dest="skip_sleeps",
+        default=False,
+        help="Record sleeps and phase delays without waiting them out",
+    )
+    bench_parser.set_defaults(func=bench_policies)
+
+    soak_parser = commands.add_parser(
+        "soak",
+        help="Repeat policies' pattern phase at a steady rate to load a detection pipeline",
+    )
+    soak_parser.add_argument(
+        "-p",
+        "--policy",
+        type=int,
+        dest="policies",
+        action="append",
+        default=[],
+        help="Which policy to soak. Can have multiple instances.",
+    )
+    soak_parser.add_argument(
+        "--rate",
+        type=float,
+        dest="rate",
+        default=10,
+        metavar="EVENTS",
+        help="Target AWS API calls per second, across every policy (defaults to 10)",
+    )
+    soak_parser.add_argument(
+        "--duration",
+        type=float,
+        dest="duration",
+        default=60,
+        metavar="SECONDS",
+        help="How long to keep the load up (defaults to 60)",
+    )
+    soak_parser.add_argument(
+        "--events",
+        type=int,
+        dest="max_events",
+        metavar="N",
+        help="Stop early after N API calls",
+    )
+    soak_parser.add_argument(
+        "--burst",
+        type=float,
+        dest="burst",
+        metavar="EVENTS",
+        help="How many calls may go out at once after a lull (defaults to one second's worth)",
+    )
+    soak_parser.add_argument(
+        "--workers",
+        type=int,
+        dest="workers",
+        default=1,
+        metavar="N",
+        help="Threads repeating each policy's pattern; only for patterns that can overlap (defaults to 1)",
+    )
+    soak_parser.add_argument(
+        "--report-every",
+        type=float,
+        dest="report_interval",
+        default=5,
+        metavar="SECONDS",
+        help="How often to print the achieved rate (defaults to 5)",
+    )
+    soak_parser.add_argument(
+        "--endpoint-url",
+        dest="endpoint_url",
+        help="Send every AWS API call to this local emulator instead (defaults to $IOA_ENDPOINT_URL)",
+    )
+    soak_parser.add_argument(
+        "aws_cli_profile",
+        nargs="?",
+        help="The name of the AWS CLI profile you wish to use (defaults to profile in config.ini, not needed offline)",
+    )
+    soak_parser.set_defaults(func=soak_policies)
+
+    fixtures_parser = commands.add_parser(
+        "fixtures", help="List the prerequisites kept by run --keep-fixtures"
+    )
+    fixtures_parser.add_argument(
+        "--drain",
+        action="store_true",
+        dest="drain",
+        default=False,
+        help="Destroy every kept fixture",
+    )
+    fixtures_parser.add_argument(
+        "--endpoint-url",
+        dest="endpoint_url",
+        help="Send every AWS API call to this local emulator instead (defaults to $IOA_ENDPOINT_URL)",
+    )
+    fixtures_parser.add_argument(
+        "aws_cli_profile",
+        nargs="?",
+        help="The name of the AWS CLI profile to drain with (not needed offline)",
+    )
+    fixtures_parser.set_defaults(func=show_fixtures)
+
+    state_parser = commands.add_parser(
+        "state", help="List the resources runs created and haven't deleted"
+    )
+    state_parser.add_argument(
+        "--policy",
+        dest="policy",
+        help="Only list resources created by this policy script, e.g. aws_ioa_238.py",
+    )
+    state_parser.add_argument(
+        "--endpoint-url",
+        dest="endpoint_url",
+        help="List the resources created on this local emulator (defaults to $IOA_ENDPOINT_URL)",
+    )
+    state_parser.add_argument(
+        "--accounts",
+        dest="accounts",
+        help="List the resources created in each of these comma-separated accounts, as for run --accounts",
+    )
+    state_parser.add_argument(
+        "aws_cli_profile",
+        nargs="?",
+        help="The AWS CLI profile to assume the roles of --accounts with (defaults to profile in config.ini)",
+    )
+    state_parser.set_defaults(func=show_state)
+
+    janitor_parser = commands.add_parser(
+        "janitor", help="Delete the resources interrupted runs left behind"
+    )
+    janitor_parser.add_argument(
+        "--policy",
+        dest="policy",
+        help="Only delete resources created by this policy script, e.g. aws_ioa_238.py",
+    )
+    janitor_parser.add_argument(
+        "--run",
+        dest="run_id",
+        help="Only delete resources created by this run",
+    )
+    janitor_parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        dest="workers",
+        help="Resources to delete at once (default 8)",
+    )
+    janitor_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        dest="dry_run",
+        default=False,
+        help="Only list what would be deleted",
+    )
+    janitor_parser.add_argument(
+        "--endpoint-url",
+        dest="endpoint_url",
+        help="Clean up a local emulator instead (defaults to $IOA_ENDPOINT_URL)",
+    )
+    janitor_parser.add_argument(
+        "--accounts",
+        dest="accounts",
+        help="Clean up each of these comma-separated accounts, as for run --accounts",
+    )
+    janitor_parser.add_argument(
+        "aws_cli_profile",
+        nargs="?",
+        help="The name of the AWS CLI profile you wish to use (defaults to profile in config.ini, not needed offline)",
+    )
+    janitor_parser.set_defaults(func=run_janitor)
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    return options.func(default_registry(), options)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+One batch of policies run in several AWS accounts at once
+
+An account is a role to assume with the run's profile, an AWS CLI profile,
+or the name of either in the [accounts] section of config.ini:
+
+    [accounts]
+    audit = arn:aws:iam::111111111111:role/OrganizationAccountAccessRole
+    sandbox = sandbox-admin
+
+Each role is assumed once, before any policy runs, and its temporary
+credentials are shared by every client in that account; botocore refreshes
+them shortly before they expire. Every account gets its own SessionCache,
+and every (policy, account) pair is a job for a single ParallelScheduler
+that runs up to parallel policies in each account at once, with the
+per-service limits applied per account, as AWS throttles each account on
+its own. The results come back as one list and the API calls go to one
+timeline, each labelled with its account.
+"""
+
+import concurrent.futures
+import functools
+import re
+import sys
+
+from botocore.credentials import (
+    AssumeRoleCredentialFetcher,
+    DeferredRefreshableCredentials,
+)
+
+from engine.aio import DEFAULT_THREADS, AsyncScheduler
+from engine.output import PrefixedStream
+from engine.runner import policy_label, run_policy, run_policy_async
+from engine.scheduler import DEFAULT_SERVICE_LIMITS, ParallelScheduler
+from engine.sessions import session_cache, shared_sessions
+from engine.state import get_state_store, new_run_id, recall_scope, scope_of
+from utils import get_config_options
+
+ACCOUNTS_SECTION = "accounts"
+
+# --accounts value meaning every account in config.ini
+ALL_ACCOUNTS = "all"
+
+ROLE_ARN = re.compile(r"^arn:aws[a-z-]*:iam::(\d{12}):role/.+$")
+
+# Where STS is called if the profile has no region
+STS_REGION = "us-east-1"
+
+# Scheduler slot every policy in an account takes, capping them per account
+ACCOUNT_SLOT = "policies"
+
+
+def role_session_name():
+    """RoleSessionName of the assumed roles, for CloudTrail to tie to the run"""
+    store = get_state_store()
+    return "ioa-runner-" + (store.run_id if store is not None else new_run_id())
+
+
+class Account(object):
+    """
+    An account given as spec: a role ARN to assume, or an AWS CLI profile.
+    name labels its results; it defaults to the account ID or profile.
+    """
+
+    def __init__(self, spec, name=None):
+        match = ROLE_ARN.match(spec)
+        self.spec = name or spec
+        self.role_arn = spec if match else None
+        self.profile = None if match else spec
+        self.account_id = match.group(1) if match else None
+        self.name = name or self.account_id or spec
+        self.sessions = None
+
+    @property
+    def scope(self):
+        """Where the state store keeps the resources made in this account"""
+        return scope_of(self.sessions.endpoint_url, self.account_id)
+
+    def connect(self, sessions, profile, region_override=None, calls=None):
+        """
+        Get this account's credentials through sessions, the run's
+        SessionCache, and give it a SessionCache of its own. A role is
+        assumed here, once, so an account that can't be used fails before
+        any policy runs in it.
+        """
+        if self.role_arn:
+            source = sessions.get(profile_name=profile)
+            region = source.region_name
+            fetcher = AssumeRoleCredentialFetcher(
+                functools.partial(source.client, region_name=region or STS_REGION),
+                source.get_credentials(),
+                self.role_arn,
+                extra_args={"RoleSessionName": role_session_name()},
+            )
+            credentials = DeferredRefreshableCredentials(
+                fetcher.fetch_credentials, "assume-role"
+            )
+            credentials.get_frozen_credentials()
+        else:
+            source = sessions.get(profile_name=self.profile)
+            region = source.region_name
+            credentials = source.get_credentials()
+            sts = source.client("sts", region_name=region or STS_REGION)
+            self.account_id = sts.get_caller_identity()["Account"]
+        self.sessions = session_cache(
+            sessions.endpoint_url, region_override, credentials, region, self.account_id
+        )
+        if calls is not None:
+            calls.install(self.sessions)
+        return self.sessions
+
+
+def configured_accounts(config=None):
+    """The [accounts] section of config.ini as {name: role ARN or profile}"""
+    if config is None:
+        config = get_config_options()
+    if not config.has_section(ACCOUNTS_SECTION):
+        return {}
+    return dict(
+        (name, spec.strip())
+        for name, spec in config[ACCOUNTS_SECTION].items()
+        if spec.strip()
+    )
+
+
+def parse_accounts(value, config=None):
+    """
+    Accounts from "audit,arn:aws:iam::111111111111:role/Admin,sandbox-admin".
+    Names in the [accounts] section of config.ini stand for their entry, and
+    ALL_ACCOUNTS for every entry.
+    """
+    configured = configured_accounts(config)
+    accounts = []
+    for spec in value.split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        if spec.lower() == ALL_ACCOUNTS:
+            if not configured:
+                raise ValueError(
+                    "There are no accounts in the [%s] section of config.ini"
+                    % ACCOUNTS_SECTION
+                )
+            accounts.extend(Account(s, name) for name, s in configured.items())
+        elif spec.lower() in configured:
+            accounts.append(Account(configured[spec.lower()], spec.lower()))
+        else:
+            accounts.append(Account(spec))
+    unique = []
+    for account in accounts:
+        key = account.role_arn or account.profile
+        if key not in [a.role_arn or a.profile for a in unique]:
+            unique.append(account)
+    if not unique:
+        raise ValueError("No accounts given")
+    return unique
+
+
+def connect_accounts(accounts, sessions, profile, region_override=None, calls=None):
+    """
+    Connect every one of accounts at once, see Account.connect(), and return
+    the (account, error) of each that failed
+    """
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max(1, min(8, len(accounts)))) as pool:
+        futures = dict(
+            (
+                pool.submit(account.connect, sessions, profile, region_override, calls),
+                account,
+            )
+            for account in accounts
+        )
+        for future in concurrent.futures.as_completed(futures):
+            if future.exception() is not None:
+                failed.append((futures[future], future.exception()))
+    return failed
+
+
+def account_service(service, account):
+    """Key of service in account for the scheduler's per-service limits"""
+    return "%s#%s" % (service, account.name)
+
+
+class AccountPolicy(object):
+    """A policy script scheduled in one account"""
+
+    def __init__(self, policy_module, account):
+        self.policy_module = policy_module
+        self.account = account
+        self.name = policy_label(policy_module, account=account.name)
+        self.services = (account_service(ACCOUNT_SLOT, account),) + tuple(
+            account_service(service, account) for service in policy_module.services
+        )
+
+
+def run_accounts(
+    policy_modules,
+    accounts,
+    parallel=1,
+    service_limits=None,
+    calls=None,
+    asynchronous=False,
+    threads=DEFAULT_THREADS,
+):
+    """
+    Run policy_modules in every one of accounts, connected already, up to
+    parallel policies at once in each, and return the PolicyResults of all
+    accounts in one list. With asynchronous, the policies run as coroutines
+    on threads threads.
+    """
+    limits = dict(DEFAULT_SERVICE_LIMITS if service_limits is None else service_limits)
+    limits[ACCOUNT_SLOT] = parallel
+    limits = dict(
+        (account_service(service, account), limit)
+        for service, limit in limits.items()
+        for account in accounts
+    )
+    if asynchronous:
+        scheduler = AsyncScheduler(parallel * len(accounts), limits, threads)
+    else:
+        scheduler = ParallelScheduler(parallel * len(accounts), limits)
+    stdout = sys.stdout
+    prefixed = PrefixedStream(stdout)
+
+    def run_one(job):
+        account = job.account
+        prefixed.set_prefix(job.name)
+        try:
+            with shared_sessions(account.sessions), recall_scope(account.scope):
+                print("Running %s" % job.policy_module.filename)
+                return run_policy(
+                    job.policy_module,
+                    account.sessions.get(),
+                    calls,
+                    account=account.name,
+                )
+        finally:
+            prefixed.clear_prefix()
+
+    async def run_one_async(job):
+        account = job.account
+        prefixed.set_prefix(job.name)
+        try:
+            with shared_sessions(account.sessions), recall_scope(account.scope):
+                print("Running %s" % job.policy_module.filename)
+                return await run_policy_async(
+                    job.policy_module,
+                    account.sessions.get(),
+                    calls,
+                    account=account.name,
+                )
+        finally:
+            prefixed.clear_prefix()
+
+    jobs = [
+        AccountPolicy(policy_module, account)
+        for policy_module in policy_modules
+        for account in accounts
+    ]
+    sys.stdout = prefixed
+    try:
+        return scheduler.run(jobs, run_one_async if asynchronous else run_one)
+    finally:
+        sys.stdout = stdout
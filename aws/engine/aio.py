@@ -0,0 +1,86 @@
+"""
+Policies as coroutines on one asyncio event loop
+
+Nearly all of a policy run is spent waiting, on API calls or on resources
+to settle. The async engine runs every policy as a task on one event loop,
+see engine.runner.run_policy_async(). A policy's phases, and the chunks a
+generator phase yields between (see engine.lifecycle), are the steps that
+make blocking boto3 calls, and each step runs on a bounded pool of threads.
+The phase_delays and the seconds a phase yields are awaited on the engine
+clock, so a waiting policy holds no thread and hundreds of policies, say
+one per account and region, can be in flight at once on a handful of
+threads.
+
+Waits made inside a step, such as wait_until() or a botocore waiter, still
+block the thread that runs the step; the more of them a batch has, the more
+threads it needs.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+
+from engine.scheduler import ParallelScheduler
+
+# Threads the blocking steps of all policies share
+DEFAULT_THREADS = 16
+
+
+def in_thread(func, *args):
+    """
+    Await func(*args) run on the loop's executor, in a copy of the calling
+    task's context, so it sees the task's session cache, output prefix and
+    call tags
+    """
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(context.run, func, *args)
+    )
+
+
+class AsyncScheduler(ParallelScheduler):
+    """
+    ParallelScheduler for coroutines: up to max_workers policies are in
+    flight at once, under the same per-service limits, while their blocking
+    steps share a pool of threads.
+    """
+
+    def __init__(self, max_workers, service_limits=None, threads=DEFAULT_THREADS):
+        super(AsyncScheduler, self).__init__(max_workers, service_limits)
+        self.threads = max(1, threads)
+
+    def run(self, policy_modules, run_one):
+        """
+        Await run_one(policy_module), a coroutine function, for every policy
+        and return the results in the same order as policy_modules
+        """
+        return asyncio.run(self._run(policy_modules, run_one))
+
+    async def _run(self, policy_modules, run_one):
+        executor = concurrent.futures.ThreadPoolExecutor(
+            self.threads, thread_name_prefix="ioa-step"
+        )
+        asyncio.get_running_loop().set_default_executor(executor)
+        slots = asyncio.Condition()
+
+        async def run_slotted(policy_module):
+            services = policy_module.services
+            async with slots:
+                await slots.wait_for(lambda: self._has_capacity(services))
+                self._acquire(services)
+            try:
+                return await run_one(policy_module)
+            finally:
+                async with slots:
+                    self._running -= 1
+                    for service in services:
+                        self._in_use[service] -= 1
+                    slots.notify_all()
+
+        try:
+            return await asyncio.gather(
+                *(run_slotted(policy_module) for policy_module in policy_modules)
+            )
+        finally:
+            executor.shutdown(wait=True)
@@ -0,0 +1,251 @@
+"""
+Per-policy, per-phase benchmarks against a local AWS stand-in
+
+Runs policies one at a time against a moto server (moto_server, default
+http://127.0.0.1:5000) and records, for every phase: wall time, AWS API
+calls made, seconds spent sleeping on the engine clock or in time.sleep
+(including botocore waiters), the phase delay waited before it and bytes
+printed. Results are written as JSON
+so a later run can be compared against them with compare_baselines.
+"""
+
+import contextlib
+import datetime
+import json
+import sys
+import threading
+import time
+
+from engine.clock import Clock, use_clock
+from engine.lifecycle import PHASES, PhaseRun
+from engine.runner import create_test, policy_label
+from engine.sessions import session_cache, shared_sessions
+
+DEFAULT_ENDPOINT = "http://127.0.0.1:5000"
+DEFAULT_BASELINE = "bench_baseline.json"
+BASELINE_VERSION = 1
+
+# A phase regresses when it gets this much slower and at least this many
+# seconds slower than the baseline
+WALL_TOLERANCE = 0.25
+WALL_SLACK = 1.0
+
+
+class PhaseMetrics(object):
+    FIELDS = (
+        "wall_seconds",
+        "delay_seconds",
+        "sleep_seconds",
+        "api_calls",
+        "bytes_printed",
+    )
+
+    def __init__(self):
+        self.wall_seconds = 0.0
+        self.delay_seconds = 0.0
+        self.sleep_seconds = 0.0
+        self.api_calls = 0
+        self.bytes_printed = 0
+
+    def as_dict(self):
+        return dict((field, round(getattr(self, field), 3)) for field in self.FIELDS)
+
+
+class _CountingStream(object):
+    """stdout wrapper that counts the bytes written while a phase runs"""
+
+    def __init__(self, stream, recorder):
+        self._stream = stream
+        self._recorder = recorder
+
+    def write(self, text):
+        metrics = self._recorder.current
+        if metrics is not None:
+            metrics.bytes_printed += len(text.encode("utf-8", "replace"))
+        return self._stream.write(text)
+
+    def flush(self):
+        return self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class BenchRecorder(Clock):
+    """
+    Clock that attributes API calls, sleeps and output to the phase currently
+    running. With skip_sleeps, sleeping advances now() instead of blocking.
+    """
+
+    def __init__(self, skip_sleeps=False):
+        super(BenchRecorder, self).__init__()
+        self.skip_sleeps = skip_sleeps
+        self.current = None
+        self._skipped = 0.0
+        self._real_sleep = time.sleep
+        self._thread = threading.current_thread()
+
+    def on_api_call(self, **kwargs):
+        if self.current is not None:
+            self.current.api_calls += 1
+
+    def now(self):
+        return time.monotonic() + self._skipped
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        self.add_idle(seconds)
+        # Only the benchmark thread's sleeps belong to the running phase
+        if threading.current_thread() is self._thread:
+            if self.current is not None:
+                self.current.sleep_seconds += seconds
+            if self.skip_sleeps:
+                self._skipped += seconds
+                return
+        self._real_sleep(seconds)
+
+    @contextlib.contextmanager
+    def patched(self):
+        """Install as the clock, and catch time.sleep calls made outside it"""
+        stdout = sys.stdout
+        sys.stdout = _CountingStream(stdout, self)
+        time.sleep = self.sleep
+        try:
+            with use_clock(self):
+                yield self
+        finally:
+            time.sleep = self._real_sleep
+            sys.stdout = stdout
+
+
+def bench_policy(policy_module, session, recorder):
+    """Run one policy phase by phase and return its benchmark record"""
+    record = {"file": policy_module.filename, "phases": {}}
+    start = time.monotonic()
+    try:
+        test = create_test(policy_module, session)
+    except Exception as e:
+        record.update(ok=False, error=repr(e), wall_seconds=0.0)
+        return record
+
+    metrics_by_phase = {}
+    phase_run = PhaseRun(test)
+    while not phase_run.done:
+        phase = phase_run.next_phase
+        delay = phase_run.delay()
+        metrics = metrics_by_phase.get(phase)
+        if metrics is None:
+            metrics = metrics_by_phase[phase] = PhaseMetrics()
+            metrics.delay_seconds = delay
+            recorder.sleep(delay)
+            delay = 0
+        recorder.current = metrics
+        phase_start = time.monotonic()
+        try:
+            # A resumed phase first waits out what it yielded, as its own sleep
+            recorder.sleep(delay)
+            phase_run.step()
+        finally:
+            metrics.wall_seconds += time.monotonic() - phase_start
+            recorder.current = None
+
+    for phase, metrics in metrics_by_phase.items():
+        record["phases"][phase] = metrics.as_dict()
+    record.update(
+        ok=phase_run.error is None,
+        error=phase_run.error,
+        wall_seconds=round(time.monotonic() - start, 3),
+    )
+    return record
+
+
+def run_bench(policy_modules, endpoint_url=DEFAULT_ENDPOINT, skip_sleeps=False):
+    """Benchmark policy_modules against endpoint_url and return the baseline dict"""
+    sessions = session_cache(endpoint_url)
+    recorder = BenchRecorder(skip_sleeps)
+    sessions.register("before-call", recorder.on_api_call)
+    results = {}
+    with shared_sessions(sessions), recorder.patched():
+        session = sessions.get()
+        for policy_module in policy_modules:
+            print("Benchmarking %s" % policy_module.filename)
+            results[policy_label(policy_module)] = bench_policy(
+                policy_module, session, recorder
+            )
+    return {
+        "version": BASELINE_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "endpoint_url": endpoint_url,
+        "skip_sleeps": skip_sleeps,
+        "policies": results,
+    }
+
+
+def write_baseline(baseline, path):
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_baselines(old, new):
+    """
+    Return human readable regressions of new against old: policies that
+    started failing, phases that got noticeably slower or make more API calls.
+    """
+    regressions = []
+    for label, result in sorted(new["policies"].items()):
+        previous = old["policies"].get(label)
+        if previous is None:
+            continue
+        if previous["ok"] and not result["ok"]:
+            regressions.append("%s now fails: %s" % (label, result["error"]))
+            continue
+        for phase in PHASES:
+            before = previous["phases"].get(phase)
+            after = result["phases"].get(phase)
+            if before is None or after is None:
+                continue
+            slower = after["wall_seconds"] - before["wall_seconds"]
+            if slower > WALL_SLACK and slower > before["wall_seconds"] * WALL_TOLERANCE:
+                regressions.append(
+                    "%s %s: %.1fs -> %.1fs"
+                    % (label, phase, before["wall_seconds"], after["wall_seconds"])
+                )
+            if after["api_calls"] > before["api_calls"]:
+                regressions.append(
+                    "%s %s: %d -> %d API calls"
+                    % (label, phase, before["api_calls"], after["api_calls"])
+                )
+    return regressions
+
+
+def print_bench(baseline):
+    print(
+        "%-16s %-15s %8s %8s %8s %6s %8s"
+        % ("policy", "phase", "wall", "delay", "sleep", "calls", "bytes")
+    )
+    for label, result in sorted(baseline["policies"].items()):
+        for phase in PHASES:
+            metrics = result["phases"].get(phase)
+            if metrics is None:
+                continue
+            print(
+                "%-16s %-15s %7.1fs %7.1fs %7.1fs %6d %8d"
+                % (
+                    label,
+                    phase,
+                    metrics["wall_seconds"],
+                    metrics["delay_seconds"],
+                    metrics["sleep_seconds"],
+                    metrics["api_calls"],
+                    metrics["bytes_printed"],
+                )
+            )
+        if not result["ok"]:
+            print("%-16s FAILED: %s" % (label, result["error"]))
@@ -0,0 +1,255 @@
+"""
+Instrumentation of every AWS API call the policies make
+
+CallRecorder registers botocore before-call / after-call handlers on every
+session in a SessionCache, and so on every client the policies create. Each
+call is appended to a fixed-size ring buffer as an ApiCall: service,
+operation, region, latency, retries, HTTP status, error code, request ID,
+server date and the resource IDs in the request and response, tagged with
+the policy and phase that made it. PhaseRun flushes the buffer at the end of
+every phase, folding the calls into per-API latency histograms and per-phase
+totals and handing them to a Timeline, if there is one. A buffer that fills
+up before then is flushed early, so no call goes unrecorded.
+"""
+
+import collections
+import contextvars
+import threading
+import time
+
+# Calls held between flushes; a full buffer is flushed early
+DEFAULT_CAPACITY = 4096
+
+# Keys whose values identify a resource, and how many IDs to keep per call
+ID_SUFFIXES = ("Id", "Arn", "Name")
+ID_LIST_SUFFIXES = ("Ids", "Arns", "Names")
+MAX_RESOURCE_IDS = 20
+# Lists of resources longer than this (e.g. ListUsers) are not searched
+MAX_NESTED_LIST = 3
+
+THROTTLING_ERRORS = frozenset(
+    (
+        "Throttling",
+        "ThrottlingException",
+        "ThrottledException",
+        "RequestThrottled",
+        "RequestThrottledException",
+        "RequestLimitExceeded",
+        "TooManyRequestsException",
+        "ProvisionedThroughputExceededException",
+        "SlowDown",
+    )
+)
+
+ApiCall = collections.namedtuple(
+    "ApiCall",
+    (
+        "policy",
+        "phase",
+        "service",
+        "operation",
+        "region",
+        "started",
+        "monotonic",
+        "latency",
+        "retries",
+        "status",
+        "error",
+        "request_id",
+        "server_date",
+        "resources",
+        "response",
+    ),
+)
+
+
+def _collect_ids(document, found, depth):
+    for key, value in document.items():
+        if key == "ResponseMetadata":
+            continue
+        if isinstance(value, str):
+            if key.endswith(ID_SUFFIXES):
+                found.append(value)
+        elif isinstance(value, list):
+            if key.endswith(ID_LIST_SUFFIXES):
+                found.extend(v for v in value if isinstance(v, str))
+            elif depth > 1 and len(value) <= MAX_NESTED_LIST:
+                for item in value:
+                    if isinstance(item, dict):
+                        _collect_ids(item, found, depth - 1)
+        elif isinstance(value, dict) and depth > 1:
+            _collect_ids(value, found, depth - 1)
+
+
+def resource_ids(document, known=()):
+    """
+    known plus the IDs, ARNs and names in API parameters or a response,
+    without walking big lists
+    """
+    found = list(known)
+    if document:
+        _collect_ids(document, found, depth=3)
+    unique = []
+    for value in found:
+        if value not in unique:
+            unique.append(value)
+    return unique[:MAX_RESOURCE_IDS]
+
+
+class LatencyHistogram(object):
+    """Call latencies in power-of-two millisecond buckets"""
+
+    def __init__(self):
+        self.buckets = collections.Counter()
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+
+    def add(self, call):
+        self.buckets[int(call.latency * 1000).bit_length()] += 1
+        self.count += 1
+        self.total += call.latency
+        self.maximum = max(self.maximum, call.latency)
+        self.retries += call.retries
+        if call.error:
+            self.errors += 1
+            if call.error in THROTTLING_ERRORS:
+                self.throttled += 1
+
+    def percentile(self, fraction):
+        """Upper bound in seconds of the bucket holding the given fraction of calls"""
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= fraction * self.count:
+                return min(self.maximum, (1 << bucket) / 1000.0)
+        return self.maximum
+
+
+class CallRecorder(object):
+    """
+    keep_responses stores each full response body on its ApiCall, which is
+    only meant for debugging: a single ListUsers can run to megabytes.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, timeline=None, keep_responses=False):
+        self.timeline = timeline
+        self.keep_responses = keep_responses
+        self.buffer = collections.deque(maxlen=capacity)
+        self.histograms = collections.defaultdict(LatencyHistogram)
+        self.phases = collections.defaultdict(LatencyHistogram)
+        # Copied into the threads a Teardown deletes on, unlike a thread local
+        self._tag = contextvars.ContextVar("ioa_call_tag", default=(None, None))
+        self._lock = threading.Lock()
+
+    def install(self, sessions):
+        """Instrument every session sessions hands out, before clients exist"""
+        sessions.register("before-parameter-build", self._before_parameter_build)
+        sessions.register("before-call", self._before_call)
+        sessions.register("after-call", self._after_call)
+        sessions.register("after-call-error", self._after_call_error)
+
+    def begin(self, policy, phase):
+        """Tag calls made on this thread from now on with policy and phase"""
+        self._tag.set((policy, phase))
+
+    def _before_parameter_build(self, params, context, **kwargs):
+        context["ioa_params"] = resource_ids(params)
+
+    def _before_call(self, model, context, **kwargs):
+        context["ioa_call"] = (
+            model.service_model.service_name,
+            model.name,
+            time.time(),
+            time.monotonic(),
+        )
+
+    def _record(self, context, status, error, metadata, parsed=None):
+        if "ioa_call" not in context:
+            return
+        service, operation, started, start = context["ioa_call"]
+        resources = context.get("ioa_params", [])
+        if parsed:
+            resources = resource_ids(parsed, resources)
+        policy, phase = self._tag.get()
+        call = ApiCall(
+            policy,
+            phase,
+            service,
+            operation,
+            context.get("client_region"),
+            started,
+            start,
+            time.monotonic() - start,
+            metadata.get("RetryAttempts", 0),
+            status,
+            error,
+            metadata.get("RequestId"),
+            metadata.get("HTTPHeaders", {}).get("date"),
+            resources,
+            parsed if self.keep_responses else None,
+        )
+        with self._lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                self._flush()
+            self.buffer.append(call)
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        metadata = parsed.get("ResponseMetadata", {})
+        error = parsed.get("Error", {}).get("Code")
+        self._record(context, http_response.status_code, error, metadata, parsed)
+
+    def _after_call_error(self, exception, context, **kwargs):
+        # The request never got a response, e.g. a connection error
+        self._record(context, None, type(exception).__name__, {})
+
+    def flush(self):
+        """Fold the buffered calls into the histograms and return them"""
+        with self._lock:
+            return self._flush()
+
+    def _flush(self):
+        calls = []
+        while self.buffer:
+            call = self.buffer.popleft()
+            self.histograms[(call.service, call.operation)].add(call)
+            self.phases[(call.policy, call.phase)].add(call)
+            calls.append(call)
+        if self.timeline is not None and calls:
+            self.timeline.write(calls)
+        return calls
+
+    def totals(self):
+        total = LatencyHistogram()
+        for histogram in self.histograms.values():
+            total.count += histogram.count
+            total.total += histogram.total
+            total.retries += histogram.retries
+            total.throttled += histogram.throttled
+            total.errors += histogram.errors
+        return total
+
+
+def print_api_stats(recorder):
+    recorder.flush()
+    print(
+        "%-44s %6s %8s %8s %8s %8s %5s %5s"
+        % ("api", "calls", "p50", "p90", "p99", "max", "retry", "thrtl")
+    )
+    for (service, operation), histogram in sorted(recorder.histograms.items()):
+        print(
+            "%-44s %6d %7.0fms %7.0fms %7.0fms %7.0fms %5d %5d"
+            % (
+                "%s:%s" % (service, operation),
+                histogram.count,
+                histogram.percentile(0.5) * 1000,
+                histogram.percentile(0.9) * 1000,
+                histogram.percentile(0.99) * 1000,
+                histogram.maximum * 1000,
+                histogram.retries,
+                histogram.throttled,
+            )
+        )
@@ -0,0 +1,102 @@
+"""
+The one clock every policy and scheduler waits on
+
+Policies call engine.clock.sleep() (or yield seconds from a phase, see
+engine.lifecycle) rather than time.sleep, and the engine reads the time from
+the same clock. Clock is real time and totals how long was spent idle;
+ScaledClock runs time faster by a factor, for runs against a local emulator
+where nothing actually needs time to propagate. Coroutines, see engine.aio,
+await sleep_async() instead, which holds no thread while it waits.
+"""
+
+import asyncio
+import contextlib
+import threading
+import time
+
+
+class Clock(object):
+    """Real time. Sleeps block the calling thread and are added to idle."""
+
+    def __init__(self):
+        self.idle = 0.0
+        self._lock = threading.Lock()
+
+    def now(self):
+        """Monotonic seconds; only differences between readings mean anything"""
+        return time.monotonic()
+
+    def real_seconds(self, seconds):
+        """How long a wait of seconds on this clock takes in real time"""
+        return seconds
+
+    def add_idle(self, seconds):
+        with self._lock:
+            self.idle += seconds
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        self.add_idle(seconds)
+        # Looked up at call time so a patched time.sleep (see engine.bench) applies
+        time.sleep(self.real_seconds(seconds))
+
+    async def sleep_async(self, seconds):
+        """sleep() for a coroutine: the event loop runs other work meanwhile"""
+        if seconds <= 0:
+            return
+        self.add_idle(seconds)
+        await asyncio.sleep(self.real_seconds(seconds))
+
+
+class ScaledClock(Clock):
+    """
+    Time runs factor times faster: sleep(10) returns after 10 / factor real
+    seconds and now() advances by 10. Only meant for emulators, real AWS
+    still takes as long as it takes.
+    """
+
+    def __init__(self, factor):
+        if factor <= 0:
+            raise ValueError("Time scale must be positive, not %r" % factor)
+        super(ScaledClock, self).__init__()
+        self.factor = factor
+        self._start = time.monotonic()
+
+    def now(self):
+        return self._start + (time.monotonic() - self._start) * self.factor
+
+    def real_seconds(self, seconds):
+        return seconds / float(self.factor)
+
+
+_clock = Clock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    """Make clock the process-wide clock and return the one it replaces"""
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+
+@contextlib.contextmanager
+def use_clock(clock):
+    previous = set_clock(clock)
+    try:
+        yield clock
+    finally:
+        set_clock(previous)
+
+
+def now():
+    return _clock.now()
+
+
+def sleep(seconds):
+    """Wait on the process-wide clock; what policies call instead of time.sleep"""
+    _clock.sleep(seconds)
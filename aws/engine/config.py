@@ -0,0 +1,82 @@
+"""
+How a batch of policies runs, from the [defaults] section of config.ini
+
+    [defaults]
+    interval = sequential   sequential, pipeline, parallel or async
+    concurrency = 4         policies at once when interval is parallel
+    profile = default       AWS CLI profile used when none is given
+    region =                region for every client; blank keeps each policy's
+    random = False          run policies in random order
+    seed =                  seed for the random order; blank picks a new one
+
+Command line options take precedence over every setting.
+"""
+
+import random
+
+from utils import get_config_options
+
+DEFAULTS_SECTION = "defaults"
+INTERVALS = ("sequential", "pipeline", "parallel", "async")
+DEFAULT_CONCURRENCY = 4
+
+
+class RunDefaults(object):
+    def __init__(
+        self,
+        interval="sequential",
+        concurrency=DEFAULT_CONCURRENCY,
+        profile=None,
+        region=None,
+        shuffle=False,
+        seed=None,
+    ):
+        if interval not in INTERVALS:
+            raise ValueError(
+                "interval must be one of %s, not %r" % (", ".join(INTERVALS), interval)
+            )
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1, not %r" % concurrency)
+        self.interval = interval
+        self.concurrency = concurrency
+        self.profile = profile
+        self.region = region
+        self.shuffle = shuffle
+        self.seed = seed
+
+    @classmethod
+    def from_section(cls, section):
+        """RunDefaults from a configparser section; blank values mean unset"""
+        try:
+            seed = section.get("seed", "").strip()
+            return cls(
+                interval=section.get("interval", "sequential").strip().lower(),
+                concurrency=section.getint("concurrency", DEFAULT_CONCURRENCY),
+                profile=section.get("profile", "").strip() or None,
+                region=section.get("region", "").strip() or None,
+                shuffle=section.getboolean("random", False),
+                seed=int(seed) if seed else None,
+            )
+        except ValueError as e:
+            raise ValueError("Invalid [%s] in config.ini: %s" % (section.name, e))
+
+    def order(self, policy_modules):
+        """
+        policy_modules in the order to run them: as given, or shuffled by seed.
+        A seed is picked, and kept in self.seed, if there isn't one yet.
+        """
+        ordered = list(policy_modules)
+        if self.shuffle:
+            if self.seed is None:
+                self.seed = random.SystemRandom().randrange(1 << 32)
+            random.Random(self.seed).shuffle(ordered)
+        return ordered
+
+
+def load_defaults(config=None):
+    """RunDefaults from config, a ConfigParser, or from config.ini"""
+    if config is None:
+        config = get_config_options()
+    if not config.has_section(DEFAULTS_SECTION):
+        return RunDefaults()
+    return RunDefaults.from_section(config[DEFAULTS_SECTION])
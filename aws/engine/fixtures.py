@@ -0,0 +1,375 @@
+"""
+Warm fixtures: expensive prerequisites kept alive between runs
+
+Some policies spend minutes building what their pattern acts on, an RDS
+snapshot or a copied AMI, before the calls the detection cares about. Such a
+prerequisite is a Fixture subclass, and the policy leases one instead of
+building it:
+
+    class SnapshotFixture(Fixture):
+        name = "rds-225-251"
+
+        def plan(self, generation): ...
+        def ensure(self, test, resources): ...
+        def destroy(self, test, resources): ...
+
+    def setup(self):
+        self.lease = lease_fixture(SnapshotFixture(), self)
+
+    def cleanup(self):
+        self.lease.release()
+
+By default the pool is ephemeral: every lease builds a fresh fixture and
+release destroys it, as the scripts always did. A persistent pool (engine run
+--keep-fixtures, or $IOA_FIXTURES for a single script) records fixtures in a
+JSON file and hands them to later runs until they pass their ttl or
+max_uses, or a lease reports them used up. A background refresher then
+destroys the old fixture and builds its replacement. A process that exits
+mid-build leaves the fixture "warming", and the next lease finishes it;
+ensure() has to cope with any part of the fixture already existing.
+"""
+
+import json
+import os
+import threading
+import time
+import traceback
+
+from engine.registry import POLICY_DIR, script_of
+from engine.state import attribute_calls, pid_alive
+
+# Set to a path to keep a single script's fixtures between runs; also where
+# engine run --keep-fixtures keeps them, instead of DEFAULT_FIXTURES
+FIXTURES_ENV = "IOA_FIXTURES"
+DEFAULT_FIXTURES = os.path.join(POLICY_DIR, "ioa_fixtures.json")
+
+DEFAULT_TTL = 12 * 3600
+
+WARMING = "warming"
+READY = "ready"
+LEASED = "leased"
+
+
+def _write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class Fixture(object):
+    """
+    A prerequisite a policy leases. resources is a JSON-serializable dict of
+    the names and IDs that make up one fixture; every method gets the
+    PolicyTest using it, for its clients and helpers.
+    """
+
+    # Key of the fixture in the pool, unique across every policy script; the
+    # pool appends the region when clients are sent to one, see fixture_key()
+    name = None
+    # Seconds a fixture may be handed out for after it was built
+    ttl = DEFAULT_TTL
+    # Leases a fixture may serve before it is replaced, None for any number
+    max_uses = None
+
+    def plan(self, generation):
+        """
+        resources for a new fixture, before anything is built. generation is
+        None in an ephemeral pool, otherwise a short string to make names
+        unique, since a replacement is built while the old fixture is deleted.
+        """
+        return {}
+
+    def ensure(self, test, resources):
+        """Build whatever part of the fixture is missing and wait until it's usable"""
+        raise NotImplementedError
+
+    def alive(self, test, resources):
+        """Whether a fixture from an earlier run is still there and usable"""
+        return True
+
+    def reset(self, test, resources):
+        """Undo what a policy changed, before the fixture is leased again"""
+        pass
+
+    def destroy(self, test, resources):
+        raise NotImplementedError
+
+
+def fixture_name(base, generation):
+    """base, made unique by generation when there is one"""
+    return base if generation is None else "%s-%s" % (base, generation)
+
+
+def fixture_key(fixture, test):
+    """
+    Key of fixture in the pool: its name, with the region when test's session
+    sends every client to one (see engine.sessions), as fixtures are regional
+    """
+    region = getattr(test.session, "region_override", None)
+    return fixture.name if not region else "%s@%s" % (fixture.name, region)
+
+
+def fixture_policy(name):
+    """What the state store attributes the resources of fixture name to"""
+    return "fixture:" + name
+
+
+class Lease(object):
+    def __init__(self, pool, fixture, test, record):
+        self.pool = pool
+        self.fixture = fixture
+        self.test = test
+        self.record = record
+        self.released = False
+
+    @property
+    def resources(self):
+        return self.record["resources"]
+
+    def release(self, used_up=False):
+        """
+        Hand the fixture back. used_up means the policy deleted or broke part
+        of it, so it is destroyed rather than kept.
+        """
+        if not self.released:
+            self.released = True
+            self.pool.release(self, used_up)
+
+
+class FixturePool(object):
+    """
+    Hands out Fixtures. With a path, fixtures outlive the run and are recorded
+    there; without one, release destroys them.
+    """
+
+    def __init__(self, path=None, refill=True):
+        self.path = path
+        self.refill = refill and path is not None
+        self.reused = 0
+        self.built = 0
+        self._lock = threading.RLock()
+        self._name_locks = {}
+        self._refreshes = []
+
+    @property
+    def persistent(self):
+        return self.path is not None
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def _save(self, records):
+        _write_atomic(self.path, json.dumps(records, indent=2, sort_keys=True) + "\n")
+
+    def _update(self, name, record):
+        """Store record under name, or remove name when record is None"""
+        if self.path is None:
+            return
+        with self._lock:
+            records = self._load()
+            if record is None:
+                records.pop(name, None)
+            else:
+                records[name] = record
+            self._save(records)
+
+    def records(self):
+        with self._lock:
+            return self._load()
+
+    def forget(self, name):
+        """Stop tracking the fixture called name, without destroying it"""
+        self._update(name, None)
+
+    def _new_record(self, fixture, test):
+        generation = "%x" % int(time.time()) if self.persistent else None
+        return {
+            "region": getattr(test.session, "region_override", None),
+            "script": script_of(fixture),
+            "class": type(fixture).__name__,
+            "created": time.time(),
+            "uses": 0,
+            "state": WARMING,
+            "pid": os.getpid(),
+            "resources": fixture.plan(generation),
+        }
+
+    def _worn_out(self, fixture, record):
+        if time.time() - record["created"] > fixture.ttl:
+            return True
+        return fixture.max_uses is not None and record["uses"] >= fixture.max_uses
+
+    def _build(self, fixture, test, record):
+        key = fixture_key(fixture, test)
+        self._update(key, record)
+        # Kept in the state store under the fixture, which outlives the run
+        previous = attribute_calls(fixture_policy(key))
+        try:
+            record["resources"] = fixture.ensure(test, record["resources"]) or (
+                record["resources"]
+            )
+        finally:
+            attribute_calls(previous)
+        record["state"] = READY
+        record["pid"] = None
+        self._update(key, record)
+        self.built += 1
+        return record
+
+    def _reuse(self, fixture, test, record):
+        """record, finished and reset if need be, or None if it can't be used"""
+        key = fixture_key(fixture, test)
+        if self._worn_out(fixture, record):
+            print("Fixture %s has expired, replacing it" % key)
+            return None
+        if record["state"] == LEASED:
+            # A crashed run never got to reset what its policy changed
+            fixture.reset(test, record["resources"])
+            record["state"] = READY
+        if record["state"] == WARMING:
+            print("Finishing fixture %s left warming by an earlier run" % key)
+            record["pid"] = os.getpid()
+            return self._build(fixture, test, record)
+        if not fixture.alive(test, record["resources"]):
+            print("Fixture %s is gone, replacing it" % key)
+            return None
+        self.reused += 1
+        print("Reusing fixture %s" % key)
+        return record
+
+    def _name_lock(self, name):
+        with self._lock:
+            return self._name_locks.setdefault(name, threading.Lock())
+
+    def lease(self, fixture, test):
+        """Lease fixture for test, building it if there isn't a usable one"""
+        key = fixture_key(fixture, test)
+        with self._name_lock(key):
+            self._wait_for(key)
+            record = self.records().get(key)
+            if record is not None:
+                pid = record.get("pid")
+                if record["state"] == LEASED and pid == os.getpid():
+                    raise RuntimeError("Fixture %s is already leased" % key)
+                if record["state"] != READY and pid != os.getpid() and pid_alive(pid):
+                    raise RuntimeError(
+                        "Fixture %s is in use by process %d" % (key, pid)
+                    )
+                try:
+                    reused = self._reuse(fixture, test, record)
+                except Exception:
+                    traceback.print_exc()
+                    reused = None
+                if reused is None:
+                    self._retire(fixture, test, record)
+                record = reused
+            if record is None:
+                print("Building fixture %s" % key)
+                record = self._build(fixture, test, self._new_record(fixture, test))
+            record["state"] = LEASED
+            record["pid"] = os.getpid()
+            record["uses"] += 1
+            self._update(key, record)
+        return Lease(self, fixture, test, record)
+
+    def release(self, lease, used_up=False):
+        fixture, test, record = lease.fixture, lease.test, lease.record
+        key = fixture_key(fixture, test)
+        if not self.persistent:
+            fixture.destroy(test, record["resources"])
+            return
+        if not used_up:
+            try:
+                fixture.reset(test, record["resources"])
+            except Exception:
+                traceback.print_exc()
+                used_up = True
+        if used_up or self._worn_out(fixture, record):
+            self._update(key, None)
+            self._submit(key, self._replace, fixture, test, record)
+            return
+        record["state"] = READY
+        record["pid"] = None
+        self._update(key, record)
+
+    def _retire(self, fixture, test, record):
+        """Forget record and destroy what's left of it in the background"""
+        key = fixture_key(fixture, test)
+        self._update(key, None)
+        self._submit(None, self._destroy, fixture, test, record)
+
+    def _destroy(self, fixture, test, record):
+        try:
+            fixture.destroy(test, record["resources"])
+        except Exception:
+            traceback.print_exc()
+
+    def _replace(self, fixture, test, record):
+        key = fixture_key(fixture, test)
+        self._destroy(fixture, test, record)
+        if self.refill:
+            print("Refreshing fixture %s" % key)
+            self._build(fixture, test, self._new_record(fixture, test))
+
+    def _submit(self, name, function, *args):
+        """
+        Run function(*args) on a daemon thread, so a process exiting without
+        waiting leaves the fixture warming instead of blocking
+        """
+        thread = threading.Thread(target=function, args=args, name="fixture-refresh")
+        thread.daemon = True
+        with self._lock:
+            self._refreshes.append((name, thread))
+        thread.start()
+
+    def _wait_for(self, name):
+        """Let a refresh of the fixture called name finish before leasing it"""
+        with self._lock:
+            threads = [t for n, t in self._refreshes if n == name]
+        for thread in threads:
+            thread.join()
+
+    def close(self, wait=True):
+        """
+        Wait for background refreshes and return how many were running.
+        Without wait, unfinished ones stay warming for the next run.
+        """
+        with self._lock:
+            running = [t for n, t in self._refreshes if t.is_alive()]
+        if running and wait:
+            print("Waiting for %d fixture refresh(es)" % len(running))
+            for thread in running:
+                thread.join()
+        return len(running)
+
+
+def fixtures_path():
+    """Where kept fixtures are recorded"""
+    return os.environ.get(FIXTURES_ENV) or DEFAULT_FIXTURES
+
+
+_pool = None
+
+
+def get_fixture_pool():
+    """The process-wide pool, persistent if $IOA_FIXTURES names a file"""
+    global _pool
+    if _pool is None:
+        _pool = FixturePool(os.environ.get(FIXTURES_ENV) or None)
+    return _pool
+
+
+def set_fixture_pool(pool):
+    """Make pool the process-wide pool and return the one it replaces"""
+    global _pool
+    previous, _pool = _pool, pool
+    return previous
+
+
+def lease_fixture(fixture, test):
+    """Lease fixture for test from the process-wide pool"""
+    return get_fixture_pool().lease(fixture, test)
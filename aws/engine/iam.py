@@ -0,0 +1,59 @@
+"""
+Readiness probes for IAM's eventual consistency
+
+New access keys and roles take a few seconds to propagate. Rather than
+sleeping a fixed 10-20s, these retry a cheap call with the new credentials
+or role until it succeeds, bounded by a deadline.
+"""
+
+from engine.waiters import Backoff, wait_until
+
+# Seconds to wait for IAM changes to propagate before giving up
+IAM_DEADLINE = 60
+
+# Errors AWS returns while a new access key is not yet known everywhere
+CREDENTIAL_ERRORS = (
+    "InvalidClientTokenId",
+    "InvalidAccessKeyId",
+    "UnrecognizedClientException",
+    "AuthFailure",
+    "SignatureDoesNotMatch",
+)
+
+# A new role's trust policy has not propagated yet
+ASSUME_ROLE_ERRORS = ("AccessDenied",)
+
+# Lambda rejects a role it can't assume yet with a validation error
+LAMBDA_ROLE_ERRORS = ("InvalidParameterValueException",)
+
+
+def iam_backoff():
+    # Keys usually propagate in 2-4s, so start polling early and stay tight
+    return Backoff(initial=0.5, maximum=4.0)
+
+
+def wait_for_access_key(session, description="new access key", deadline=IAM_DEADLINE):
+    """Retry sts:GetCallerIdentity with session's credentials until they work"""
+    sts = session.client("sts")
+    return wait_until(
+        sts.get_caller_identity,
+        description,
+        deadline=deadline,
+        retry_errors=CREDENTIAL_ERRORS,
+        backoff=iam_backoff(),
+    )
+
+
+def wait_for_role(call, description, retry_errors, deadline=IAM_DEADLINE):
+    """
+    Retry call, which depends on a newly created role, until IAM has
+    propagated the role. The call itself is the probe, so no extra API
+    calls are made once the role is ready.
+    """
+    return wait_until(
+        call,
+        description,
+        deadline=deadline,
+        retry_errors=retry_errors,
+        backoff=iam_backoff(),
+    )
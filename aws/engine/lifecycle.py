@@ -0,0 +1,235 @@
+"""
+Phase protocol shared by every AWS IOA policy script
+
+A policy is a PolicyTest subclass whose phases run in this order:
+
+    setup           create the resources the pattern needs
+    trigger_before  API calls the detection correlates before the pattern
+    trigger_ioa     the pattern itself
+    trigger_after   API calls the detection correlates after the pattern
+    cleanup         delete everything setup created
+
+Waits between phases are declared in phase_delays instead of slept inside
+the phases, so a scheduler can run another policy's work in the meantime.
+A wait in the middle of a phase can be handed to the scheduler the same way
+by making the phase a generator that yields the seconds to wait:
+
+    def trigger_before(self):
+        self.list_users()
+        yield 5
+        self.get_password_policy()
+"""
+
+import inspect
+import os
+import sys
+import time
+import traceback
+
+from engine.calls import CallRecorder
+from engine.clock import get_clock
+from engine.config import load_defaults
+from engine.fixtures import get_fixture_pool
+from engine.registry import script_of
+from engine.sessions import session_cache, shared_sessions
+from engine.state import attribute_calls
+
+# Set to a path to write a JSONL timeline of a standalone script's API calls
+TIMELINE_ENV = "IOA_TIMELINE"
+
+PHASES = ("setup", "trigger_before", "trigger_ioa", "trigger_after", "cleanup")
+
+
+class LazyClient(object):
+    """
+    Class attribute that creates a boto3 client from the test's session on
+    first use, so building a PolicyTest makes no AWS calls:
+
+        class MyTest(PolicyTest):
+            iam = LazyClient("iam")
+    """
+
+    def __init__(self, service_name, **kwargs):
+        self.service_name = service_name
+        self.kwargs = kwargs
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, test, owner=None):
+        if test is None:
+            return self
+        client = test.session.client(self.service_name, **self.kwargs)
+        test.__dict__[self.name] = client
+        return client
+
+
+class PolicyTest(object):
+    """Base class for a policy script. Override the phases the policy needs."""
+
+    # Seconds to wait before a phase starts, keyed by phase name
+    phase_delays = {}
+
+    def __init__(self, session):
+        self.session = session
+
+    def setup(self):
+        pass
+
+    def trigger_before(self):
+        pass
+
+    def trigger_ioa(self):
+        raise NotImplementedError
+
+    def trigger_after(self):
+        pass
+
+    def cleanup(self):
+        pass
+
+    def reset_ioa(self):
+        """
+        Undo what trigger_ioa changed so it can run again on the same
+        resources; engine.soak calls it between rounds. Policies whose pattern
+        can simply be repeated don't need it.
+        """
+        pass
+
+
+class PhaseRun(object):
+    """
+    Steps one PolicyTest through its phases. If a phase fails, the remaining
+    trigger phases are skipped but cleanup still runs once setup has started.
+    A phase that yields takes one step per yield. Given a CallRecorder as
+    calls, API calls are tagged with label and the phase, and the recorder is
+    flushed after every step. Resources the test creates are attributed to
+    its script in the state store.
+    """
+
+    def __init__(self, test, calls=None, label=None):
+        self.test = test
+        self.calls = calls
+        self.label = label or type(test).__name__
+        self.script = script_of(test)
+        self.durations = {}
+        self.error = None
+        self._index = 0
+        self._paused = None
+        self._wait = 0
+
+    @property
+    def done(self):
+        return self._index >= len(PHASES)
+
+    @property
+    def next_phase(self):
+        return None if self.done else PHASES[self._index]
+
+    def skip_to(self, phase):
+        """Skip the phases before phase, which runs next"""
+        self._paused = None
+        self._index = PHASES.index(phase)
+
+    def delay(self):
+        """Seconds to wait before the next step may start"""
+        if self._paused is not None:
+            return self._wait
+        if self.done or self._index == 0:
+            return 0
+        return self.test.phase_delays.get(self.next_phase, 0)
+
+    def _run(self, phase):
+        """Run phase up to its next yield; True once the phase has finished"""
+        if self._paused is None:
+            result = getattr(self.test, phase)()
+            if not inspect.isgenerator(result):
+                return True
+            self._paused = result
+        try:
+            self._wait = next(self._paused) or 0
+        except StopIteration:
+            self._paused = None
+            return True
+        return False
+
+    def step(self):
+        phase = self.next_phase
+        start = time.monotonic()
+        finished = True
+        attribute_calls(self.script)
+        if self.calls is not None:
+            self.calls.begin(self.label, phase)
+        try:
+            finished = self._run(phase)
+        except Exception as e:
+            self._paused = None
+            traceback.print_exc()
+            if self.error is None:
+                self.error = "%s: %r" % (phase, e)
+            if phase != "cleanup":
+                self._index = PHASES.index("cleanup") - 1
+        finally:
+            elapsed = time.monotonic() - start
+            self.durations[phase] = self.durations.get(phase, 0) + elapsed
+            if self.calls is not None:
+                self.calls.flush()
+        if finished:
+            self._index += 1
+        return phase
+
+
+def run_phases(test, clock=None, calls=None, label=None):
+    """Run every phase of test in order, waiting out phase_delays in between"""
+    clock = clock or get_clock()
+    phase_run = PhaseRun(test, calls, label)
+    while not phase_run.done:
+        clock.sleep(phase_run.delay())
+        phase_run.step()
+    return phase_run
+
+
+def run_standalone(test_class, **kwargs):
+    """
+    Entry point for running a policy script directly: script.py <aws_cli_profile>.
+    The profile and region default to those in config.ini. With
+    $IOA_ENDPOINT_URL set the profile is optional and every client is sent to
+    that emulator instead. With $IOA_TIMELINE set, every API call is written
+    to that JSONL file, and with $IOA_FIXTURES set, fixtures are kept in that
+    file for later runs (see engine.fixtures). kwargs go to test_class.
+    """
+    run_with_profile(test_class, sys.argv[1] if len(sys.argv) > 1 else None, **kwargs)
+
+
+def run_with_profile(test_class, aws_profile=None, **kwargs):
+    """
+    run_standalone() for scripts that parse their own arguments: aws_profile
+    is the profile they were given, if any
+    """
+    try:
+        defaults = load_defaults()
+    except ValueError as e:
+        sys.exit(str(e))
+    sessions = session_cache(region_override=defaults.region)
+    aws_profile = aws_profile or defaults.profile
+    if sessions.endpoint_url:
+        print("Using offline endpoint", sessions.endpoint_url)
+    elif aws_profile is None:
+        sys.exit("Usage: %s <aws_cli_profile>" % sys.argv[0])
+    else:
+        print("Using AWS profile", aws_profile)
+    calls = None
+    if os.environ.get(TIMELINE_ENV):
+        from engine.timeline import Timeline
+
+        calls = CallRecorder(timeline=Timeline(os.environ[TIMELINE_ENV]))
+        calls.install(sessions)
+    with shared_sessions(sessions):
+        session = sessions.get(profile_name=aws_profile)
+        phase_run = run_phases(test_class(session, **kwargs), calls=calls)
+        get_fixture_pool().close()
+    if calls is not None:
+        calls.timeline.close()
+    if phase_run.error:
+        sys.exit(1)
@@ -0,0 +1,65 @@
+"""
+Existence checks that let AWS do the filtering
+
+Listing every security group or repository in an account and scanning for
+a name is slow in large accounts, and wrong once the listing spans more than
+one page. These lookups ask for the resource by name or tag instead, and
+follow every page when a listing is unavoidable, so a check costs the same
+number of calls however big the account is.
+"""
+
+from botocore.exceptions import ClientError
+
+from engine.waiters import error_code
+
+
+def paginate(client, operation, result_key, **kwargs):
+    """Yield every item under result_key across all pages of operation"""
+    if not client.can_paginate(operation):
+        for item in getattr(client, operation)(**kwargs).get(result_key, []):
+            yield item
+        return
+    for page in client.get_paginator(operation).paginate(**kwargs):
+        for item in page.get(result_key, []):
+            yield item
+
+
+def tag_filters(tags):
+    """EC2 Filters matching resources that carry every tag in tags, a dict"""
+    return [
+        {"Name": "tag:%s" % key, "Values": [value]}
+        for key, value in sorted(tags.items())
+    ]
+
+
+def find_security_groups(ec2, group_name=None, vpc_id=None, tags=None):
+    """Security groups with this name, in this VPC, carrying these tags"""
+    filters = tag_filters(tags or {})
+    if group_name is not None:
+        filters.append({"Name": "group-name", "Values": [group_name]})
+    if vpc_id is not None:
+        filters.append({"Name": "vpc-id", "Values": [vpc_id]})
+    return list(
+        paginate(ec2, "describe_security_groups", "SecurityGroups", Filters=filters)
+    )
+
+
+def find_repository(ecr, repository_name):
+    """The ECR repository called repository_name, or None"""
+    try:
+        result = ecr.describe_repositories(repositoryNames=[repository_name])
+    except ClientError as e:
+        if error_code(e) == "RepositoryNotFoundException":
+            return None
+        raise
+    repositories = result.get("repositories", [])
+    return repositories[0] if repositories else None
+
+
+def find_layer_versions(lambda_client, layer_name):
+    """Every version of a Lambda layer, however many pages they span"""
+    return list(
+        paginate(
+            lambda_client, "list_layer_versions", "LayerVersions", LayerName=layer_name
+        )
+    )
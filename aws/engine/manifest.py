@@ -0,0 +1,310 @@
+"""
+Prebuilt index of the AWS policy scripts
+
+The manifest is built by reading the script sources with ast (nothing is
+imported) and records, per script: policy IDs and titles, the docstring,
+AWS services and regions touched, resource types created and a rough
+duration estimate. It is cached in policy_manifest.json next to the
+scripts, along with a tab separated copy for ioa-runner.sh, and an entry is
+only rebuilt when its script's mtime or size changes.
+"""
+
+import ast
+import json
+import os
+import re
+
+from engine.registry import POLICY_DIR, PolicyModule
+
+MANIFEST_FILE = "policy_manifest.json"
+INDEX_FILE = "policy_manifest.tsv"
+MANIFEST_VERSION = 1
+
+SCRIPT_RE = re.compile(r"^aws_ioa_(\d+(?:_\d+)*)\.(py|sh)$")
+TITLE_RE = re.compile(r"^Policy (\d+) - (.+)$", re.M)
+CREATE_PREFIXES = ("create_", "run_", "copy_")
+
+# Rough seconds each botocore waiter takes against real AWS
+WAITER_ESTIMATES = {
+    "db_instance_available": 420,
+    "db_snapshot_available": 180,
+    "image_available": 300,
+    "instance_running": 30,
+    "stack_create_complete": 60,
+    "stack_delete_complete": 60,
+}
+
+
+def _literal(node, constants):
+    """Evaluate a number or string node, resolving module-level constants"""
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        return constants.get(node.id)
+    if isinstance(node, ast.BinOp):
+        left = _literal(node.left, constants)
+        right = _literal(node.right, constants)
+        if isinstance(left, (int, float)) and isinstance(right, (int, float)):
+            if isinstance(node.op, ast.Add):
+                return left + right
+            if isinstance(node.op, ast.Mult):
+                return left * right
+    return None
+
+
+def _module_constants(tree):
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target = node.targets[0]
+            if isinstance(target, ast.Name):
+                value = _literal(node.value, constants)
+                if isinstance(value, (int, float, str)):
+                    constants[target.id] = value
+    return constants
+
+
+def _docstring(tree):
+    """The first string literal at module level; the scripts put it after the imports"""
+    for node in tree.body:
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
+            if isinstance(node.value.value, str):
+                return node.value.value.strip()
+    return ""
+
+
+def _titles(text):
+    return dict(
+        (int(policy_id), title.strip()) for policy_id, title in TITLE_RE.findall(text)
+    )
+
+
+def _client_call(node):
+    """(service, keywords) for a LazyClient(), .client() or .resource() call"""
+    func = node.func
+    if isinstance(func, ast.Name) and func.id == "LazyClient":
+        pass
+    elif isinstance(func, ast.Attribute) and func.attr in ("client", "resource"):
+        pass
+    else:
+        return None
+    if not node.args or not isinstance(node.args[0], ast.Constant):
+        return None
+    return node.args[0].value, dict((k.arg, k.value) for k in node.keywords)
+
+
+def _python_entry(source):
+    tree = ast.parse(source)
+    constants = _module_constants(tree)
+    docstring = _docstring(tree)
+
+    services = set()
+    regions = set()
+    resources = set()
+    clients = {}
+    estimate = 0
+
+    # Which attribute or variable holds which service's client
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Call):
+            call = _client_call(node.value)
+            target = node.targets[0]
+            name = getattr(target, "id", None) or getattr(target, "attr", None)
+            if call and name:
+                clients[name] = call[0]
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef):
+            for item in node.body:
+                if (
+                    isinstance(item, ast.Assign)
+                    and getattr(item.targets[0], "id", None) == "phase_delays"
+                    and isinstance(item.value, ast.Dict)
+                ):
+                    for value in item.value.values:
+                        estimate += _literal(value, constants) or 0
+        if isinstance(node, ast.Yield) and node.value is not None:
+            # A phase handing a wait to the scheduler
+            estimate += _literal(node.value, constants) or 0
+            continue
+        if not isinstance(node, ast.Call):
+            continue
+        call = _client_call(node)
+        if call:
+            service, keywords = call
+            services.add(service)
+            if "region_name" in keywords:
+                region = _literal(keywords["region_name"], constants)
+                regions.add(region or "default")
+            else:
+                regions.add("default")
+            continue
+        func = node.func
+        if isinstance(func, ast.Attribute):
+            if func.attr == "sleep" and node.args:
+                estimate += _literal(node.args[0], constants) or 0
+            elif func.attr == "get_waiter" and node.args:
+                estimate += WAITER_ESTIMATES.get(_literal(node.args[0], constants), 0)
+            elif func.attr.startswith(CREATE_PREFIXES):
+                owner = func.value
+                owner_name = getattr(owner, "attr", None) or getattr(owner, "id", None)
+                service = clients.get(owner_name)
+                if service:
+                    resources.add("%s:%s" % (service, func.attr.split("_", 1)[1]))
+        elif isinstance(func, ast.Name) and func.id == "sleep" and node.args:
+            estimate += _literal(node.args[0], constants) or 0
+        elif isinstance(func, ast.Name) and func.id == "wait_for_waiter":
+            if len(node.args) > 1:
+                estimate += WAITER_ESTIMATES.get(_literal(node.args[1], constants), 0)
+
+    return {
+        "summary": docstring,
+        "services": sorted(services),
+        "regions": sorted(regions),
+        "resource_types": sorted(resources),
+        "estimated_seconds": int(estimate),
+    }
+
+
+def _shell_entry(source):
+    match = re.search(r"^: '\n(.*?)^'", source, re.M | re.S)
+    region = re.search(r"^REGION=(\S+)", source, re.M)
+    return {
+        "summary": match.group(1).strip() if match else "",
+        "services": sorted(set(re.findall(r"\baws (\w[\w-]*) ", source))),
+        "regions": [region.group(1)] if region else ["default"],
+        "resource_types": sorted(
+            set(
+                "%s:%s" % (service, resource.replace("-", "_"))
+                for service, resource in re.findall(
+                    r"\baws (\w[\w-]*) create-([\w-]+)", source
+                )
+            )
+        ),
+        "estimated_seconds": sum(int(s) for s in re.findall(r"\bsleep (\d+)", source)),
+    }
+
+
+def build_entry(path):
+    """Index one policy script"""
+    filename = os.path.basename(path)
+    match = SCRIPT_RE.match(filename)
+    if match is None:
+        raise ValueError("Not a policy script: %s" % filename)
+    stat = os.stat(path)
+    with open(path) as f:
+        source = f.read()
+    if match.group(2) == "py":
+        entry = _python_entry(source)
+    else:
+        entry = _shell_entry(source)
+    titles = _titles(entry["summary"])
+    entry.update(
+        {
+            "file": filename,
+            "kind": "python" if match.group(2) == "py" else "shell",
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "policy_ids": [int(p) for p in match.group(1).split("_")],
+            "titles": dict((str(k), v) for k, v in titles.items()),
+        }
+    )
+    return entry
+
+
+def menu_title(entry):
+    """Short label for a menu: the first policy's title, plus how many others"""
+    titles = [
+        entry["titles"][str(p)]
+        for p in entry["policy_ids"]
+        if str(p) in entry["titles"]
+    ]
+    if not titles:
+        return entry["file"]
+    if len(titles) == 1:
+        return titles[0]
+    return "%s (+%d more)" % (titles[0], len(titles) - 1)
+
+
+class Manifest(object):
+    """Cached policy index for a directory of scripts"""
+
+    def __init__(self, directory=POLICY_DIR):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.entries = {}
+        self.rebuilt = []
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return {}
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        return dict((entry["file"], entry) for entry in data.get("scripts", []))
+
+    def load(self):
+        """Load the cached manifest, rebuilding entries whose script changed"""
+        cached = self._read()
+        self.entries = {}
+        self.rebuilt = []
+        for filename in sorted(os.listdir(self.directory)):
+            if not SCRIPT_RE.match(filename):
+                continue
+            path = os.path.join(self.directory, filename)
+            stat = os.stat(path)
+            entry = cached.get(filename)
+            if (
+                entry is None
+                or entry["mtime"] != stat.st_mtime
+                or entry["size"] != stat.st_size
+            ):
+                entry = build_entry(path)
+                self.rebuilt.append(filename)
+            self.entries[filename] = entry
+        if (
+            self.rebuilt
+            or set(cached) != set(self.entries)
+            or not os.path.exists(self.index_path)
+        ):
+            self.save()
+        return self
+
+    def scripts(self):
+        return sorted(self.entries.values(), key=lambda e: e["policy_ids"])
+
+    def get(self, policy_module):
+        if isinstance(policy_module, PolicyModule):
+            policy_module = policy_module.filename
+        return self.entries[policy_module]
+
+    def save(self):
+        data = {"version": MANIFEST_VERSION, "scripts": self.scripts()}
+        _write_atomic(self.path, json.dumps(data, indent=2, sort_keys=True) + "\n")
+        lines = []
+        for entry in self.scripts():
+            fields = (
+                entry["file"],
+                "/".join(str(p) for p in entry["policy_ids"]),
+                menu_title(entry),
+                ",".join(entry["services"]),
+                ",".join(entry["regions"]),
+                str(entry["estimated_seconds"]),
+                entry["summary"].replace("\\", "\\\\").replace("\n", "\\n"),
+            )
+            lines.append("\t".join(f.replace("\t", " ") for f in fields))
+        _write_atomic(self.index_path, "\n".join(lines) + "\n")
+
+
+def _write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(directory=POLICY_DIR):
+    return Manifest(directory).load()
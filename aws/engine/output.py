@@ -0,0 +1,94 @@
+"""
+Console output: line-prefixed stdout so concurrent policies can share one
+terminal, and compact printing of API responses
+"""
+
+import contextvars
+import os
+import threading
+
+from engine.calls import resource_ids
+
+# Set to print whole API responses, as the scripts used to
+DEBUG_ENV = "IOA_DEBUG"
+
+_debug = bool(os.environ.get(DEBUG_ENV))
+
+
+def set_debug(enabled):
+    global _debug
+    _debug = enabled
+
+
+def debug_enabled():
+    return _debug
+
+
+def show_response(label, response):
+    """
+    Print one line about an API response: its status, request ID and the
+    resources in it. With debug output on, print the whole response instead.
+    """
+    if _debug:
+        print("%s:\n %s" % (label, response))
+        return
+    metadata = response.get("ResponseMetadata", {})
+    parts = ["HTTP %s" % metadata.get("HTTPStatusCode")]
+    if metadata.get("RequestId"):
+        parts.append("request %s" % metadata["RequestId"])
+    ids = resource_ids(response)
+    if ids:
+        parts.append(", ".join(ids))
+    print("%s: %s" % (label, "; ".join(parts)))
+
+
+class _Prefix(object):
+    """A prefix and each thread's unfinished line under it"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.pending = {}
+
+
+class PrefixedStream(object):
+    """
+    Wraps a stream and prefixes every complete line written in a context that
+    has called set_prefix(): a thread, an asyncio task, or the threads they
+    hand their context to. Lines from other contexts pass through untouched.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._prefix = contextvars.ContextVar("ioa_output_prefix", default=None)
+        self._lock = threading.Lock()
+
+    def set_prefix(self, prefix):
+        self._prefix.set(_Prefix(prefix))
+
+    def clear_prefix(self):
+        current = self._prefix.get()
+        if current is not None:
+            with self._lock:
+                self._write_lines(current, [p for p in current.pending.values() if p])
+        self._prefix.set(None)
+
+    def _write_lines(self, current, lines):
+        for line in lines:
+            self._stream.write("[%s] %s\n" % (current.prefix, line))
+
+    def write(self, data):
+        current = self._prefix.get()
+        with self._lock:
+            if current is None:
+                return self._stream.write(data)
+            thread = threading.get_ident()
+            lines = (current.pending.get(thread, "") + data).split("\n")
+            current.pending[thread] = lines.pop()
+            self._write_lines(current, lines)
+        return len(data)
+
+    def flush(self):
+        self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
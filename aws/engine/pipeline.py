@@ -0,0 +1,47 @@
+"""
+Single-threaded pipelining of policy phases
+
+Instead of sleeping through a policy's phase_delays, the pipeline runs the
+next due phase of another policy, or starts a new policy's setup, while the
+first one waits.
+"""
+
+import heapq
+import itertools
+
+from engine.clock import get_clock
+
+
+class PhasePipeline(object):
+    def __init__(self, max_active=None, clock=None):
+        self.max_active = max_active
+        self.clock = clock
+
+    def run(self, phase_runs, step):
+        """
+        Drive every PhaseRun to completion. step(index) runs the next phase of
+        phase_runs[index]; it is called from this thread only.
+        """
+        not_started = list(range(len(phase_runs)))
+        not_started.reverse()
+        scheduled = []
+        counter = itertools.count()
+        clock = self.clock or get_clock()
+
+        while not_started or scheduled:
+            now = clock.now()
+            if scheduled and scheduled[0][0] <= now:
+                index = heapq.heappop(scheduled)[2]
+            elif not_started and (
+                self.max_active is None or len(scheduled) < self.max_active
+            ):
+                index = not_started.pop()
+            else:
+                clock.sleep(scheduled[0][0] - now)
+                continue
+
+            step(index)
+            phase_run = phase_runs[index]
+            if not phase_run.done:
+                ready_at = clock.now() + phase_run.delay()
+                heapq.heappush(scheduled, (ready_at, next(counter), index))
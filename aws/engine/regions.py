@@ -0,0 +1,157 @@
+"""
+One batch of policies run in several regions at once
+
+Every region gets its own SessionCache that sends every client to that
+region, whatever region a policy script names, so each region has its own
+pooled clients and connections. Every (policy, region) pair is a job for a
+single ParallelScheduler, with per-service limits applied per region except
+for services that are global to the account. Policies using IAM or S3 would
+fight over the same resource names in every region, so they run once, in
+the first region. The results come back as one list, each labelled with its
+region.
+"""
+
+import sys
+
+from engine.aio import DEFAULT_THREADS, AsyncScheduler
+from engine.output import PrefixedStream
+from engine.runner import policy_label, run_policy, run_policy_async
+from engine.scheduler import DEFAULT_SERVICE_LIMITS, ParallelScheduler
+from engine.sessions import session_cache, shared_sessions
+
+# --regions value meaning every region enabled for the account
+ALL_REGIONS = "all"
+
+# Services whose resource names are unique across the account, not per region
+GLOBAL_SERVICES = frozenset(("cloudfront", "iam", "organizations", "route53", "s3"))
+
+# Where the enabled regions are looked up if the profile has no region
+LOOKUP_REGION = "us-east-1"
+
+
+def parse_regions(value):
+    """Region names from "us-east-1,eu-west-1"; ALL_REGIONS is kept as is"""
+    regions = []
+    for region in value.split(","):
+        region = region.strip().lower()
+        if region and region not in regions:
+            regions.append(region)
+    if not regions:
+        raise ValueError("No regions given")
+    if ALL_REGIONS in regions and len(regions) > 1:
+        raise ValueError("%s can't be combined with other regions" % ALL_REGIONS)
+    return regions
+
+
+def enabled_regions(session):
+    """Regions enabled for the account of session's credentials"""
+    ec2 = session.client("ec2", region_name=session.region_name or LOOKUP_REGION)
+    return sorted(r["RegionName"] for r in ec2.describe_regions()["Regions"])
+
+
+def regional_service(service, region):
+    """Key of service in region for the scheduler's per-service limits"""
+    return service if service in GLOBAL_SERVICES else "%s@%s" % (service, region)
+
+
+def is_regional(policy_module):
+    """Whether the policy can run in several regions at the same time"""
+    return not GLOBAL_SERVICES.intersection(policy_module.services)
+
+
+class RegionalPolicy(object):
+    """A policy script scheduled in one region"""
+
+    def __init__(self, policy_module, region):
+        self.policy_module = policy_module
+        self.region = region
+        self.name = "%s@%s" % (policy_module.name, region)
+        self.services = tuple(
+            regional_service(service, region) for service in policy_module.services
+        )
+
+
+def plan_regions(policy_modules, regions):
+    """A RegionalPolicy for every policy in every region it should run in"""
+    jobs = []
+    for policy_module in policy_modules:
+        for region in regions if is_regional(policy_module) else regions[:1]:
+            jobs.append(RegionalPolicy(policy_module, region))
+    return jobs
+
+
+def region_caches(regions, endpoint_url=None, calls=None):
+    """
+    A SessionCache for every one of regions, keyed by region. calls is a
+    CallRecorder to install on all of them, if any.
+    """
+    caches = {}
+    for region in regions:
+        caches[region] = session_cache(endpoint_url, region)
+        if calls is not None:
+            calls.install(caches[region])
+    return caches
+
+
+def run_regions(
+    policy_modules,
+    profile,
+    caches,
+    parallel=1,
+    service_limits=None,
+    calls=None,
+    asynchronous=False,
+    threads=DEFAULT_THREADS,
+):
+    """
+    Run policy_modules in every region of caches, as made by region_caches(),
+    up to parallel policies at once in each, and return the PolicyResults of
+    all regions in one list. With asynchronous, the policies run as
+    coroutines on threads threads. profile is ignored for offline caches.
+    """
+    regions = list(caches)
+    limits = DEFAULT_SERVICE_LIMITS if service_limits is None else service_limits
+    limits = dict(
+        (regional_service(service, region), limit)
+        for service, limit in limits.items()
+        for region in regions
+    )
+    if asynchronous:
+        scheduler = AsyncScheduler(parallel * len(regions), limits, threads)
+    else:
+        scheduler = ParallelScheduler(parallel * len(regions), limits)
+    stdout = sys.stdout
+    prefixed = PrefixedStream(stdout)
+
+    def run_one(job):
+        cache = caches[job.region]
+        prefixed.set_prefix(policy_label(job.policy_module, job.region))
+        try:
+            with shared_sessions(cache):
+                print("Running %s" % job.policy_module.filename)
+                session = cache.get(profile_name=profile)
+                return run_policy(job.policy_module, session, calls, job.region)
+        finally:
+            prefixed.clear_prefix()
+
+    async def run_one_async(job):
+        cache = caches[job.region]
+        prefixed.set_prefix(policy_label(job.policy_module, job.region))
+        try:
+            with shared_sessions(cache):
+                print("Running %s" % job.policy_module.filename)
+                session = cache.get(profile_name=profile)
+                return await run_policy_async(
+                    job.policy_module, session, calls, job.region
+                )
+        finally:
+            prefixed.clear_prefix()
+
+    sys.stdout = prefixed
+    try:
+        return scheduler.run(
+            plan_regions(policy_modules, regions),
+            run_one_async if asynchronous else run_one,
+        )
+    finally:
+        sys.stdout = stdout
@@ -0,0 +1,123 @@
+"""
+Policy registry for the AWS IOA engine
+
+Discovers every aws_ioa_*.py script next to this package and registers it
+under each of the policy IDs encoded in its file name, so 207, 209, 210 and
+213 all resolve to aws_ioa_207_209_210_213.py.
+"""
+
+import importlib.util
+import os
+import re
+import sys
+
+POLICY_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+POLICY_FILE_RE = re.compile(r"^aws_ioa_(\d+(?:_\d+)*)\.py$")
+SERVICE_RE = re.compile(
+    r"""(?:\.client|\.resource|LazyClient)\(\s*["']([a-z0-9-]+)["']"""
+)
+
+
+def script_of(obj):
+    """File name of the policy script defining obj's class"""
+    module = type(obj).__module__
+    if module == "__main__":
+        return os.path.basename(sys.modules[module].__file__)
+    # Scripts are loaded as modules named after the file
+    return module + ".py"
+
+
+class PolicyModule(object):
+    """A single aws_ioa_*.py script and the policy IDs it covers"""
+
+    def __init__(self, path):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.name = os.path.splitext(self.filename)[0]
+        match = POLICY_FILE_RE.match(self.filename)
+        if match is None:
+            raise ValueError("Not a policy script: %s" % self.filename)
+        self.policy_ids = tuple(int(p) for p in match.group(1).split("_"))
+        self._module = None
+        self._services = None
+
+    def __repr__(self):
+        return "PolicyModule(%s)" % self.filename
+
+    @property
+    def services(self):
+        """AWS services the script creates clients or resources for"""
+        if self._services is None:
+            with open(self.path) as f:
+                self._services = tuple(sorted(set(SERVICE_RE.findall(f.read()))))
+        return self._services
+
+    def load(self):
+        """Import the script as a module (once) and return it"""
+        if self._module is None:
+            directory = os.path.dirname(self.path)
+            if directory not in sys.path:
+                sys.path.insert(0, directory)
+            spec = importlib.util.spec_from_file_location(self.name, self.path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            self._module = module
+        return self._module
+
+
+class Registry(object):
+    """Maps policy IDs to the script that triggers them"""
+
+    def __init__(self):
+        self._by_id = {}
+        self._modules = []
+        self.directory = None
+
+    def register(self, policy_module):
+        for policy_id in policy_module.policy_ids:
+            if policy_id in self._by_id:
+                raise ValueError(
+                    "Policy %d registered by both %s and %s"
+                    % (
+                        policy_id,
+                        self._by_id[policy_id].filename,
+                        policy_module.filename,
+                    )
+                )
+            self._by_id[policy_id] = policy_module
+        self._modules.append(policy_module)
+        self._modules.sort(key=lambda m: m.policy_ids)
+
+    def discover(self, directory=POLICY_DIR):
+        self.directory = directory
+        for filename in sorted(os.listdir(directory)):
+            if POLICY_FILE_RE.match(filename):
+                self.register(PolicyModule(os.path.join(directory, filename)))
+        return self
+
+    def get(self, policy_id):
+        try:
+            return self._by_id[int(policy_id)]
+        except KeyError:
+            raise KeyError("Unknown policy: %s" % policy_id)
+
+    def modules(self):
+        return list(self._modules)
+
+    def policy_ids(self):
+        return sorted(self._by_id)
+
+    def resolve(self, policy_ids=None):
+        """
+        Return the scripts needed to run the given policy IDs, in registry order
+        and without duplicates. Returns every script when policy_ids is empty.
+        """
+        if not policy_ids:
+            return self.modules()
+        wanted = set(self.get(policy_id) for policy_id in policy_ids)
+        return [m for m in self._modules if m in wanted]
+
+
+def default_registry():
+    """Build a registry of every policy script in the aws/ directory"""
+    return Registry().discover()
@@ -0,0 +1,270 @@
+"""
+In-process runner for AWS IOA policy scripts
+
+Loads each selected script as a module and drives its PolicyTest through the
+phases in engine.lifecycle, inside the current interpreter, so boto3,
+botocore's service data and the resolved credentials are loaded once for the
+whole batch instead of once per script.
+
+Four execution modes are available:
+
+    serial     one policy at a time, waiting out each phase delay
+    pipeline   one thread; while a policy waits between phases, other
+               policies' phases run (see engine.pipeline)
+    parallel   policies run concurrently on threads (see engine.scheduler)
+    async      policies run concurrently as coroutines, their steps on a
+               bounded pool of threads (see engine.aio)
+"""
+
+import sys
+import time
+
+from engine.aio import DEFAULT_THREADS, AsyncScheduler, in_thread
+from engine.clock import get_clock
+from engine.lifecycle import PhaseRun, run_phases
+from engine.output import PrefixedStream
+from engine.pipeline import PhasePipeline
+from engine.scheduler import ParallelScheduler
+from engine.sessions import session_cache, shared_sessions
+
+DIV_LINE = "=" * 80
+
+
+class PolicyResult(object):
+    def __init__(
+        self,
+        policy_module,
+        ok,
+        duration,
+        error=None,
+        phases=None,
+        region=None,
+        account=None,
+    ):
+        self.policy_module = policy_module
+        self.ok = ok
+        self.duration = duration
+        self.error = error
+        self.phases = phases or {}
+        # Set when the policy ran in one of several regions or accounts
+        self.region = region
+        self.account = account
+
+    @property
+    def label(self):
+        return policy_label(self.policy_module, self.region, self.account)
+
+
+def policy_label(policy_module, region=None, account=None):
+    label = "/".join(str(p) for p in policy_module.policy_ids)
+    if region is not None:
+        label = "%s@%s" % (label, region)
+    return label if account is None else "%s:%s" % (account, label)
+
+
+def create_test(policy_module, session):
+    """Instantiate the PolicyTest a policy script declares as POLICY_TEST"""
+    module = policy_module.load()
+    return module.POLICY_TEST(session)
+
+
+def _result(policy_module, phase_run, duration):
+    return PolicyResult(
+        policy_module,
+        phase_run.error is None,
+        duration,
+        phase_run.error,
+        dict(phase_run.durations),
+    )
+
+
+def _failed(policy_module, error, start):
+    return PolicyResult(policy_module, False, time.monotonic() - start, repr(error))
+
+
+def run_policy(policy_module, session, calls=None, region=None, account=None):
+    """
+    Run every phase of one policy and report how it went. region and account
+    label the result when the policy runs in several regions or accounts.
+    """
+    start = time.monotonic()
+    try:
+        test = create_test(policy_module, session)
+    except Exception as e:
+        result = _failed(policy_module, e, start)
+    else:
+        label = policy_label(policy_module, region, account)
+        phase_run = run_phases(test, calls=calls, label=label)
+        result = _result(policy_module, phase_run, time.monotonic() - start)
+    result.region = region
+    result.account = account
+    return result
+
+
+async def run_policy_async(
+    policy_module, session, calls=None, region=None, account=None
+):
+    """
+    run_policy() as a coroutine: every step of the policy runs on the event
+    loop's executor and the waits between them are awaited on the clock
+    """
+    clock = get_clock()
+    start = time.monotonic()
+    try:
+        test = await in_thread(create_test, policy_module, session)
+    except Exception as e:
+        result = _failed(policy_module, e, start)
+    else:
+        label = policy_label(policy_module, region, account)
+        phase_run = PhaseRun(test, calls, label)
+        while not phase_run.done:
+            await clock.sleep_async(phase_run.delay())
+            await in_thread(phase_run.step)
+        result = _result(policy_module, phase_run, time.monotonic() - start)
+    result.region = region
+    result.account = account
+    return result
+
+
+def _run_serial(policy_modules, session, calls):
+    results = []
+    for policy_module in policy_modules:
+        print(DIV_LINE)
+        print("Running %s" % policy_module.filename)
+        print(DIV_LINE)
+        results.append(run_policy(policy_module, session, calls))
+    return results
+
+
+def _run_pipelined(policy_modules, session, calls):
+    stdout = sys.stdout
+    prefixed = PrefixedStream(stdout)
+    results = [None] * len(policy_modules)
+    phase_runs = []
+    starts = []
+    for index, policy_module in enumerate(policy_modules):
+        starts.append(None)
+        try:
+            test = create_test(policy_module, session)
+            phase_runs.append(PhaseRun(test, calls, policy_label(policy_module)))
+        except Exception as e:
+            results[index] = _failed(policy_module, e, time.monotonic())
+            phase_runs.append(None)
+
+    active = [i for i, phase_run in enumerate(phase_runs) if phase_run is not None]
+
+    def step(position):
+        index = active[position]
+        phase_run = phase_runs[index]
+        if starts[index] is None:
+            starts[index] = time.monotonic()
+        prefixed.set_prefix(policy_label(policy_modules[index]))
+        try:
+            phase_run.step()
+        finally:
+            prefixed.clear_prefix()
+        if phase_run.done:
+            duration = time.monotonic() - starts[index]
+            results[index] = _result(policy_modules[index], phase_run, duration)
+
+    sys.stdout = prefixed
+    try:
+        PhasePipeline().run([phase_runs[i] for i in active], step)
+    finally:
+        sys.stdout = stdout
+    return results
+
+
+def _run_parallel(policy_modules, session, parallel, service_limits, calls):
+    stdout = sys.stdout
+    prefixed = PrefixedStream(stdout)
+
+    def run_one(policy_module):
+        prefixed.set_prefix(policy_label(policy_module))
+        try:
+            print("Running %s" % policy_module.filename)
+            return run_policy(policy_module, session, calls)
+        finally:
+            prefixed.clear_prefix()
+
+    scheduler = ParallelScheduler(parallel, service_limits)
+    sys.stdout = prefixed
+    try:
+        return scheduler.run(policy_modules, run_one)
+    finally:
+        sys.stdout = stdout
+
+
+def _run_async(policy_modules, session, parallel, service_limits, calls, threads):
+    stdout = sys.stdout
+    prefixed = PrefixedStream(stdout)
+
+    async def run_one(policy_module):
+        prefixed.set_prefix(policy_label(policy_module))
+        try:
+            print("Running %s" % policy_module.filename)
+            return await run_policy_async(policy_module, session, calls)
+        finally:
+            prefixed.clear_prefix()
+
+    scheduler = AsyncScheduler(parallel, service_limits, threads)
+    sys.stdout = prefixed
+    try:
+        return scheduler.run(policy_modules, run_one)
+    finally:
+        sys.stdout = stdout
+
+
+def run_policies(
+    policy_modules,
+    profile,
+    sessions=None,
+    parallel=1,
+    service_limits=None,
+    pipeline=False,
+    calls=None,
+    asynchronous=False,
+    threads=DEFAULT_THREADS,
+):
+    """
+    Run policies, sharing boto3 sessions between them. Policies run back to
+    back unless pipeline is set or parallel is greater than 1. With
+    asynchronous, up to parallel policies run as coroutines whose steps
+    share threads threads. profile is ignored when sessions sends clients to
+    an offline endpoint. calls is a CallRecorder already installed on
+    sessions, if any.
+    """
+    if sessions is None:
+        sessions = session_cache()
+    with shared_sessions(sessions):
+        session = sessions.get(profile_name=profile)
+        if asynchronous:
+            return _run_async(
+                policy_modules, session, parallel, service_limits, calls, threads
+            )
+        if parallel > 1:
+            return _run_parallel(
+                policy_modules, session, parallel, service_limits, calls
+            )
+        if pipeline:
+            return _run_pipelined(policy_modules, session, calls)
+        return _run_serial(policy_modules, session, calls)
+
+
+def print_summary(results, elapsed=None):
+    print(DIV_LINE)
+    print("Summary")
+    print(DIV_LINE)
+    width = max([16] + [len(r.label) for r in results])
+    for result in results:
+        status = "OK  " if result.ok else "FAIL"
+        line = "%s %-*s %8.1fs" % (status, width, result.label, result.duration)
+        if result.error:
+            line += "  " + result.error
+        print(line)
+    total = sum(r.duration for r in results)
+    failed = len([r for r in results if not r.ok])
+    line = "%d policy script(s), %d failed, %.1fs total" % (len(results), failed, total)
+    if elapsed is not None:
+        line += ", %.1fs wall clock" % elapsed
+    print(line)
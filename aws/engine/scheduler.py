@@ -0,0 +1,98 @@
+"""
+Concurrent policy scheduling with per-service concurrency caps
+"""
+
+import threading
+
+# IAM is global per account and throttles aggressively, so the IAM-heavy
+# policies (204, 234, 236, 238, 246, 257) are kept from piling onto it.
+DEFAULT_SERVICE_LIMITS = {"iam": 2}
+
+
+def parse_service_limits(values):
+    """Turn ["iam=2", "ec2=3"] into {"iam": 2, "ec2": 3}"""
+    limits = dict(DEFAULT_SERVICE_LIMITS)
+    for value in values or []:
+        service, sep, limit = value.partition("=")
+        if not sep or not limit.isdigit() or int(limit) < 1:
+            raise ValueError("Invalid service limit %r, expected SERVICE=N" % value)
+        limits[service.strip().lower()] = int(limit)
+    return limits
+
+
+class ParallelScheduler(object):
+    """
+    Runs up to max_workers policies at once. A policy only starts when every
+    AWS service it uses is below its limit, so a slow RDS or EC2 policy never
+    holds back the rest of the batch, while IAM-heavy policies queue behind
+    each other instead of throttling.
+    """
+
+    def __init__(self, max_workers, service_limits=None):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self.service_limits = dict(
+            DEFAULT_SERVICE_LIMITS if service_limits is None else service_limits
+        )
+        self._in_use = {}
+        self._running = 0
+        self._cond = threading.Condition()
+
+    def _has_capacity(self, services):
+        if self._running >= self.max_workers:
+            return False
+        for service in services:
+            limit = self.service_limits.get(service)
+            if limit is not None and self._in_use.get(service, 0) >= limit:
+                return False
+        return True
+
+    def _acquire(self, services):
+        self._running += 1
+        for service in services:
+            self._in_use[service] = self._in_use.get(service, 0) + 1
+
+    def _release(self, services):
+        with self._cond:
+            self._running -= 1
+            for service in services:
+                self._in_use[service] -= 1
+            self._cond.notify_all()
+
+    def run(self, policy_modules, run_one):
+        """
+        Call run_one(policy_module) for every policy, concurrently, and return
+        the results in the same order as policy_modules.
+        """
+        results = [None] * len(policy_modules)
+        pending = list(enumerate(policy_modules))
+        threads = []
+
+        def worker(index, policy_module):
+            try:
+                results[index] = run_one(policy_module)
+            finally:
+                self._release(policy_module.services)
+
+        with self._cond:
+            while pending:
+                ready = None
+                for item in pending:
+                    if self._has_capacity(item[1].services):
+                        ready = item
+                        break
+                if ready is None:
+                    self._cond.wait()
+                    continue
+                pending.remove(ready)
+                self._acquire(ready[1].services)
+                thread = threading.Thread(
+                    target=worker, args=ready, name=ready[1].name, daemon=True
+                )
+                threads.append(thread)
+                thread.start()
+
+        for thread in threads:
+            thread.join()
+        return results
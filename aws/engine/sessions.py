@@ -0,0 +1,316 @@
+"""
+Shared boto3 sessions for policies running in a single interpreter
+"""
+
+import contextlib
+import contextvars
+import os
+import threading
+
+import boto3
+import boto3.session
+import botocore.credentials
+import botocore.session
+
+from engine.state import get_state_store, scope_of
+
+# Client arguments that identify a reusable client. Anything else, such as
+# explicit credentials, bypasses the pool.
+_POOLED_ARGS = (
+    "region_name",
+    "api_version",
+    "use_ssl",
+    "verify",
+    "endpoint_url",
+    "config",
+)
+
+# Set to a local AWS emulator's URL to run policies offline
+ENDPOINT_ENV = "IOA_ENDPOINT_URL"
+
+# What offline sessions use in place of a profile; emulators accept anything
+OFFLINE_CREDENTIALS = {
+    "aws_access_key_id": "testing",
+    "aws_secret_access_key": "testing",
+}
+OFFLINE_REGION = "us-east-1"
+
+
+def config_key(config):
+    """Hashable form of a botocore Config, by the options it was given"""
+    if config is None:
+        return None
+    options = config._user_provided_options
+    return tuple(sorted((name, repr(value)) for name, value in options.items()))
+
+
+class ClientPool(object):
+    """
+    Process-wide cache of boto3 clients keyed by (profile, service, region,
+    config). Clients are thread-safe, so policies asking for the same client
+    share its resolved credentials and its HTTP connection pool.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def get(self, key, create):
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = create()
+                self._clients[key] = client
+                self.created += 1
+            else:
+                self.reused += 1
+        return client
+
+    def __len__(self):
+        return len(self._clients)
+
+
+class _SharedCredentials(botocore.credentials.CredentialProvider):
+    """Hands every session the same, possibly self-refreshing, credentials"""
+
+    METHOD = "ioa-shared"
+
+    def __init__(self, credentials):
+        super(_SharedCredentials, self).__init__()
+        self._credentials = credentials
+
+    def load(self):
+        return self._credentials
+
+
+class _LockedSession(boto3.session.Session):
+    """
+    boto3 sessions are not thread-safe, but the clients they create are.
+    Serialize client and resource creation so concurrently running policies
+    can share one session, and hand out pooled clients where possible.
+    """
+
+    _lock = threading.RLock()
+
+    def __init__(
+        self,
+        pool=None,
+        pool_key=None,
+        client_defaults=None,
+        region_override=None,
+        **kwargs
+    ):
+        super(_LockedSession, self).__init__(**kwargs)
+        self._pool = pool
+        self._pool_key = pool_key
+        self._client_defaults = client_defaults or {}
+        self.region_override = region_override
+
+    def _with_defaults(self, kwargs):
+        """Apply the cache's endpoint and region settings to client arguments"""
+        if self.region_override:
+            kwargs["region_name"] = self.region_override
+        for name, value in self._client_defaults.items():
+            if name == "region_name" and self.region_name:
+                continue
+            if kwargs.get(name) is None:
+                kwargs[name] = value
+        return kwargs
+
+    def client(self, service_name, **kwargs):
+        kwargs = self._with_defaults(kwargs)
+        create = lambda: self._create_client(service_name, **kwargs)
+        if self._pool is None or any(k not in _POOLED_ARGS for k in kwargs):
+            return create()
+        key = (
+            self._pool_key,
+            service_name,
+            kwargs.get("region_name") or self.region_name,
+            kwargs.get("api_version"),
+            kwargs.get("use_ssl", True),
+            kwargs.get("verify"),
+            kwargs.get("endpoint_url"),
+            config_key(kwargs.get("config")),
+        )
+        return self._pool.get(key, create)
+
+    def _create_client(self, *args, **kwargs):
+        with self._lock:
+            return super(_LockedSession, self).client(*args, **kwargs)
+
+    def resource(self, *args, **kwargs):
+        # Resources are not thread-safe, so every caller gets its own
+        kwargs = self._with_defaults(kwargs)
+        with self._lock:
+            return super(_LockedSession, self).resource(*args, **kwargs)
+
+
+class SessionCache(object):
+    """
+    Hands out one boto3 session per distinct set of constructor arguments.
+
+    Every session shares a single botocore data loader, so service models are
+    parsed once per process, and a session's resolved credentials are reused
+    by every policy that asks for the same profile and region. Clients are
+    pooled across all sessions in the cache, see ClientPool.
+
+    endpoint_url sends every client to one endpoint, such as a local moto
+    server, and region_name is used by sessions that don't resolve a region
+    of their own. credentials, if given, replace the profile of every session
+    that isn't given keys of its own. shared_credentials, if given, are botocore
+    Credentials used the same way, such as an assumed role's that refresh
+    themselves when they near expiry. region_override, if given, is the region
+    of every session and client, whatever region a policy asks for. Handlers
+    added with register() are attached to every session's botocore events.
+    """
+
+    def __init__(
+        self,
+        endpoint_url=None,
+        region_name=None,
+        credentials=None,
+        region_override=None,
+        shared_credentials=None,
+    ):
+        self._sessions = {}
+        self._loader = None
+        self._lock = threading.Lock()
+        self._handlers = []
+        self.clients = ClientPool()
+        self.endpoint_url = endpoint_url
+        self.credentials = credentials
+        self.shared_credentials = shared_credentials
+        self.region_override = region_override
+        self.client_defaults = {}
+        if endpoint_url:
+            self.client_defaults["endpoint_url"] = endpoint_url
+        if region_name:
+            self.client_defaults["region_name"] = region_name
+
+    def register(self, event_name, handler):
+        """Register a botocore event handler on every session, e.g. before-call"""
+        with self._lock:
+            self._handlers.append((event_name, handler))
+            for session in self._sessions.values():
+                session.events.register(event_name, handler)
+
+    def get(self, **kwargs):
+        shared = self.shared_credentials and not kwargs.get("aws_access_key_id")
+        if shared:
+            kwargs.pop("profile_name", None)
+        elif self.credentials and not kwargs.get("aws_access_key_id"):
+            kwargs.pop("profile_name", None)
+            kwargs.update(self.credentials)
+        if self.region_override:
+            kwargs["region_name"] = self.region_override
+        key = tuple(sorted((k, v) for k, v in kwargs.items() if v is not None))
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                core = botocore.session.get_session()
+                if self._loader is None:
+                    self._loader = core.get_component("data_loader")
+                else:
+                    core.register_component("data_loader", self._loader)
+                if shared:
+                    core.register_component(
+                        "credential_provider",
+                        botocore.credentials.CredentialResolver(
+                            [_SharedCredentials(self.shared_credentials)]
+                        ),
+                    )
+                for event_name, handler in self._handlers:
+                    core.register(event_name, handler)
+                session = _LockedSession(
+                    pool=self.clients,
+                    pool_key=key,
+                    client_defaults=self.client_defaults,
+                    region_override=self.region_override,
+                    botocore_session=core,
+                    **dict(key)
+                )
+                self._sessions[key] = session
+        return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def session_cache(
+    endpoint_url=None,
+    region_override=None,
+    shared_credentials=None,
+    region_name=None,
+    account_id=None,
+):
+    """
+    A SessionCache for real AWS or, given endpoint_url (or $IOA_ENDPOINT_URL),
+    one that sends every client to that emulator with dummy credentials.
+    region_override, if given, is the region of every client. For one of
+    several accounts, shared_credentials are that account's, region_name the
+    default region of its clients and account_id its ID. The resources its
+    clients create are recorded in the state store, see engine.state.
+    """
+    endpoint_url = endpoint_url or os.environ.get(ENDPOINT_ENV)
+    if not endpoint_url:
+        cache = SessionCache(
+            region_name=region_name,
+            region_override=region_override,
+            shared_credentials=shared_credentials,
+        )
+    else:
+        cache = SessionCache(
+            endpoint_url=endpoint_url,
+            region_name=region_name or OFFLINE_REGION,
+            credentials=OFFLINE_CREDENTIALS,
+            region_override=region_override,
+            shared_credentials=shared_credentials,
+        )
+    store = get_state_store()
+    if store is not None:
+        store.install(cache, scope=scope_of(endpoint_url, account_id))
+    return cache
+
+
+# The cache boto3.Session(...) goes through in the current context, and the
+# caches of every active shared_sessions() block, latest last
+_current_cache = contextvars.ContextVar("ioa_session_cache", default=None)
+_active_caches = []
+_patch_lock = threading.Lock()
+_original_session = None
+
+
+def _session_factory(**kwargs):
+    cache = _current_cache.get()
+    if cache is None:
+        # A thread the engine didn't start in a shared_sessions() block
+        with _patch_lock:
+            cache = _active_caches[-1]
+    return cache.get(**kwargs)
+
+
+@contextlib.contextmanager
+def shared_sessions(cache):
+    """
+    Route every boto3.Session(...) call made by a policy script through cache.
+    Blocks may be nested or run at once on different threads, e.g. one per
+    region; calls go through the cache of the block they are made in, or the
+    latest active one on threads outside any block.
+    """
+    global _original_session
+    token = _current_cache.set(cache)
+    with _patch_lock:
+        if not _active_caches:
+            _original_session = boto3.Session
+            boto3.Session = _session_factory
+        _active_caches.append(cache)
+    try:
+        yield cache
+    finally:
+        with _patch_lock:
+            _active_caches.remove(cache)
+            if not _active_caches:
+                boto3.Session = _original_session
+        _current_cache.reset(token)
@@ -0,0 +1,368 @@
+"""
+Sustained load: the pattern phase of a few policies, over and over
+
+A soak runs setup and trigger_before of each selected policy once, then
+repeats trigger_ioa (calling reset_ioa in between) on worker threads until
+the duration is up, and finally runs cleanup, so the fixtures stay warm for
+the whole run. Every API call a pattern phase makes is one event and has to
+take a token from a shared TokenBucket first, which holds the events per
+second to the target rate. When AWS throttles or botocore has to retry, the
+bucket halves its rate and then climbs back to the target while calls go
+through cleanly. The achieved rate is printed every few seconds.
+"""
+
+import inspect
+import sys
+import threading
+import time
+
+from engine.calls import THROTTLING_ERRORS
+from engine.clock import get_clock
+from engine.lifecycle import PhaseRun
+from engine.runner import create_test, policy_label
+from engine.sessions import session_cache, shared_sessions
+
+DEFAULT_DURATION = 60
+DEFAULT_REPORT_INTERVAL = 5
+
+# On throttling the rate is multiplied by BACKOFF, at most once per
+# BACKOFF_INTERVAL seconds and never below MIN_FRACTION of the target. After
+# RECOVERY_DELAY seconds without throttling it grows by RECOVERY_STEP of the
+# target every report.
+BACKOFF = 0.5
+BACKOFF_INTERVAL = 1.0
+MIN_FRACTION = 0.05
+RECOVERY_DELAY = 5.0
+RECOVERY_STEP = 0.1
+
+# Longest a worker waits for a token before checking whether the soak ended
+MAX_TOKEN_WAIT = 0.5
+
+# A policy stops soaking after this many rounds in a row fail other than by
+# throttling
+MAX_CONSECUTIVE_FAILURES = 5
+
+
+class TokenBucket(object):
+    """
+    rate tokens per second, up to burst at once. The rate backs off on
+    throttled() and recovers towards target on recover().
+    """
+
+    def __init__(self, rate, burst=None, clock=None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive, not %r" % rate)
+        self.target = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self.clock = clock or get_clock()
+        self.tokens = self.burst
+        self.backoffs = 0
+        self._updated = self.clock.now()
+        self._throttled_at = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self._updated = now
+
+    def take(self):
+        """Take a token and return 0, or return the seconds until one is due"""
+        with self._lock:
+            self._refill(self.clock.now())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def throttled(self):
+        with self._lock:
+            now = self.clock.now()
+            if (
+                self._throttled_at is not None
+                and now - self._throttled_at < BACKOFF_INTERVAL
+            ):
+                return
+            self._refill(now)
+            self._throttled_at = now
+            self.rate = max(self.target * MIN_FRACTION, self.rate * BACKOFF)
+            self.tokens = min(self.tokens, 1.0)
+            self.backoffs += 1
+
+    def recover(self):
+        with self._lock:
+            now = self.clock.now()
+            if self.rate >= self.target or (
+                self._throttled_at is not None
+                and now - self._throttled_at < RECOVERY_DELAY
+            ):
+                return
+            self._refill(now)
+            self.rate = min(self.target, self.rate + self.target * RECOVERY_STEP)
+
+
+class SoakedPolicy(object):
+    def __init__(self, policy_module, phase_run):
+        self.policy_module = policy_module
+        self.phase_run = phase_run
+        self.label = policy_label(policy_module)
+        self.rounds = 0
+        self.events = 0
+        self.errors = 0
+        self.throttled = 0
+        self.failures = 0
+        self.error = phase_run.error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class _MutedStream(object):
+    """stdout wrapper that drops what the soak's worker threads print"""
+
+    def __init__(self, stream, local):
+        self._stream = stream
+        self._local = local
+
+    def write(self, data):
+        if getattr(self._local, "muted", False):
+            return len(data)
+        return self._stream.write(data)
+
+    def flush(self):
+        return self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _run_phase(test, phase, clock):
+    result = getattr(test, phase)()
+    if inspect.isgenerator(result):
+        for wait in result:
+            clock.sleep(wait or 0)
+
+
+class Soak(object):
+    """
+    Repeats the pattern phase of several policies at rate events per second
+    in total, on workers threads per policy.
+    """
+
+    def __init__(
+        self,
+        rate,
+        duration=DEFAULT_DURATION,
+        burst=None,
+        workers=1,
+        max_events=None,
+        report_interval=DEFAULT_REPORT_INTERVAL,
+        clock=None,
+    ):
+        self.clock = clock or get_clock()
+        self.bucket = TokenBucket(rate, burst, self.clock)
+        self.duration = duration
+        self.workers = max(1, workers)
+        self.max_events = max_events
+        self.report_interval = report_interval
+        self.soaked = []
+        self.events = 0
+        self.errors = 0
+        self.throttled = 0
+        self.elapsed = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def install(self, sessions):
+        sessions.register("before-call", self._before_call)
+        sessions.register("after-call", self._after_call)
+
+    def _before_call(self, **kwargs):
+        policy = getattr(self._local, "policy", None)
+        if policy is None:
+            return
+        while not self._stop.is_set():
+            wait = self.bucket.take()
+            if not wait:
+                break
+            self.clock.sleep(min(wait, MAX_TOKEN_WAIT))
+        with self._lock:
+            self.events += 1
+            policy.events += 1
+            if self.max_events is not None and self.events >= self.max_events:
+                self._stop.set()
+
+    def _after_call(self, parsed, **kwargs):
+        policy = getattr(self._local, "policy", None)
+        if policy is None:
+            return
+        error = parsed.get("Error", {}).get("Code")
+        retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        throttled = error in THROTTLING_ERRORS or retries > 0
+        with self._lock:
+            if error:
+                self.errors += 1
+                policy.errors += 1
+            if throttled:
+                self.throttled += 1
+                policy.throttled += 1
+        if throttled:
+            self.bucket.throttled()
+
+    def _work(self, policy):
+        test = policy.phase_run.test
+        failures = 0
+        self._local.muted = True
+        while not self._stop.is_set():
+            throttled = policy.throttled
+            self._local.policy = policy
+            error = None
+            try:
+                _run_phase(test, "trigger_ioa", self.clock)
+            except Exception as e:
+                error = "trigger_ioa: %r" % e
+            # Undoing the pattern is not part of the load, and is tried even
+            # after a failed round so the next one starts clean
+            self._local.policy = None
+            try:
+                test.reset_ioa()
+            except Exception as e:
+                error = error or "reset_ioa: %r" % e
+            with self._lock:
+                if error is None:
+                    policy.rounds += 1
+                    failures = 0
+                    continue
+                policy.failures += 1
+                if policy.throttled == throttled:
+                    failures += 1
+                if failures >= MAX_CONSECUTIVE_FAILURES:
+                    policy.error = error
+                    return
+
+    def _report(self, elapsed, last_events, interval):
+        print(
+            "[%5.0fs] %7.1f events/s (target %g, limit %.1f), %d events, %d errors, %d throttled"
+            % (
+                elapsed,
+                (self.events - last_events) / max(interval, 1e-6),
+                self.bucket.target,
+                self.bucket.rate,
+                self.events,
+                self.errors,
+                self.throttled,
+            )
+        )
+
+    def _warm_up(self, policy_modules, session):
+        for policy_module in policy_modules:
+            try:
+                test = create_test(policy_module, session)
+            except Exception as e:
+                print("Could not load %s: %r" % (policy_module.filename, e))
+                continue
+            phase_run = PhaseRun(test, label=policy_label(policy_module))
+            print("Setting up %s" % policy_module.filename)
+            while phase_run.next_phase in ("setup", "trigger_before"):
+                self.clock.sleep(phase_run.delay())
+                phase_run.step()
+            self.soaked.append(SoakedPolicy(policy_module, phase_run))
+
+    def _cool_down(self):
+        for policy in self.soaked:
+            if policy.phase_run.next_phase != "cleanup":
+                policy.phase_run.skip_to("cleanup")
+            print("Cleaning up %s" % policy.policy_module.filename)
+            while not policy.phase_run.done:
+                policy.phase_run.step()
+            if policy.error is None:
+                policy.error = policy.phase_run.error
+
+    def run(self, policy_modules, session):
+        """Soak policy_modules using session, then clean up; returns self.soaked"""
+        self._warm_up(policy_modules, session)
+        threads = []
+        stdout = sys.stdout
+        sys.stdout = _MutedStream(stdout, self._local)
+        try:
+            for policy in self.soaked:
+                if not policy.ok:
+                    continue
+                for worker in range(self.workers):
+                    thread = threading.Thread(
+                        target=self._work,
+                        args=(policy,),
+                        name="soak-%s-%d" % (policy.label, worker),
+                    )
+                    thread.daemon = True
+                    threads.append(thread)
+            print(
+                "Soaking %d policy script(s) at %g events/s for %gs"
+                % (len(threads) // self.workers, self.bucket.target, self.duration)
+            )
+            start = time.monotonic()
+            last, last_events = start, 0
+            for thread in threads:
+                thread.start()
+            while not self._stop.is_set() and any(t.is_alive() for t in threads):
+                remaining = self.duration - (time.monotonic() - start)
+                if remaining <= 0:
+                    break
+                self._stop.wait(min(self.report_interval, remaining))
+                now = time.monotonic()
+                self._report(now - start, last_events, now - last)
+                last, last_events = now, self.events
+                self.bucket.recover()
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self.elapsed = time.monotonic() - start
+        finally:
+            sys.stdout = stdout
+        self._cool_down()
+        return self.soaked
+
+
+def run_soak(policy_modules, profile, soak, sessions=None):
+    """
+    Soak policy_modules with soak, a Soak, sharing one boto3 session. profile
+    is ignored when sessions sends clients to an offline endpoint.
+    """
+    if sessions is None:
+        sessions = session_cache()
+    soak.install(sessions)
+    with shared_sessions(sessions):
+        session = sessions.get(profile_name=profile)
+        return soak.run(policy_modules, session)
+
+
+def print_soak(soak):
+    print("=" * 80)
+    print("Soak summary")
+    print("=" * 80)
+    for policy in soak.soaked:
+        status = "OK  " if policy.ok else "FAIL"
+        line = "%s %-16s %6d round(s) %8d events %6d errors %6d throttled" % (
+            status,
+            policy.label,
+            policy.rounds,
+            policy.events,
+            policy.errors,
+            policy.throttled,
+        )
+        if policy.error:
+            line += "  " + policy.error
+        print(line)
+    print(
+        "%d events in %.1fs, %.1f events/s against a target of %g; backed off %d time(s)"
+        % (
+            soak.events,
+            soak.elapsed,
+            soak.events / max(soak.elapsed, 1e-6),
+            soak.bucket.target,
+            soak.bucket.backoffs,
+        )
+    )
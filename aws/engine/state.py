@@ -0,0 +1,708 @@
+"""
+Local record of the AWS resources the policies create
+
+Every session handed out by engine.sessions.session_cache() reports its
+create and delete calls to the process-wide StateStore, a SQLite database
+next to the policy scripts. Each resource a create call makes becomes a row
+holding its kind, ID, name, ARN, region, the policy script and run that made
+it and the arguments of the call that deletes it; the matching delete call
+(or a delete that finds it already gone) marks the row deleted.
+
+A policy's setup can then ask what an earlier run left behind instead of
+listing the account or creating and waiting for a duplicate error:
+
+    for group in recall("ec2:security-group", name=GROUP_NAME, region=REGION):
+        ec2.delete_security_group(GroupId=group.resource_id)
+
+Resources created outside the engine, or on another machine, are not known
+here, so setup keeps its error handling as a fallback.
+
+Rows are committed as each create call returns, so the table doubles as a
+journal of what an interrupted run left behind; engine janitor deletes it
+with an engine.teardown.Teardown.
+"""
+
+import collections
+import contextlib
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from engine.registry import POLICY_DIR
+
+# Set to a path to keep the state database elsewhere, or to "off" to not
+# record anything
+STATE_ENV = "IOA_STATE"
+DEFAULT_STATE = os.path.join(POLICY_DIR, "ioa_state.db")
+
+# Rows of deleted resources are dropped this many seconds after deletion
+DELETED_RETENTION = 30 * 24 * 3600
+
+# Scope of resources created in real AWS; offline ones are scoped by endpoint
+AWS_SCOPE = "aws"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    name TEXT,
+    arn TEXT,
+    region TEXT,
+    policy TEXT,
+    run_id TEXT NOT NULL,
+    delete_args TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    deleted_at REAL
+);
+CREATE INDEX IF NOT EXISTS resources_live
+    ON resources (scope, kind, deleted_at);
+"""
+
+Resource = collections.namedtuple(
+    "Resource",
+    (
+        "kind",
+        "resource_id",
+        "name",
+        "arn",
+        "region",
+        "policy",
+        "run_id",
+        "delete_args",
+        "created_at",
+    ),
+)
+
+
+def _values(source, params, response):
+    """
+    Values found at source, "params:Path.To.Key" or "response:Path.To.Key",
+    where a "Key[]" segment fans out over a list
+    """
+    where, _, path = source.partition(":")
+    values = [params if where == "params" else response]
+    for part in path.split("."):
+        many = part.endswith("[]")
+        key = part[:-2] if many else part
+        found = []
+        for value in values:
+            if not isinstance(value, dict) or value.get(key) is None:
+                continue
+            if many and isinstance(value[key], list):
+                found.extend(value[key])
+            else:
+                found.append(value[key])
+        values = found
+    return values
+
+
+def _canonical(args):
+    return json.dumps(args, sort_keys=True)
+
+
+class ResourceType(object):
+    """
+    How a create call makes a resource and a delete call removes it.
+    resource_id, name and arn are sources as read by _values(); delete_args
+    maps each argument identifying the resource in the delete call to a
+    source, or to "id" for the resource ID. An argument ending in [] takes a
+    list of IDs. extra_args are constant arguments the delete call needs.
+
+    children are the (kind, argument) pairs of resources that have to be
+    deleted first: those whose delete argument is this resource's ID, or,
+    with argument None, every resource of kind from the same run and region.
+    waiter, if set, is the botocore waiter that is given the delete arguments
+    and returns once a deletion that the delete call only started is done.
+    """
+
+    def __init__(
+        self,
+        kind,
+        create,
+        delete,
+        resource_id,
+        delete_args,
+        name=None,
+        arn=None,
+        extra_args=None,
+        children=(),
+        waiter=None,
+    ):
+        self.kind = kind
+        self.service = kind.partition(":")[0]
+        self.create = create
+        self.delete = delete
+        self.resource_id = resource_id
+        self.delete_args = delete_args
+        self.name = name
+        self.arn = arn
+        self.extra_args = extra_args or {}
+        self.children = children
+        self.waiter = waiter
+
+    def _first(self, source, params, response):
+        values = _values(source, params, response) if source else []
+        return values[0] if values else None
+
+    def created(self, params, response):
+        """(resource_id, name, arn, delete_args) of each resource a create call made"""
+        name = self._first(self.name, params, response)
+        arn = self._first(self.arn, params, response)
+        created = []
+        for resource_id in _values(self.resource_id, params, response):
+            args = {}
+            for key, source in self.delete_args.items():
+                if source == "id":
+                    value = resource_id
+                else:
+                    value = self._first(source, params, response)
+                if key.endswith("[]"):
+                    key, value = key[:-2], [value]
+                args[key] = value
+            created.append((str(resource_id), name, arn, args))
+        return created
+
+    def id_of(self, delete_args):
+        """The resource ID among the arguments of its delete call"""
+        for key, source in self.delete_args.items():
+            if source == "id":
+                value = delete_args[key.rstrip("[]")]
+                return str(value[0] if key.endswith("[]") else value)
+
+    def deleted(self, params):
+        """delete_args of each resource a delete call removed"""
+        fixed = {}
+        ids_key = None
+        for key, source in self.delete_args.items():
+            if source == "id":
+                ids_key = key
+            else:
+                fixed[key] = params.get(key)
+        if ids_key is None:
+            return []
+        if ids_key.endswith("[]"):
+            ids_key = ids_key[:-2]
+            return [
+                dict(fixed, **{ids_key: [resource_id]})
+                for resource_id in params.get(ids_key) or []
+            ]
+        if params.get(ids_key) is None:
+            return []
+        return [dict(fixed, **{ids_key: params[ids_key]})]
+
+
+# What has to go before a VPC can be deleted
+VPC_CHILDREN = (
+    ("ec2:instance", None),
+    ("ec2:security-group", None),
+    ("ec2:flow-log", None),
+)
+
+RESOURCE_TYPES = (
+    ResourceType(
+        "ec2:instance",
+        "RunInstances",
+        "TerminateInstances",
+        "response:Instances[].InstanceId",
+        {"InstanceIds[]": "id"},
+        waiter="instance_terminated",
+    ),
+    ResourceType(
+        "ec2:security-group",
+        "CreateSecurityGroup",
+        "DeleteSecurityGroup",
+        "response:GroupId",
+        {"GroupId": "id"},
+        name="params:GroupName",
+        children=(("ec2:instance", None),),
+    ),
+    ResourceType(
+        "ec2:key-pair",
+        "CreateKeyPair",
+        "DeleteKeyPair",
+        "params:KeyName",
+        {"KeyName": "id"},
+        name="params:KeyName",
+    ),
+    ResourceType(
+        "ec2:image",
+        "CopyImage",
+        "DeregisterImage",
+        "response:ImageId",
+        {"ImageId": "id"},
+        name="params:Name",
+    ),
+    ResourceType(
+        "ec2:vpc",
+        "CreateVpc",
+        "DeleteVpc",
+        "response:Vpc.VpcId",
+        {"VpcId": "id"},
+        children=VPC_CHILDREN,
+    ),
+    ResourceType(
+        "ec2:vpc",
+        "CreateDefaultVpc",
+        "DeleteVpc",
+        "response:Vpc.VpcId",
+        {"VpcId": "id"},
+        children=VPC_CHILDREN,
+    ),
+    ResourceType(
+        "ec2:flow-log",
+        "CreateFlowLogs",
+        "DeleteFlowLogs",
+        "response:FlowLogIds[]",
+        {"FlowLogIds[]": "id"},
+    ),
+    ResourceType(
+        "iam:user",
+        "CreateUser",
+        "DeleteUser",
+        "params:UserName",
+        {"UserName": "id"},
+        name="params:UserName",
+        arn="response:User.Arn",
+        children=(
+            ("iam:access-key", "UserName"),
+            ("iam:login-profile", "UserName"),
+            ("iam:user-policy", "UserName"),
+        ),
+    ),
+    ResourceType(
+        "iam:group",
+        "CreateGroup",
+        "DeleteGroup",
+        "params:GroupName",
+        {"GroupName": "id"},
+        name="params:GroupName",
+        arn="response:Group.Arn",
+        children=(("iam:group-policy", "GroupName"),),
+    ),
+    ResourceType(
+        "iam:role",
+        "CreateRole",
+        "DeleteRole",
+        "params:RoleName",
+        {"RoleName": "id"},
+        name="params:RoleName",
+        arn="response:Role.Arn",
+        children=(("iam:role-policy", "RoleName"),),
+    ),
+    ResourceType(
+        "iam:policy",
+        "CreatePolicy",
+        "DeletePolicy",
+        "response:Policy.Arn",
+        {"PolicyArn": "id"},
+        name="params:PolicyName",
+        arn="response:Policy.Arn",
+    ),
+    ResourceType(
+        "iam:access-key",
+        "CreateAccessKey",
+        "DeleteAccessKey",
+        "response:AccessKey.AccessKeyId",
+        {"UserName": "params:UserName", "AccessKeyId": "id"},
+        name="params:UserName",
+    ),
+    ResourceType(
+        "iam:login-profile",
+        "CreateLoginProfile",
+        "DeleteLoginProfile",
+        "params:UserName",
+        {"UserName": "id"},
+    ),
+    ResourceType(
+        "iam:user-policy",
+        "PutUserPolicy",
+        "DeleteUserPolicy",
+        "params:PolicyName",
+        {"UserName": "params:UserName", "PolicyName": "id"},
+        name="params:UserName",
+    ),
+    ResourceType(
+        "iam:group-policy",
+        "PutGroupPolicy",
+        "DeleteGroupPolicy",
+        "params:PolicyName",
+        {"GroupName": "params:GroupName", "PolicyName": "id"},
+        name="params:GroupName",
+    ),
+    ResourceType(
+        "iam:role-policy",
+        "PutRolePolicy",
+        "DeleteRolePolicy",
+        "params:PolicyName",
+        {"RoleName": "params:RoleName", "PolicyName": "id"},
+        name="params:RoleName",
+    ),
+    ResourceType(
+        "s3:bucket",
+        "CreateBucket",
+        "DeleteBucket",
+        "params:Bucket",
+        {"Bucket": "id"},
+        children=(("cloudtrail:trail", None),),
+    ),
+    ResourceType(
+        "rds:db-instance",
+        "CreateDBInstance",
+        "DeleteDBInstance",
+        "params:DBInstanceIdentifier",
+        {"DBInstanceIdentifier": "id"},
+        arn="response:DBInstance.DBInstanceArn",
+        extra_args={"SkipFinalSnapshot": True, "DeleteAutomatedBackups": True},
+        waiter="db_instance_deleted",
+    ),
+    ResourceType(
+        "rds:db-snapshot",
+        "CreateDBSnapshot",
+        "DeleteDBSnapshot",
+        "params:DBSnapshotIdentifier",
+        {"DBSnapshotIdentifier": "id"},
+        arn="response:DBSnapshot.DBSnapshotArn",
+        waiter="db_snapshot_deleted",
+    ),
+    ResourceType(
+        "lambda:function",
+        "CreateFunction",
+        "DeleteFunction",
+        "params:FunctionName",
+        {"FunctionName": "id"},
+        arn="response:FunctionArn",
+    ),
+    ResourceType(
+        "lambda:layer-version",
+        "PublishLayerVersion",
+        "DeleteLayerVersion",
+        "response:Version",
+        {"LayerName": "params:LayerName", "VersionNumber": "id"},
+        name="params:LayerName",
+        arn="response:LayerVersionArn",
+    ),
+    ResourceType(
+        "ecr:repository",
+        "CreateRepository",
+        "DeleteRepository",
+        "params:repositoryName",
+        {"repositoryName": "id"},
+        arn="response:repository.repositoryArn",
+        extra_args={"force": True},
+    ),
+    ResourceType(
+        "efs:file-system",
+        "CreateFileSystem",
+        "DeleteFileSystem",
+        "response:FileSystemId",
+        {"FileSystemId": "id"},
+        name="params:CreationToken",
+        arn="response:FileSystemArn",
+    ),
+    ResourceType(
+        "cloudtrail:trail",
+        "CreateTrail",
+        "DeleteTrail",
+        "params:Name",
+        {"Name": "id"},
+        arn="response:TrailARN",
+    ),
+    ResourceType(
+        "cloudformation:stack",
+        "CreateStack",
+        "DeleteStack",
+        "params:StackName",
+        {"StackName": "id"},
+        arn="response:StackId",
+        waiter="stack_delete_complete",
+    ),
+    ResourceType(
+        "sns:topic",
+        "CreateTopic",
+        "DeleteTopic",
+        "response:TopicArn",
+        {"TopicArn": "id"},
+        name="params:Name",
+        arn="response:TopicArn",
+    ),
+    ResourceType(
+        "guardduty:detector",
+        "CreateDetector",
+        "DeleteDetector",
+        "response:DetectorId",
+        {"DetectorId": "id"},
+    ),
+    ResourceType(
+        "serverlessrepo:application",
+        "CreateApplication",
+        "DeleteApplication",
+        "response:ApplicationId",
+        {"ApplicationId": "id"},
+        name="params:Name",
+    ),
+)
+
+CREATES = dict(((t.service, t.create), t) for t in RESOURCE_TYPES)
+DELETES = dict(((t.service, t.delete), t) for t in RESOURCE_TYPES)
+
+
+def resource_type(kind):
+    for resource_type in RESOURCE_TYPES:
+        if resource_type.kind == kind:
+            return resource_type
+    raise KeyError("Unknown resource kind: %s" % kind)
+
+
+def gone_error(code):
+    """Whether a delete call failing with code means the resource is gone"""
+    return bool(code) and (
+        code.endswith(("NotFound", "NotFoundException", "NotFoundFault"))
+        or code in ("NoSuchEntity", "NoSuchBucket", "FileSystemNotFound")
+    )
+
+
+# Policy script the calls made on each thread are attributed to, set by
+# engine.lifecycle.PhaseRun
+_attribution = threading.local()
+
+
+def attribute_calls(policy):
+    """
+    Attribute resources created on this thread from now on to policy, and
+    return what they were attributed to before
+    """
+    previous = getattr(_attribution, "policy", None)
+    _attribution.policy = policy
+    return previous
+
+
+def scope_of(endpoint_url=None, account_id=None):
+    """
+    Scope of the resources made in real AWS or, given endpoint_url, on that
+    emulator; account_id narrows it to one of several accounts
+    """
+    scope = endpoint_url or AWS_SCOPE
+    return scope if account_id is None else "%s#%s" % (scope, account_id)
+
+
+# Scope recall() looks in when it isn't the store's, see recall_scope()
+_recall_scope = contextvars.ContextVar("ioa_recall_scope", default=None)
+
+
+@contextlib.contextmanager
+def recall_scope(scope):
+    """Have recall() find the resources of scope, e.g. one account's"""
+    token = _recall_scope.set(scope)
+    try:
+        yield
+    finally:
+        _recall_scope.reset(token)
+
+
+def new_run_id():
+    return "%s-%d" % (time.strftime("%Y%m%dT%H%M%S"), os.getpid())
+
+
+def run_pid(run_id):
+    """ID of the process that made the run run_id"""
+    return int(run_id.rpartition("-")[2])
+
+
+def pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class StateStore(object):
+    """
+    The resources table of a SQLite database at path. One connection is
+    shared by every thread; the database is in WAL mode so separate
+    processes can use it at the same time.
+    """
+
+    def __init__(self, path, run_id=None):
+        self.path = path
+        self.run_id = run_id or new_run_id()
+        self.scope = AWS_SCOPE
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.execute(
+            "DELETE FROM resources WHERE deleted_at < ?",
+            (time.time() - DELETED_RETENTION,),
+        )
+
+    def install(self, sessions, scope=None):
+        """
+        Record the resources made by every session sessions hands out under
+        scope, which becomes this store's scope
+        """
+        scope = self.scope = scope or AWS_SCOPE
+        after_call = lambda **kwargs: self._after_call(scope, **kwargs)
+        sessions.register("before-parameter-build", self._before_parameter_build)
+        sessions.register("after-call", after_call)
+
+    def _before_parameter_build(self, params, model, context, **kwargs):
+        key = (model.service_model.service_name, model.name)
+        if key in CREATES or key in DELETES:
+            context["ioa_state_params"] = dict(params)
+
+    def _after_call(self, scope, http_response, parsed, model, context, **kwargs):
+        params = context.get("ioa_state_params")
+        if params is None:
+            return
+        key = (model.service_model.service_name, model.name)
+        error = parsed.get("Error", {}).get("Code")
+        region = context.get("client_region")
+        if key in CREATES and not error:
+            policy = getattr(_attribution, "policy", None)
+            created_type = CREATES[key]
+            for resource_id, name, arn, args in created_type.created(params, parsed):
+                self.record(
+                    created_type.kind,
+                    resource_id,
+                    args,
+                    name,
+                    arn,
+                    region,
+                    policy,
+                    scope,
+                )
+        elif key in DELETES and (not error or gone_error(error)):
+            deleted_type = DELETES[key]
+            for args in deleted_type.deleted(params):
+                self.mark_deleted(deleted_type.kind, args, scope)
+
+    def record(
+        self,
+        kind,
+        resource_id,
+        delete_args,
+        name=None,
+        arn=None,
+        region=None,
+        policy=None,
+        scope=None,
+    ):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO resources (scope, kind, resource_id, name, arn, region,"
+                " policy, run_id, delete_args, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    scope or self.scope,
+                    kind,
+                    resource_id,
+                    name,
+                    arn,
+                    region,
+                    policy,
+                    self.run_id,
+                    _canonical(delete_args),
+                    time.time(),
+                ),
+            )
+
+    def mark_deleted(self, kind, delete_args, scope=None):
+        """Mark the live resources of kind deleted by delete_args as deleted"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE resources SET deleted_at = ? WHERE scope = ? AND kind = ?"
+                " AND delete_args = ? AND deleted_at IS NULL",
+                (time.time(), scope or self.scope, kind, _canonical(delete_args)),
+            )
+
+    def find(
+        self, kind=None, name=None, region=None, policy=None, run_id=None, scope=None
+    ):
+        """Live resources in scope, or this store's scope, oldest first"""
+        query = (
+            "SELECT kind, resource_id, name, arn, region, policy, run_id,"
+            " delete_args, created_at FROM resources"
+            " WHERE scope = ? AND deleted_at IS NULL"
+        )
+        args = [scope or self.scope]
+        for column, value in (
+            ("kind", kind),
+            ("name", name),
+            ("region", region),
+            ("policy", policy),
+            ("run_id", run_id),
+        ):
+            if value is not None:
+                query += " AND %s = ?" % column
+                args.append(value)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY id", args).fetchall()
+        return [Resource(*(row[:7] + (json.loads(row[7]),) + row[8:])) for row in rows]
+
+    def live_scopes(self):
+        """{scope: number of live resources} of every scope that has any"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT scope, COUNT(*) FROM resources WHERE deleted_at IS NULL"
+                " GROUP BY scope ORDER BY scope"
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def state_path():
+    """Where the state database is kept, or None when recording is off"""
+    path = os.environ.get(STATE_ENV) or DEFAULT_STATE
+    return None if path.lower() == "off" else path
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store():
+    """The process-wide StateStore, or None when $IOA_STATE is off"""
+    global _store
+    with _store_lock:
+        if _store is None and state_path() is not None:
+            _store = StateStore(state_path())
+        return _store
+
+
+def set_state_store(store):
+    """Make store the process-wide store and return the one it replaces"""
+    global _store
+    with _store_lock:
+        previous, _store = _store, store
+    return previous
+
+
+def recall(kind, name=None, region=None, policy=None):
+    """
+    Live resources of kind that earlier runs left behind; [] when nothing is
+    recorded. This run's own resources are left out, as the same policy may
+    be running in another region at the same time.
+    """
+    store = get_state_store()
+    if store is None:
+        return []
+    found = store.find(
+        kind, name=name, region=region, policy=policy, scope=_recall_scope.get()
+    )
+    return [resource for resource in found if resource.run_id != store.run_id]
@@ -0,0 +1,217 @@
+"""
+Deleting recorded resources in dependency order
+
+A Teardown deletes a set of Resources from the state store. A resource is
+deleted once everything that has to go first is gone, such as an IAM user's
+access keys and inline policies, or the instances of its run for a security
+group, see ResourceType.children. Resources that don't depend on each other
+are deleted at the same time, so a teardown takes as long as its longest
+chain of dependencies. Where the delete call only starts a deletion, the
+resource type's waiter holds back its dependents until it's done; nothing
+waits for a deletion no other resource depends on.
+
+The resources come from the state store, as for engine janitor, or from a
+policy's cleanup, which names what it created:
+
+    teardown = Teardown(self.session)
+    teardown.add_resource("iam:user-policy", UserName=USER, PolicyName=NAME)
+    teardown.add_resource("iam:user", UserName=USER)
+    teardown.run(strict=True)
+"""
+
+import concurrent.futures
+import contextvars
+
+from botocore import xform_name
+from botocore.exceptions import ClientError
+
+from engine.lookup import paginate
+from engine.state import Resource, gone_error, resource_type
+from engine.waiters import error_code, wait_for_waiter
+
+DEFAULT_WORKERS = 8
+
+
+def _empty_bucket(client, resource):
+    """Delete every object version, which DeleteBucket requires"""
+    bucket = resource.delete_args["Bucket"]
+    keys = [
+        {"Key": version["Key"], "VersionId": version["VersionId"]}
+        for version in paginate(
+            client, "list_object_versions", "Versions", Bucket=bucket
+        )
+    ]
+    keys += [
+        {"Key": marker["Key"], "VersionId": marker["VersionId"]}
+        for marker in paginate(
+            client, "list_object_versions", "DeleteMarkers", Bucket=bucket
+        )
+    ]
+    for start in range(0, len(keys), 1000):
+        client.delete_objects(
+            Bucket=bucket, Delete={"Objects": keys[start : start + 1000], "Quiet": True}
+        )
+
+
+# What has to happen before the delete call of a kind of resource
+PREPARE = {"s3:bucket": _empty_bucket}
+
+
+class TeardownError(Exception):
+    pass
+
+
+def describe(resource):
+    return "%s %s" % (resource.kind, resource.resource_id)
+
+
+class Teardown(object):
+    """
+    Deletes resources with clients from session, on up to workers threads.
+    After run(), deleted, failed and skipped hold what happened to each.
+    """
+
+    def __init__(self, session, workers=DEFAULT_WORKERS):
+        self.session = session
+        self.workers = max(1, workers)
+        self.resources = []
+        self.deleted = []
+        # (resource, error) of each failed deletion
+        self.failed = []
+        # Resources not deleted because something they depend on failed
+        self.skipped = []
+
+    def add(self, resources):
+        self.resources.extend(resources)
+        return self
+
+    def add_resource(self, kind, region=None, **delete_args):
+        """
+        Add the resources of kind a delete call with delete_args removes, in
+        region or the session's region. Resources added this way all count
+        as one run's.
+        """
+        added_type = resource_type(kind)
+        for args in added_type.deleted(delete_args):
+            self.resources.append(
+                Resource(
+                    kind=kind,
+                    resource_id=added_type.id_of(args),
+                    name=None,
+                    arn=None,
+                    region=region,
+                    policy=None,
+                    run_id="",
+                    delete_args=args,
+                    created_at=None,
+                )
+            )
+        return self
+
+    def _depends_on(self, resource, other):
+        for kind, argument in resource_type(resource.kind).children:
+            if other.kind != kind:
+                continue
+            if argument is None:
+                if (other.run_id, other.region) == (resource.run_id, resource.region):
+                    return True
+            elif other.delete_args.get(argument) == resource.resource_id:
+                return True
+        return False
+
+    def dependencies(self):
+        """Maps each resource's index to the indexes of those to delete first"""
+        return dict(
+            (
+                i,
+                set(
+                    j
+                    for j, other in enumerate(self.resources)
+                    if j != i and self._depends_on(resource, other)
+                ),
+            )
+            for i, resource in enumerate(self.resources)
+        )
+
+    def delete(self, resource, wait=True):
+        """
+        Delete resource and, with wait, wait until it's gone; gone already
+        is fine
+        """
+        deleted_type = resource_type(resource.kind)
+        client = self.session.client(deleted_type.service, region_name=resource.region)
+        try:
+            if resource.kind in PREPARE:
+                PREPARE[resource.kind](client, resource)
+            getattr(client, xform_name(deleted_type.delete))(
+                **dict(resource.delete_args, **deleted_type.extra_args)
+            )
+        except ClientError as e:
+            if not gone_error(error_code(e)):
+                raise
+            return
+        if wait and deleted_type.waiter:
+            wait_for_waiter(
+                client,
+                deleted_type.waiter,
+                "deletion of " + describe(resource),
+                **resource.delete_args
+            )
+
+    def run(self, strict=False):
+        """
+        Delete every resource added and return True if all of them are
+        gone. With strict, raise TeardownError instead of returning False.
+        """
+        waiting = self.dependencies()
+        # Deletions something else waits for
+        awaited = set().union(*waiting.values()) if waiting else set()
+        done = set()
+        broken = set()
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as pool:
+            running = {}
+            while waiting or running:
+                for i, dependencies in sorted(waiting.items()):
+                    if dependencies & broken:
+                        del waiting[i]
+                        broken.add(i)
+                        self.skipped.append(self.resources[i])
+                    elif dependencies <= done:
+                        del waiting[i]
+                        # Calls are tagged with the policy tearing down
+                        future = pool.submit(
+                            contextvars.copy_context().run,
+                            self.delete,
+                            self.resources[i],
+                            i in awaited,
+                        )
+                        running[future] = i
+                if not running:
+                    # What is left waits on a failed deletion or a cycle
+                    for i in waiting:
+                        self.skipped.append(self.resources[i])
+                    break
+                finished, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    i = running.pop(future)
+                    resource = self.resources[i]
+                    error = future.exception()
+                    if error is None:
+                        done.add(i)
+                        self.deleted.append(resource)
+                        print("Deleted " + describe(resource))
+                    else:
+                        broken.add(i)
+                        self.failed.append((resource, error))
+                        print("Could not delete %s: %r" % (describe(resource), error))
+        if strict and (self.failed or self.skipped):
+            raise TeardownError(
+                "Could not delete %s"
+                % ", ".join(
+                    [describe(r) for r, _ in self.failed]
+                    + [describe(r) for r in self.skipped]
+                )
+            )
+        return not (self.failed or self.skipped)
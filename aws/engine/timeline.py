@@ -0,0 +1,75 @@
+"""
+JSONL timeline of every AWS API call in a run
+
+One line per call: when it was made (local UTC and monotonic time), the
+server's Date header, policy, phase, service, operation, region, latency,
+status, error, request ID and the resource IDs involved, so a run can be
+joined against detection timestamps. Lines are written in batches at phase
+boundaries through a large buffer, not as calls happen.
+"""
+
+import datetime
+import email.utils
+import json
+import threading
+
+DEFAULT_TIMELINE = "ioa_timeline.jsonl"
+BUFFER_SIZE = 1 << 16
+
+
+def _iso(timestamp):
+    moment = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    return moment.isoformat(timespec="milliseconds")
+
+
+def _server_time(date):
+    """The server's RFC 1123 Date header as ISO 8601, or None"""
+    if not date:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(date).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def call_record(call):
+    record = {
+        "time": _iso(call.started),
+        "monotonic": round(call.monotonic, 6),
+        "server_date": _server_time(call.server_date),
+        "policy": call.policy,
+        "phase": call.phase,
+        "service": call.service,
+        "operation": call.operation,
+        "region": call.region,
+        "latency": round(call.latency, 6),
+        "status": call.status,
+        "retries": call.retries,
+        "error": call.error,
+        "request_id": call.request_id,
+        "resources": call.resources,
+    }
+    if call.response is not None:
+        record["response"] = call.response
+    return record
+
+
+class Timeline(object):
+    def __init__(self, path=DEFAULT_TIMELINE, buffer_size=BUFFER_SIZE):
+        self.path = path
+        self.written = 0
+        self._file = open(path, "w", buffering=buffer_size)
+        self._lock = threading.Lock()
+
+    def write(self, calls):
+        lines = [
+            json.dumps(call_record(call), default=str, separators=(",", ":"))
+            for call in calls
+        ]
+        with self._lock:
+            self._file.write("\n".join(lines) + "\n")
+            self.written += len(lines)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,118 @@
+"""
+Waiting for AWS resources to become ready
+
+Policies used to sleep for a fixed time and hope the resource was ready.
+wait_for_waiter uses a botocore waiter where the service defines one, and
+wait_until polls a check function with exponential backoff and jitter where
+it doesn't. Both give up after a deadline and print how long they waited.
+"""
+
+import random
+
+from botocore.exceptions import ClientError, WaiterError
+
+from engine.clock import get_clock
+
+# Seconds before any single wait gives up
+DEFAULT_DEADLINE = 900
+
+
+class WaitTimeout(Exception):
+    pass
+
+
+class Backoff(object):
+    """Exponential backoff delays; jitter is the fraction a delay may be cut by"""
+
+    def __init__(self, initial=1.0, maximum=30.0, factor=2.0, jitter=0.5):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+
+    def delays(self):
+        delay = self.initial
+        while True:
+            yield random.uniform(delay * (1 - self.jitter), delay)
+            delay = min(self.maximum, delay * self.factor)
+
+
+def error_code(error):
+    return error.response.get("Error", {}).get("Code")
+
+
+def report_wait(description, duration, attempts=None):
+    line = "    Waited %.1fs for %s" % (duration, description)
+    if attempts is not None:
+        line += " (%d check(s))" % attempts
+    print(line)
+
+
+def wait_until(
+    check,
+    description,
+    deadline=DEFAULT_DEADLINE,
+    retry_errors=(),
+    backoff=None,
+    clock=None,
+):
+    """
+    Call check() until it returns a truthy value and return that value.
+    A ClientError whose code is in retry_errors counts as "not ready yet".
+    Raises WaitTimeout once deadline seconds have passed on clock.
+    """
+    clock = clock or get_clock()
+    delays = (backoff or Backoff()).delays()
+    start = clock.now()
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            result = check()
+        except ClientError as e:
+            if error_code(e) not in retry_errors:
+                raise
+            result = None
+        elapsed = clock.now() - start
+        if result:
+            report_wait(description, elapsed, attempts)
+            return result
+        if elapsed >= deadline:
+            raise WaitTimeout(
+                "Gave up waiting for %s after %.1fs (%d check(s))"
+                % (description, elapsed, attempts)
+            )
+        clock.sleep(min(next(delays), deadline - elapsed))
+
+
+def wait_for_waiter(
+    client, name, description, deadline=DEFAULT_DEADLINE, delay=None, **kwargs
+):
+    """
+    Run the botocore waiter called name on client, bounded by deadline.
+    kwargs are passed to the waiter, e.g. InstanceIds=[...].
+    """
+    clock = get_clock()
+    waiter = client.get_waiter(name)
+    delay = delay or waiter.config.delay
+    max_attempts = max(1, int(deadline // delay) + 1)
+    start = clock.now()
+    try:
+        # botocore sleeps between polls itself, so scale its delay to the clock
+        waiter.wait(
+            WaiterConfig={
+                "Delay": clock.real_seconds(delay),
+                "MaxAttempts": max_attempts,
+            },
+            **kwargs
+        )
+    except WaiterError as e:
+        elapsed = clock.now() - start
+        if "Max attempts exceeded" in str(e):
+            raise WaitTimeout(
+                "Gave up waiting for %s after %.1fs" % (description, elapsed)
+            )
+        raise
+    finally:
+        clock.add_idle(clock.now() - start)
+    report_wait(description, clock.now() - start)
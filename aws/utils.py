@@ -36,5 +36,23 @@ def get_aws_tags():
     return aws_resource_tags
 
 
-# Export standardized AWS resource tags
-AWS_RESOURCE_TAGS = get_aws_tags()
+_aws_resource_tags = None
+
+
+def aws_resource_tags():
+    """
+    Standardized AWS resource tags, read from config.ini on first use.
+    Returns a new list each time so callers can extend it.
+    """
+    global _aws_resource_tags
+    if _aws_resource_tags is None:
+        _aws_resource_tags = get_aws_tags()
+    return [dict(tag) for tag in _aws_resource_tags]
+
+
+def __getattr__(name):
+    # Keep "from utils import AWS_RESOURCE_TAGS" working without reading
+    # config.ini when utils is imported
+    if name == "AWS_RESOURCE_TAGS":
+        return aws_resource_tags()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Bootstrap downloader for the IOA runner scripts
+
+Fetches the files listed in SHA256SUMS from a base URL into an install
+directory. Files are fetched in parallel, a file whose local copy already
+matches its checksum is not requested at all, and every other request is
+conditional (If-None-Match / If-Modified-Since) on what was fetched last
+time. Every file is verified against SHA256SUMS before it replaces the
+local copy.
+
+Alternatively --archive fetches a single tar.gz of the repository and
+extracts the listed files from it.
+
+Base URLs may be https://, http:// (e.g. a local mirror) or file://.
+Uses the standard library only, so it runs before requirements.txt is
+installed.
+
+Usage:
+    python3 bootstrap.py --base-url URL --dest ~/ioa-scripts [--only aws]
+    python3 bootstrap.py --base-url URL --dest DIR --archive ARCHIVE_URL
+    python3 bootstrap.py --write-checksums      (from a repository checkout)
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import time
+import urllib.error
+import urllib.request
+
+CHECKSUM_FILE = "SHA256SUMS"
+STATE_FILE = ".bootstrap_state.json"
+DEFAULT_JOBS = 8
+TIMEOUT = 30
+
+# What --write-checksums publishes, relative to the repository root
+PUBLISHED_DIRS = {
+    "aws": (".py", ".sh"),
+    "aws/engine": (".py",),
+    "azure": (".sh",),
+}
+PUBLISHED_FILES = ("config.ini", "requirements.txt")
+GENERATED_FILES = ("aws/policy_manifest.json", "aws/policy_manifest.tsv")
+
+# Top-level files belong to the "config" group, everything else to its
+# first directory (aws, azure)
+CONFIG_GROUP = "config"
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path):
+    try:
+        with open(path, "rb") as f:
+            return sha256(f.read())
+    except IOError:
+        return None
+
+
+def group_of(path):
+    return path.split("/", 1)[0] if "/" in path else CONFIG_GROUP
+
+
+def parse_checksums(text):
+    """Parse sha256sum output into {relative path: digest}"""
+    checksums = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        digest, path = line.split(None, 1)
+        checksums[path.lstrip("*")] = digest
+    return checksums
+
+
+def write_checksums(root):
+    """Write SHA256SUMS for every published file under root"""
+    paths = [p for p in PUBLISHED_FILES if os.path.isfile(os.path.join(root, p))]
+    for directory, extensions in PUBLISHED_DIRS.items():
+        for name in sorted(os.listdir(os.path.join(root, directory))):
+            path = "%s/%s" % (directory, name)
+            if name.endswith(extensions) and path not in GENERATED_FILES:
+                paths.append(path)
+    lines = []
+    for path in sorted(paths):
+        lines.append("%s  %s" % (file_sha256(os.path.join(root, path)), path))
+    with open(os.path.join(root, CHECKSUM_FILE), "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return len(lines)
+
+
+def write_file(path, data, executable=False):
+    """Replace path with data without ever leaving a partial file behind"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".part"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    if executable:
+        os.chmod(tmp_path, 0o755)
+    os.replace(tmp_path, path)
+
+
+class Fetcher(object):
+    """Conditional HTTP(S)/file:// GETs, remembering validators between runs"""
+
+    def __init__(self, state):
+        self.state = state
+
+    def get(self, url, key, conditional=True):
+        """
+        Return the body at url, or None if the server says it has not changed
+        since the copy recorded under key.
+        """
+        request = urllib.request.Request(url)
+        validators = self.state.get(key, {}) if conditional else {}
+        if validators.get("etag"):
+            request.add_header("If-None-Match", validators["etag"])
+        if validators.get("last_modified"):
+            request.add_header("If-Modified-Since", validators["last_modified"])
+        try:
+            with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+                data = response.read()
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None
+            raise
+        self.state[key] = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+        return data
+
+
+class Bootstrap(object):
+    def __init__(self, base_url, dest, groups=None, jobs=DEFAULT_JOBS):
+        self.base_url = base_url.rstrip("/")
+        self.dest = dest
+        self.groups = set(groups or [])
+        self.jobs = jobs
+        self.state_path = os.path.join(dest, STATE_FILE)
+        self.fetcher = Fetcher(self._load_state())
+        self.downloaded = []
+        self.unchanged = []
+        self.failed = []
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _save_state(self):
+        data = json.dumps(self.fetcher.state, indent=2, sort_keys=True)
+        write_file(self.state_path, data.encode("utf-8"))
+
+    def url(self, path):
+        return "%s/%s" % (self.base_url, path)
+
+    def local(self, path):
+        return os.path.join(self.dest, *path.split("/"))
+
+    def checksums(self):
+        """Fetch SHA256SUMS, reusing the local copy when it has not changed"""
+        local_path = self.local(CHECKSUM_FILE)
+        data = self.fetcher.get(
+            self.url(CHECKSUM_FILE),
+            CHECKSUM_FILE,
+            conditional=os.path.exists(local_path),
+        )
+        if data is None:
+            with open(local_path, "rb") as f:
+                data = f.read()
+        checksums = parse_checksums(data.decode("utf-8"))
+        write_file(local_path, data)
+        if self.groups:
+            checksums = dict(
+                (path, digest)
+                for path, digest in checksums.items()
+                if group_of(path) in self.groups
+            )
+        return checksums
+
+    def fetch(self, path, digest):
+        """Bring one file up to date. Returns "downloaded" or "unchanged"."""
+        local_path = self.local(path)
+        if file_sha256(local_path) == digest:
+            return "unchanged"
+        data = self.fetcher.get(self.url(path), path)
+        if data is None or sha256(data) != digest:
+            # A 304 for a file that doesn't match, or a stale cached response:
+            # fetch it again without validators before giving up
+            data = self.fetcher.get(self.url(path), path, conditional=False)
+        if sha256(data) != digest:
+            raise ValueError("checksum mismatch for %s" % path)
+        write_file(local_path, data, executable=path.endswith((".sh", ".py")))
+        return "downloaded"
+
+    def _record(self, path, outcome=None, error=None):
+        if error is not None:
+            self.failed.append((path, error))
+        elif outcome == "downloaded":
+            self.downloaded.append(path)
+        else:
+            self.unchanged.append(path)
+
+    def run(self):
+        checksums = self.checksums()
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as pool:
+            futures = dict(
+                (pool.submit(self.fetch, path, digest), path)
+                for path, digest in sorted(checksums.items())
+            )
+            for future in concurrent.futures.as_completed(futures):
+                path = futures[future]
+                try:
+                    self._record(path, future.result())
+                except Exception as e:
+                    self._record(path, error=e)
+        self._save_state()
+        return not self.failed
+
+    def run_archive(self, archive_url):
+        """Extract every listed file from a single tar.gz of the repository"""
+        checksums = self.checksums()
+        data = self.fetcher.get(archive_url, "archive:" + archive_url)
+        if data is None:
+            # Archive unchanged since last time; only local edits need fixing
+            for path, digest in sorted(checksums.items()):
+                if file_sha256(self.local(path)) == digest:
+                    self._record(path, "unchanged")
+                else:
+                    self._record(path, error="changed locally, archive not modified")
+            self._save_state()
+            return not self.failed
+        members = {}
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as archive:
+            for member in archive.getmembers():
+                if not member.isfile():
+                    continue
+                # GitHub archives put everything under <repo>-<ref>/
+                name = member.name.split("/", 1)[1] if "/" in member.name else ""
+                if name in checksums:
+                    members[name] = archive.extractfile(member).read()
+        for path, digest in sorted(checksums.items()):
+            body = members.get(path)
+            if body is None:
+                self._record(path, error="not in archive")
+            elif sha256(body) != digest:
+                self._record(path, error="checksum mismatch")
+            elif file_sha256(self.local(path)) == digest:
+                self._record(path, "unchanged")
+            else:
+                write_file(
+                    self.local(path), body, executable=path.endswith((".sh", ".py"))
+                )
+                self._record(path, "downloaded")
+        self._save_state()
+        return not self.failed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Download the IOA runner scripts in parallel"
+    )
+    parser.add_argument(
+        "--base-url",
+        dest="base_url",
+        help="Where to fetch files from: https://, http:// or file://",
+    )
+    parser.add_argument(
+        "--dest",
+        dest="dest",
+        default=os.path.join(os.path.expanduser("~"), "ioa-scripts"),
+        help="Install directory (defaults to ~/ioa-scripts)",
+    )
+    parser.add_argument(
+        "--only",
+        dest="groups",
+        action="append",
+        choices=("aws", "azure", CONFIG_GROUP),
+        default=[],
+        help="Only fetch this group of files. Can have multiple instances. Defaults to all.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        dest="jobs",
+        default=DEFAULT_JOBS,
+        help="How many files to fetch at the same time (defaults to %d)" % DEFAULT_JOBS,
+    )
+    parser.add_argument(
+        "--archive",
+        dest="archive_url",
+        metavar="ARCHIVE_URL",
+        help="Fetch one tar.gz of the repository instead of individual files",
+    )
+    parser.add_argument(
+        "--write-checksums",
+        dest="write_checksums",
+        action="store_true",
+        default=False,
+        help="Regenerate SHA256SUMS for the repository this script is in, then exit",
+    )
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    if options.write_checksums:
+        root = os.path.dirname(os.path.abspath(__file__))
+        print("Wrote %d checksums to %s" % (write_checksums(root), CHECKSUM_FILE))
+        return 0
+    if not options.base_url:
+        build_parser().error("--base-url is required")
+
+    start = time.monotonic()
+    bootstrap = Bootstrap(options.base_url, options.dest, options.groups, options.jobs)
+    try:
+        if options.archive_url:
+            ok = bootstrap.run_archive(options.archive_url)
+        else:
+            ok = bootstrap.run()
+    except (urllib.error.URLError, ValueError, IOError) as e:
+        print("Bootstrap failed: %s" % e)
+        return 1
+    for path, error in sorted(bootstrap.failed):
+        print("Failed to fetch %s: %s" % (path, error))
+    print(
+        "%d downloaded, %d unchanged, %d failed in %.1fs"
+        % (
+            len(bootstrap.downloaded),
+            len(bootstrap.unchanged),
+            len(bootstrap.failed),
+            time.monotonic() - start,
+        )
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
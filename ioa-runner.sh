@@ -27,7 +27,10 @@ NC='\033[0m' # No Color
 # Configuration
 REPO_URL="https://raw.githubusercontent.com/ryanjpayne/cspm-ioa-runner/refs/heads/main"
 INSTALL_DIR="$HOME/ioa-scripts"
-GITHUB_RAW_BASE="https://raw.githubusercontent.com/ryanjpayne/cspm-ioa-runner/refs/heads/main"
+GITHUB_RAW_BASE="${IOA_MIRROR:-https://raw.githubusercontent.com/ryanjpayne/cspm-ioa-runner/refs/heads/main}"
+# Set IOA_ARCHIVE_URL to fetch a single tar.gz of the repository instead of
+# individual files, e.g. https://github.com/ryanjpayne/cspm-ioa-runner/archive/refs/heads/main.tar.gz
+IOA_ARCHIVE_URL="${IOA_ARCHIVE_URL:-}"
 
 #############################################################################
 # Helper Functions
@@ -181,7 +184,7 @@ check_cloud_cli() {
 setup_directory() {
     print_info "Setting up directory structure..."
     
-    mkdir -p "$INSTALL_DIR"/{aws,azure,gcp}
+    mkdir -p "$INSTALL_DIR"/{aws,azure,gcp} "$INSTALL_DIR/aws/engine"
     cd "$INSTALL_DIR"
     
     print_success "Directory structure created at $INSTALL_DIR"
@@ -230,9 +233,33 @@ download_file() {
     return 0
 }
 
+# Fetch one group of files (aws, azure, config) with bootstrap.py: in
+# parallel, skipping files that are unchanged, verified against SHA256SUMS
+bootstrap_download() {
+    local group=$1
+    local bootstrap="$INSTALL_DIR/bootstrap.py"
+    local args=(--base-url "$GITHUB_RAW_BASE" --dest "$INSTALL_DIR" --only "$group")
+    
+    command -v python3 &> /dev/null || return 1
+    if [ -z "$BOOTSTRAP_FETCHED" ]; then
+        download_file "$GITHUB_RAW_BASE/bootstrap.py" "$bootstrap" || return 1
+        BOOTSTRAP_FETCHED=1
+    fi
+    if [ -n "$IOA_ARCHIVE_URL" ]; then
+        args+=(--archive "$IOA_ARCHIVE_URL")
+    fi
+    python3 "$bootstrap" "${args[@]}"
+}
+
 download_aws_scripts() {
     print_info "Downloading AWS IOA scripts..."
     
+    if bootstrap_download aws; then
+        print_success "AWS scripts downloaded"
+        return 0
+    fi
+    print_warning "Parallel download failed, downloading one file at a time"
+    
     local aws_scripts=(
         "aws_ioa_204.py"
         "aws_ioa_206.py"
@@ -260,17 +287,56 @@ download_aws_scripts() {
         "utils.py"
     )
     
+    local engine_files=(
+        "__init__.py"
+        "__main__.py"
+        "accounts.py"
+        "aio.py"
+        "bench.py"
+        "calls.py"
+        "clock.py"
+        "config.py"
+        "fixtures.py"
+        "iam.py"
+        "lifecycle.py"
+        "lookup.py"
+        "manifest.py"
+        "output.py"
+        "pipeline.py"
+        "regions.py"
+        "registry.py"
+        "runner.py"
+        "scheduler.py"
+        "sessions.py"
+        "soak.py"
+        "state.py"
+        "teardown.py"
+        "timeline.py"
+        "waiters.py"
+    )
+    
     for script in "${aws_scripts[@]}"; do
         download_file "$GITHUB_RAW_BASE/aws/$script" "$INSTALL_DIR/aws/$script"
         chmod +x "$INSTALL_DIR/aws/$script"
     done
     
+    mkdir -p "$INSTALL_DIR/aws/engine"
+    for file in "${engine_files[@]}"; do
+        download_file "$GITHUB_RAW_BASE/aws/engine/$file" "$INSTALL_DIR/aws/engine/$file"
+    done
+    
     print_success "AWS scripts downloaded"
 }
 
 download_azure_scripts() {
     print_info "Downloading Azure IOA scripts..."
     
+    if bootstrap_download azure; then
+        print_success "Azure scripts downloaded"
+        return 0
+    fi
+    print_warning "Parallel download failed, downloading one file at a time"
+    
     local azure_scripts=(
         "azure_ioa_243.sh"
         "azure_ioa_303.sh"
@@ -303,6 +369,11 @@ download_azure_scripts() {
 download_config_files() {
     print_info "Downloading configuration files..."
     
+    if bootstrap_download config; then
+        print_success "Configuration files downloaded"
+        return 0
+    fi
+    
     download_file "$GITHUB_RAW_BASE/config.ini" "$INSTALL_DIR/config.ini"
     download_file "$GITHUB_RAW_BASE/requirements.txt" "$INSTALL_DIR/requirements.txt"
     
@@ -332,34 +403,87 @@ show_main_menu() {
     echo -n "Enter your choice [0-2]: "
 }
 
+# AWS menu entries, in menu order. Their labels come from the policy manifest.
+AWS_MENU_SCRIPTS=(
+    "aws_ioa_204.py"
+    "aws_ioa_206.py"
+    "aws_ioa_207_209_210_213.py"
+    "aws_ioa_211_212_214.py"
+    "aws_ioa_215.py"
+    "aws_ioa_216.py"
+    "aws_ioa_217.py"
+    "aws_ioa_221.py"
+    "aws_ioa_223.py"
+    "aws_ioa_225_251.py"
+    "aws_ioa_228.py"
+    "aws_ioa_229.py"
+    "aws_ioa_234.py"
+    "aws_ioa_235_258_259_264.py"
+    "aws_ioa_236.py"
+    "aws_ioa_238.py"
+    "aws_ioa_246.py"
+    "aws_ioa_249_253.py"
+    "aws_ioa_250.py"
+    "aws_ioa_254.py"
+    "aws_ioa_255.py"
+    "aws_ioa_256.sh"
+    "aws_ioa_257.py"
+)
+
+AWS_MANIFEST_INDEX="$INSTALL_DIR/aws/policy_manifest.tsv"
+
+refresh_aws_manifest() {
+    local aws_dir="$INSTALL_DIR/aws"
+    
+    # Only re-index when a script is newer than the index
+    if [ -f "$AWS_MANIFEST_INDEX" ] && \
+        [ -z "$(find "$aws_dir" -maxdepth 1 -name 'aws_ioa_*' -newer "$AWS_MANIFEST_INDEX" -print -quit 2>/dev/null)" ]; then
+        return 0
+    fi
+    (cd "$aws_dir" && python3 -m engine manifest >/dev/null 2>&1)
+}
+
+# Look up a script in the manifest index and set MANIFEST_IDS, MANIFEST_TITLE,
+# MANIFEST_SERVICES, MANIFEST_REGIONS, MANIFEST_SECONDS and MANIFEST_SUMMARY
+manifest_lookup() {
+    local script_file=$1
+    local file ids title services regions seconds summary
+    
+    [ -f "$AWS_MANIFEST_INDEX" ] || return 1
+    while IFS=$'\t' read -r file ids title services regions seconds summary; do
+        if [ "$file" = "$script_file" ]; then
+            MANIFEST_IDS=$ids
+            MANIFEST_TITLE=$title
+            MANIFEST_SERVICES=$services
+            MANIFEST_REGIONS=$regions
+            MANIFEST_SECONDS=$seconds
+            MANIFEST_SUMMARY=$summary
+            return 0
+        fi
+    done < "$AWS_MANIFEST_INDEX"
+    return 1
+}
+
 show_aws_menu() {
     clear
     print_header
     echo -e "${YELLOW}AWS IOA Scripts:${NC}"
     echo ""
-    echo "  1)  204 - Cross-User IAM LoginProfile modification"
-    echo "  2)  206 - IAM User Access Key created"
-    echo "  3)  207/209/210/213 - IAM Policy modifications"
-    echo "  4)  211/212/214 - IAM Role modifications"
-    echo "  5)  215 - IAM User created"
-    echo "  6)  216 - IAM Group modifications"
-    echo "  7)  217 - S3 Bucket Policy modified"
-    echo "  8)  221 - EC2 Security Group modified"
-    echo "  9)  223 - EC2 Instance launched"
-    echo "  10) 225/251 - Lambda Function modifications"
-    echo "  11) 228 - RDS Instance modifications"
-    echo "  12) 229 - CloudTrail logging disabled"
-    echo "  13) 234 - KMS Key Policy modified"
-    echo "  14) 235/258/259/264 - S3 Bucket modifications"
-    echo "  15) 236 - VPC modifications"
-    echo "  16) 238 - Route53 modifications"
-    echo "  17) 246 - ECS Task Definition registered"
-    echo "  18) 249/253 - SNS/SQS modifications"
-    echo "  19) 250 - DynamoDB Table modifications"
-    echo "  20) 254 - Secrets Manager modifications"
-    echo "  21) 255 - Systems Manager modifications"
-    echo "  22) 256 - CloudFormation Stack operations"
-    echo "  23) 257 - EKS Cluster modifications"
+    refresh_aws_manifest
+    local i=1
+    local script ids
+    for script in "${AWS_MENU_SCRIPTS[@]}"; do
+        if manifest_lookup "$script"; then
+            printf "  %-4s%s - %s\n" "$i)" "$MANIFEST_IDS" "$MANIFEST_TITLE"
+        else
+            ids=${script#aws_ioa_}
+            ids=${ids%.*}
+            printf "  %-4s%s\n" "$i)" "${ids//_//}"
+        fi
+        i=$((i + 1))
+    done
+    echo ""
+    echo "  24) Run all AWS Python policies (single process)"
     echo ""
     echo "  0) Back to main menu"
     echo ""
@@ -407,19 +531,12 @@ get_script_summary() {
     local script_path=$1
     local summary=""
     
-    # Extract the docstring or comments from the script
-    if [[ $script_path == *.py ]]; then
-        summary=$(python3 -c "
-import sys
-with open('$script_path', 'r') as f:
-    content = f.read()
-    # Extract docstring
-    if '\"\"\"' in content:
-        start = content.find('\"\"\"') + 3
-        end = content.find('\"\"\"', start)
-        if end > start:
-            print(content[start:end].strip())
-" 2>/dev/null)
+    if manifest_lookup "$(basename "$script_path")"; then
+        # The index stores the docstring with escaped newlines
+        summary=$(printf '%b' "$MANIFEST_SUMMARY")
+    elif [[ $script_path == *.py ]]; then
+        # Extract the docstring
+        summary=$(sed -n '/^"""/,/^"""/p' "$script_path" | sed '1d;$d' 2>/dev/null)
     else
         # For shell scripts, extract the comment block
         summary=$(sed -n "/^: '/,/^'/p" "$script_path" | sed "1d;\$d" 2>/dev/null)
@@ -454,6 +571,13 @@ show_script_summary() {
         echo -e "${YELLOW}Description:${NC} No description available"
     fi
     
+    if manifest_lookup "$script_file"; then
+        echo ""
+        echo -e "${BLUE}Services:${NC} ${MANIFEST_SERVICES//,/, }"
+        echo -e "${BLUE}Regions:${NC} ${MANIFEST_REGIONS//,/, }"
+        echo -e "${BLUE}Estimated time:${NC} ~${MANIFEST_SECONDS}s"
+    fi
+    
     echo ""
     echo -e "${CYAN}═══════════════════════════════════════════════════════════════${NC}"
     echo ""
@@ -469,35 +593,12 @@ run_aws_script() {
     local script_file=""
     local profile=""
     
-    case $script_num in
-        1) script_file="aws_ioa_204.py" ;;
-        2) script_file="aws_ioa_206.py" ;;
-        3) script_file="aws_ioa_207_209_210_213.py" ;;
-        4) script_file="aws_ioa_211_212_214.py" ;;
-        5) script_file="aws_ioa_215.py" ;;
-        6) script_file="aws_ioa_216.py" ;;
-        7) script_file="aws_ioa_217.py" ;;
-        8) script_file="aws_ioa_221.py" ;;
-        9) script_file="aws_ioa_223.py" ;;
-        10) script_file="aws_ioa_225_251.py" ;;
-        11) script_file="aws_ioa_228.py" ;;
-        12) script_file="aws_ioa_229.py" ;;
-        13) script_file="aws_ioa_234.py" ;;
-        14) script_file="aws_ioa_235_258_259_264.py" ;;
-        15) script_file="aws_ioa_236.py" ;;
-        16) script_file="aws_ioa_238.py" ;;
-        17) script_file="aws_ioa_246.py" ;;
-        18) script_file="aws_ioa_249_253.py" ;;
-        19) script_file="aws_ioa_250.py" ;;
-        20) script_file="aws_ioa_254.py" ;;
-        21) script_file="aws_ioa_255.py" ;;
-        22) script_file="aws_ioa_256.sh" ;;
-        23) script_file="aws_ioa_257.py" ;;
-        *) 
-            print_error "Invalid script selection"
-            return 1
-            ;;
-    esac
+    if [ "$script_num" -ge 1 ] && [ "$script_num" -le ${#AWS_MENU_SCRIPTS[@]} ]; then
+        script_file=${AWS_MENU_SCRIPTS[$((script_num - 1))]}
+    else
+        print_error "Invalid script selection"
+        return 1
+    fi
     
     # Show summary and get confirmation
     show_script_summary "$script_file"
@@ -514,20 +615,20 @@ run_aws_script() {
     fi
     
     echo ""
-    echo -n "Enter AWS profile name (or press Enter for 'default'): "
+    echo -n "Enter AWS profile name (or press Enter for the config.ini default): "
     read profile </dev/tty
-    profile=${profile:-default}
     
     echo ""
-    print_info "Running $script_file with profile: $profile"
+    print_info "Running $script_file with profile: ${profile:-config.ini default}"
     echo ""
     
     cd "$INSTALL_DIR/aws"
     
     if [[ $script_file == *.py ]]; then
-        python3 "$script_file" "$profile"
+        # Python scripts fall back to the profile in config.ini themselves
+        python3 "$script_file" ${profile:+"$profile"}
     else
-        bash "$script_file" "$profile"
+        bash "$script_file" "${profile:-default}"
     fi
     
     local exit_code=$?
@@ -544,6 +645,64 @@ run_aws_script() {
     read </dev/tty
 }
 
+run_aws_engine() {
+    local profile=""
+    local parallel=""
+    
+    clear
+    print_header
+    echo -e "${YELLOW}Run all AWS Python policies in a single process${NC}"
+    echo ""
+    echo -e "${RED}⚠ WARNING:${NC} This will create and delete resources for every AWS policy."
+    echo -e "${RED}           Ensure you have appropriate permissions and understand the impact.${NC}"
+    echo ""
+    echo -n "Do you want to continue? (y/N): "
+    read confirm </dev/tty
+    
+    if [[ ! "$confirm" =~ ^[Yy]$ ]]; then
+        print_info "Execution cancelled"
+        echo ""
+        echo -n "Press Enter to return to menu..."
+        read </dev/tty
+        return 0
+    fi
+    
+    echo ""
+    echo -n "Enter AWS profile name (or press Enter for the config.ini default): "
+    read profile </dev/tty
+    
+    echo -n "How many policies to run at the same time (or press Enter for the config.ini default): "
+    read parallel </dev/tty
+    
+    local engine_args=()
+    if [ -n "$parallel" ]; then
+        engine_args+=(--parallel "$parallel")
+    fi
+    if [ -n "$profile" ]; then
+        engine_args+=("$profile")
+    fi
+    
+    echo ""
+    print_info "Running all AWS policies with profile: ${profile:-config.ini default} (parallel: ${parallel:-config.ini default})"
+    echo ""
+    
+    cd "$INSTALL_DIR/aws"
+    
+    local exit_code=0
+    python3 -m engine run "${engine_args[@]}" || exit_code=$?
+    echo ""
+    
+    if [ $exit_code -eq 0 ]; then
+        print_success "All policies completed successfully"
+    else
+        print_error "One or more policies failed (exit code: $exit_code)"
+    fi
+    
+    echo ""
+    echo -n "Press Enter to continue..."
+    read </dev/tty
+}
+
 run_azure_script() {
     local script_num=$1
     local script_file=""
@@ -697,6 +856,8 @@ main_loop() {
                     
                     if [ "$aws_choice" = "0" ]; then
                         break
+                    elif [ "$aws_choice" = "24" ]; then
+                        run_aws_engine
                     elif [ "$aws_choice" -ge 1 ] && [ "$aws_choice" -le 23 ]; then
                         run_aws_script "$aws_choice"
                     else